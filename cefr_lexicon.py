@@ -0,0 +1,148 @@
+import os
+import re
+import time
+import bisect
+import functools
+from array import array
+from typing import List, Optional
+
+# --- 本地 CEFR 词表预筛选 ---
+# 「是否是 B2 以上的生词」大多可以查表决定，不必让模型逐词判断。
+# 词表按字母顺序存成一个大字符串 + 偏移数组 + 等级字节串，二分查找，
+# 内存占用约为词表文本本身的大小，几千词的词表加载只需数毫秒。
+LEVELS = ["A1", "A2", "B1", "B2", "C1", "C2"]
+LEXICON_DIR = "lexicon"
+
+_WORD_RE = re.compile(r"[A-Za-z]+(?:['’-][A-Za-z]+)*")
+
+# 常见屈折变化（去掉后缀再查一次）
+_SUFFIX_RULES = [
+    ("ies", "y"), ("ied", "y"), ("ier", "y"), ("iest", "y"), ("ily", "y"),
+    ("ing", ""), ("ing", "e"), ("ed", ""), ("ed", "e"), ("es", ""), ("s", ""),
+    ("er", ""), ("est", ""), ("ly", ""),
+]
+
+class CefrLexicon:
+    """紧凑的只读词表：words 按字母序排列，levels[i] 为 words[i] 的等级编号"""
+
+    def __init__(self, blob: str, offsets: array, levels: bytes):
+        self._blob = blob
+        self._offsets = offsets  # 长度为 n + 1，第 i 个词为 blob[offsets[i]:offsets[i+1]]
+        self._levels = levels
+        self._keys = _WordView(self)
+
+    @classmethod
+    def load(cls, path: str) -> "CefrLexicon":
+        """从 TSV（word<TAB>level，# 开头为注释）加载词表"""
+        entries = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                word, _, level = line.rstrip("\n").partition("\t")
+                level = level.strip().upper()
+                if level in LEVELS:
+                    entries.setdefault(word.strip().lower(), LEVELS.index(level))
+        words = sorted(entries)
+        offsets = array("I", [0])
+        for word in words:
+            offsets.append(offsets[-1] + len(word))
+        return cls("".join(words), offsets, bytes(entries[w] for w in words))
+
+    def __len__(self):
+        return len(self._levels)
+
+    def _word_at(self, i: int) -> str:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]]
+
+    def _find(self, word: str) -> int:
+        i = bisect.bisect_left(self._keys, word)
+        if i < len(self) and self._word_at(i) == word:
+            return i
+        return -1
+
+    def level_of(self, word: str) -> Optional[str]:
+        """返回单词（或其原形）的 CEFR 等级，不在词表中时返回 None"""
+        word = word.lower().replace("’", "'")
+        for form in _base_forms(word):
+            i = self._find(form)
+            if i >= 0:
+                return LEVELS[self._levels[i]]
+        return None
+
+def _strip_suffixes(word: str):
+    for suffix, replacement in _SUFFIX_RULES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            stem = word[:-len(suffix)]
+            yield stem + replacement
+            # running -> run, stopped -> stop
+            if not replacement and len(stem) >= 4 and stem[-1] == stem[-2]:
+                yield stem[:-1]
+
+def _base_forms(word: str):
+    """依次产生单词本身及其可能的原形（最多去掉两层后缀，如 researchers -> research）"""
+    yield word
+    for stem in _strip_suffixes(word):
+        yield stem
+        for base in _strip_suffixes(stem):
+            yield base
+
+class _WordView:
+    """让 bisect 可以直接在紧凑存储上做二分查找"""
+
+    def __init__(self, lexicon):
+        self._lexicon = lexicon
+
+    def __len__(self):
+        return len(self._lexicon)
+
+    def __getitem__(self, i):
+        return self._lexicon._word_at(i)
+
+@functools.lru_cache(maxsize=None)
+def get_lexicon(language: str = "en") -> Optional[CefrLexicon]:
+    """加载某种语言的词表（进程内只加载一次），没有词表时返回 None"""
+    path = os.path.join(LEXICON_DIR, f"cefr_{language}.tsv")
+    if not os.path.exists(path):
+        return None
+    start = time.perf_counter()
+    lexicon = CefrLexicon.load(path)
+    print(f"--- [Lexicon] 已加载 {path}: {len(lexicon)} 词, {(time.perf_counter() - start) * 1000:.1f} ms ---")
+    return lexicon
+
+def tokenize(text: str) -> List[str]:
+    """提取文本中的英文单词（保留原始大小写）"""
+    return _WORD_RE.findall(text or "")
+
+def select_candidates(text: str, lexicon: CefrLexicon, min_level: str = "B2",
+                      exclude: List[str] = ()) -> tuple:
+    """
+    选出候选生词：词表等级 >= min_level 的词，以及词表中没有的较长单词
+    只以大写形式出现的词视为专有名词跳过；exclude 中的词（已掌握）直接剔除
+    返回 (按出现顺序排列的候选词, 统计信息)
+    """
+    min_index = LEVELS.index(min_level.upper()) if min_level.upper() in LEVELS else LEVELS.index("B2")
+    excluded = {w.lower() for w in exclude}
+    forms = {}
+    for token in tokenize(text):
+        forms.setdefault(token.lower(), set()).add(token)
+
+    candidates, filtered = [], []
+    for word, seen_forms in forms.items():
+        if word in excluded:
+            filtered.append(word)
+            continue
+        level = lexicon.level_of(word)
+        if level is None:
+            is_proper_noun = all(f[:1].isupper() for f in seen_forms)
+            keep = len(word) >= 5 and not is_proper_noun
+        else:
+            keep = LEVELS.index(level) >= min_index
+        (candidates if keep else filtered).append(word)
+
+    stats = {
+        "unique_words": len(forms),
+        "candidates": len(candidates),
+        "filtered_out": len(filtered),
+    }
+    return candidates, stats
@@ -0,0 +1,111 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import List
+
+# --- 共享释义缓存 ---
+# 同一个单词的音标、中文释义和例句不随文章变化，模型已经解释过的词不必每次重新生成。
+# 缓存以 (规范化单词, 版本) 为键，所有用户共享，版本由提示词版本和文本语言组成
+# （main.definition_version：法语文章中的 pain 不能用英文释义）；之后的分析中模型只需指出哪些词是生词，
+# 释义等字段在本地补全，省下的是输出 token（比输入 token 更贵、也更慢）。
+DEFINITION_CACHE_FILE = "data/definition_cache.db"
+DEFINITION_FIELDS = ("phonetic", "definition", "example")
+
+def normalize_word(word: str) -> str:
+    """小写、去首尾空白和标点，统一弯引号"""
+    return (word or "").strip().strip(".,;:!?\"“”()").replace("’", "'").lower()
+
+def definition_of(item: dict) -> dict:
+    """从生词条目中取出可缓存的字段；缺少中文释义时返回空字典"""
+    if not isinstance(item, dict) or not str(item.get("definition") or "").strip():
+        return {}
+    return {k: item[k] for k in DEFINITION_FIELDS if item.get(k)}
+
+class DefinitionCache:
+    """单词释义缓存（SQLite），键为 (规范化单词, 提示词版本)"""
+
+    def __init__(self, path: str = DEFINITION_CACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS definitions ("
+                " word TEXT NOT NULL, version TEXT NOT NULL, entry TEXT NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (word, version))"
+            )
+            self._initialized = True
+        return conn
+
+    def get_many(self, words: List[str], version: str) -> dict:
+        """批量查询，返回 {规范化单词: 释义字段}"""
+        keys = list(dict.fromkeys(normalize_word(w) for w in words if normalize_word(w)))
+        if not keys:
+            return {}
+        with self._lock:
+            conn = self._connect()
+            try:
+                found = {}
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT word, entry FROM definitions WHERE version = ? AND word IN ({','.join('?' * len(chunk))})",
+                        [version, *chunk]
+                    ).fetchall()
+                    found.update({w: json.loads(e) for w, e in rows})
+                return found
+            finally:
+                conn.close()
+
+    def record_hits(self, words: List[str], version: str):
+        """累计命中次数（释义实际由缓存补全的词）"""
+        if not words:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "UPDATE definitions SET hits = hits + 1 WHERE word = ? AND version = ?",
+                        [(normalize_word(w), version) for w in words]
+                    )
+            finally:
+                conn.close()
+
+    def put_many(self, entries: dict, version: str):
+        """批量写入 {单词: 释义字段}（已存在的词保留原释义，保证同一版本下释义稳定）"""
+        rows = [(normalize_word(w), version, json.dumps(e, ensure_ascii=False))
+                for w, e in entries.items() if normalize_word(w) and e]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO definitions (word, version, entry) VALUES (?, ?, ?)", rows
+                    )
+            finally:
+                conn.close()
+
+    def stats(self, version: str = None) -> dict:
+        """缓存规模与累计命中次数"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                where, args = ("WHERE version = ?", (version,)) if version else ("", ())
+                words, hits = conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM definitions {where}", args
+                ).fetchone()
+                return {"words": words, "hits": hits}
+            finally:
+                conn.close()
+
+definition_cache = DefinitionCache()
@@ -0,0 +1,132 @@
+import time
+import threading
+from collections import deque
+from typing import Optional
+
+# --- 延迟统计、熔断器与对冲计数 ---
+# 对冲请求（hedged request）：一次调用超过该级别近期延迟的某个百分位仍未返回时，
+# 向另一个服务商/模型发出相同的请求，先返回的结果胜出。这里提供它依赖的基础部件：
+#   1. LatencyTracker：按 (级别, 节点) 记录最近的成功调用延迟，计算百分位；
+#   2. CircuitBreaker：服务商连续失败达到阈值后熔断，冷却期内直接拒绝调用，
+#      冷却结束后放行一个试探请求（半开），成功则恢复，失败则重新熔断。
+# 调用编排见 llm_router.call_with_hedge。
+
+class CircuitOpenError(RuntimeError):
+    """服务商处于熔断状态，调用被直接拒绝"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} 已熔断，{retry_in:.0f}s 后重试")
+        self.provider = provider
+
+class LatencyTracker:
+    """按键保存最近 window 次调用的延迟"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key, p: float, min_samples: int = 20) -> Optional[float]:
+        """第 p 百分位的延迟（秒）；样本少于 min_samples 时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))
+        return samples[index]
+
+class CircuitBreaker:
+    """单个服务商的熔断器：closed -> open -> half_open -> closed"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """是否放行一次调用；半开状态下同一时间只放行一个试探请求"""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"--- [Circuit] {self.name} 试探成功，恢复调用 ---")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            now = time.monotonic()
+            # 半开时试探失败立即重新熔断；关闭时连续失败达到阈值才熔断
+            if self._trial_in_flight or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = now
+                self._stats["opened"] += 1
+                print(f"--- [Circuit] {self.name} 连续失败 {self._failures} 次，熔断 {self.reset_timeout:.0f}s ---")
+            self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, state=self._state(time.monotonic()), failures=self._failures)
+
+latency_tracker = LatencyTracker()
+
+_breakers = {}
+_counters = {"hedged": 0, "hedge_wins": 0, "failovers": 0}
+_lock = threading.Lock()
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """返回某个服务商的共享熔断器"""
+    with _lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(provider)
+        return _breakers[provider]
+
+def count(event: str):
+    """累计对冲与故障转移次数（hedged / hedge_wins / failovers）"""
+    with _lock:
+        _counters[event] += 1
+
+def failover_stats() -> dict:
+    """对冲计数与各服务商熔断器状态"""
+    with _lock:
+        counters = dict(_counters)
+        breakers = list(_breakers.values())
+    counters["breakers"] = {breaker.name: breaker.stats() for breaker in breakers}
+    return counters
@@ -0,0 +1,235 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from storage import file_lock
+
+# --- 内存映射的扁平向量索引 ---
+# 小规模部署不必运行 Chroma：向量按行追加到一个二进制矩阵文件中（float16 或 int8），
+# 打开时用 np.memmap 映射而不是读入内存，启动几乎不耗时，常驻内存只包含实际访问过的页。
+# 查询是暴力搜索：分块做矩阵乘法求余弦相似度，再用 argpartition 取 top-k，
+# 多个查询一次矩阵乘法完成。id、原文和元数据放在旁边的 SQLite 表中，行号与矩阵行一一对应。
+# 向量写入前先归一化，点积即余弦相似度；int8 按行量化，另存每行的缩放系数。
+# 追加写入时崩溃可能留下半行，或者缩放系数文件比向量文件多一行；行数以两个文件都完整的行为准，
+# 打开索引和每次追加前把两个文件截断到该行数，保证之后追加的行仍然一一对应。
+FLAT_DTYPES = ("float16", "int8")
+SCAN_CHUNK_ROWS = 4096  # 每块转换为 float32 后约 6 MB（384 维），能留在 CPU 缓存附近
+
+class FlatIndex:
+    """某个目录下的一份扁平向量索引"""
+
+    def __init__(self, path: str, dim: int = None, dtype: str = "float16"):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta = self._read_meta()
+        if meta:
+            self.dim, self.dtype = meta["dim"], meta["dtype"]
+        else:
+            if dtype not in FLAT_DTYPES:
+                raise ValueError(f"不支持的向量类型: {dtype}")
+            self.dim, self.dtype = dim, dtype
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._scales = None
+        self._mapped_rows = -1
+        if meta:
+            with file_lock(os.path.join(self.path, "vectors")):
+                self._truncate_partial_rows()
+
+    # --- 文件布局 ---
+    @property
+    def _meta_path(self):
+        return os.path.join(self.path, "meta.json")
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.path, f"vectors.{self.dtype}")
+
+    @property
+    def _scales_path(self):
+        return os.path.join(self.path, "scales.float32")
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.path, "items.db"), timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " row INTEGER PRIMARY KEY, id TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        return conn
+
+    def __len__(self):
+        return self._rows_on_disk()
+
+    def _row_files(self) -> List[tuple]:
+        """[(文件路径, 每行字节数)]：向量矩阵，int8 时还有缩放系数"""
+        files = [(self._vectors_path, self.dim * np.dtype(self.dtype).itemsize)]
+        if self.dtype == "int8":
+            files.append((self._scales_path, np.dtype(np.float32).itemsize))
+        return files
+
+    def _rows_on_disk(self) -> int:
+        """所有行文件都完整写入的行数"""
+        if not self.dim or not os.path.exists(self._vectors_path):
+            return 0
+        return min(os.path.getsize(path) // row_bytes if os.path.exists(path) else 0
+                   for path, row_bytes in self._row_files())
+
+    def _truncate_partial_rows(self):
+        """把行文件截断到完整的行数（调用方持有文件锁）"""
+        rows = self._rows_on_disk()
+        for path, row_bytes in self._row_files():
+            if os.path.exists(path) and os.path.getsize(path) > rows * row_bytes:
+                print(f"--- [FlatIndex] {path} 有未写完的行，截断到 {rows} 行 ---")
+                os.truncate(path, rows * row_bytes)
+
+    def _mapped(self):
+        """映射当前的向量文件（文件增长后重新映射）"""
+        rows = self._rows_on_disk()
+        if rows != self._mapped_rows:
+            if rows:
+                self._matrix = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+                if self.dtype == "int8":
+                    self._scales = np.memmap(self._scales_path, dtype="float32", mode="r", shape=(rows,))
+            else:
+                self._matrix = self._scales = None
+            self._mapped_rows = rows
+        return self._matrix, self._scales
+
+    # --- 写入 ---
+    def add(self, ids: List[str], texts: List[str], vectors, metadatas: List[dict] = None):
+        """追加一批向量及其 id、原文和元数据"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids) or len(ids) != len(texts):
+            raise ValueError("ids、texts 与 vectors 的数量不一致")
+        if not len(ids):
+            return
+        with self._lock, file_lock(os.path.join(self.path, "vectors")):
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度应为 {self.dim}，实际为 {vectors.shape[1]}")
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+            self._truncate_partial_rows()
+            start = self._rows_on_disk()
+            if self.dtype == "int8":
+                scales = np.abs(vectors).max(axis=1) / 127
+                scales = np.maximum(scales, 1e-12).astype(np.float32)
+                stored = np.round(vectors / scales[:, None]).astype(np.int8)
+                with open(self._scales_path, "ab") as f:
+                    f.write(scales.tobytes())
+            else:
+                stored = vectors.astype(np.float16)
+            with open(self._vectors_path, "ab") as f:
+                f.write(stored.tobytes())
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO items (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+                        [(start + i, str(ids[i]), texts[i], json.dumps((metadatas or [{}] * len(ids))[i] or {},
+                                                                        ensure_ascii=False))
+                         for i in range(len(ids))]
+                    )
+            finally:
+                conn.close()
+            if not os.path.exists(self._meta_path):
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim, "dtype": self.dtype}, f)
+
+    # --- 查询 ---
+    def _allowed_rows(self, where: dict):
+        """按元数据等值条件筛选行号，where 为 None 时返回 None（不过滤）"""
+        if not where:
+            return None
+        clauses = " AND ".join("json_extract(metadata, ?) = ?" for _ in where)
+        args = []
+        for key, value in where.items():
+            args += [f"$.{key}", value]
+        conn = self._connect()
+        try:
+            rows = conn.execute(f"SELECT row FROM items WHERE {clauses}", args).fetchall()
+        finally:
+            conn.close()
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+    def search_vectors(self, queries, k: int = 2, where: dict = None) -> List[List[tuple]]:
+        """
+        批量查询：queries 为 (n, dim) 矩阵
+        返回每个查询的 [(行号, 相似度)]，按相似度从高到低排列
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            matrix, scales = self._mapped()
+        if matrix is None:
+            return [[] for _ in queries]
+        allowed = self._allowed_rows(where)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        if allowed is None:
+            chunks = ((start, np.arange(start, min(start + SCAN_CHUNK_ROWS, len(matrix))))
+                      for start in range(0, len(matrix), SCAN_CHUNK_ROWS))
+        else:
+            allowed = allowed[allowed < len(matrix)]
+            chunks = ((None, allowed[start:start + SCAN_CHUNK_ROWS])
+                      for start in range(0, len(allowed), SCAN_CHUNK_ROWS))
+        for start, rows in chunks:
+            if not len(rows):
+                continue
+            # 连续的块直接切片（不复制），过滤后的行用花式索引
+            block = matrix[start:start + len(rows)] if start is not None else matrix[rows]
+            scores = queries @ block.astype(np.float32).T
+            if scales is not None:
+                scores *= (scales[start:start + len(rows)] if start is not None else scales[rows])
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [list(zip(r.tolist(), s.tolist())) for r, s in zip(best_rows, best_scores)]
+
+    def get_items(self, rows: List[int]) -> dict:
+        """按行号读取 {行号: (id, 原文, 元数据)}"""
+        if not rows:
+            return {}
+        conn = self._connect()
+        try:
+            found = {}
+            unique = list(dict.fromkeys(int(r) for r in rows))
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                for row, item_id, text, metadata in conn.execute(
+                    f"SELECT row, id, text, metadata FROM items WHERE row IN ({','.join('?' * len(chunk))})", chunk
+                ):
+                    found[row] = (item_id, text, json.loads(metadata))
+            return found
+        finally:
+            conn.close()
+
+    def search(self, queries, k: int = 2, where: dict = None) -> List[List[dict]]:
+        """批量查询并附上 id、原文、元数据：返回每个查询的 [{"id", "text", "metadata", "score"}]"""
+        hits = self.search_vectors(queries, k=k, where=where)
+        items = self.get_items([row for query_hits in hits for row, _ in query_hits])
+        return [
+            [{"id": items[row][0], "text": items[row][1], "metadata": items[row][2], "score": score}
+             for row, score in query_hits if row in items]
+            for query_hits in hits
+        ]
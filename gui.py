@@ -1,16 +1,40 @@
 import streamlit as st
 from main import (
-    app, 
+    run_analysis,
+    NodeFailedError,
+    get_run_status,
+    make_run_id,
     get_known_words_from_csv,
     save_analysis_history,
     load_analysis_history,
     get_analysis_by_id,
     mark_word_as_mastered,
-    get_all_words_from_csv
+    mark_words_as_mastered,
+    mark_word_as_learning,
+    get_all_words_from_csv,
+    import_history_stream,
+    iter_history_ndjson,
+    clear_analysis_history,
+    search_analysis_history,
+    ANALYSIS_DEPTHS,
+    DEFAULT_DEPTH,
+    CEFR_LEVELS,
+    DEFAULT_TARGET_LEVEL
 )  # 导入 app 和记忆加载函数
+from storage import DEFAULT_USER
+from word_store import learning_stats
+from language import detect_language
+from result_store import result_store
+from reading_list import reading_list, open_item, ready_result, start_prefetcher, QUEUED, RUNNING, READY, OPENED, FAILED
 # 初始化 Session State 用于保存当前会话的历史记录
 if 'session_history' not in st.session_state:
     st.session_state.session_history = []
+# 会话中只保存结果的键，完整结果放在进程内共享的 result_store 中（有大小上限，溢出到磁盘）
+SESSION_HISTORY_LIMIT = 50
+
+def show_result(result):
+    """把一个分析结果设为当前显示的结果"""
+    st.session_state['result_key'] = result_store.put(result)
 
 st.set_page_config(page_title="LingoContext AI", layout="wide")
 st.set_page_config(page_title="LingoContext AI", layout="wide")
@@ -58,57 +82,14 @@ speak_js = """
 # 在页面加载时注入 JavaScript
 components.html(speak_js, height=0)
 
-# --- 语言检测函数 ---
-def detect_language(word):
-    """
-    检测单词的语言类型
-    返回语言代码：'en-US', 'zh-CN', 'fr-FR', 'de-DE', 'ja-JP', 'ru-RU', 'es-ES', 'it-IT'
-    """
-    if not word:
-        return 'en-US'
-    
-    word_lower = word.lower()
-    
-    # 检测日语字符（优先级最高，因为可能包含汉字）
-    # 平假名：\u3040-\u309F
-    # 片假名：\u30A0-\u30FF
-    # 日文汉字：\u4E00-\u9FAF（与中文重叠，但日语通常伴随假名）
-    has_hiragana = any('\u3040' <= char <= '\u309F' for char in word)
-    has_katakana = any('\u30A0' <= char <= '\u30FF' for char in word)
-    if has_hiragana or has_katakana:
-        return 'ja-JP'
-    
-    # 检测俄语字符（西里尔字母）
-    # 俄语字母范围：\u0400-\u04FF
-    if any('\u0400' <= char <= '\u04FF' for char in word):
-        return 'ru-RU'
-    
-    # 检测中文字符（在日语检测之后，避免误判）
-    if any('\u4e00' <= char <= '\u9fff' for char in word):
-        return 'zh-CN'
-    
-    # 检测法语特征字符：é, è, ê, à, ç, ù, û, ô, î, ï, ë, ü
-    french_chars = ['é', 'è', 'ê', 'à', 'ç', 'ù', 'û', 'ô', 'î', 'ï', 'ë', 'ü', 'œ', 'æ']
-    if any(char in word_lower for char in french_chars):
-        return 'fr-FR'
-    
-    # 检测德语特征字符：ä, ö, ü, ß
-    german_chars = ['ä', 'ö', 'ü', 'ß']
-    if any(char in word_lower for char in german_chars):
-        return 'de-DE'
-    
-    # 检测西班牙语特征字符：ñ, á, é, í, ó, ú, ü
-    spanish_chars = ['ñ', 'á', 'é', 'í', 'ó', 'ú', 'ü']
-    if any(char in word_lower for char in spanish_chars):
-        return 'es-ES'
-    
-    # 检测意大利语特征字符：à, è, é, ì, ò, ù
-    italian_chars = ['à', 'è', 'é', 'ì', 'ò', 'ù']
-    if any(char in word_lower for char in italian_chars):
-        return 'it-IT'
-    
-    # 默认返回英文
-    return 'en-US'
+# 当前用户：词库和历史记录按用户分片保存，多个会话互不覆盖
+user_id = st.sidebar.text_input(
+    "👤 用户名",
+    value=st.session_state.get('user_id', DEFAULT_USER),
+    help="不同用户的生词库和历史记录分开保存"
+).strip() or DEFAULT_USER
+if st.session_state.get('user_id') != user_id:
+    st.session_state['user_id'] = user_id
 
 st.title("🚀 LingoContext: 你的 AI 语言助教")
 st.markdown("输入一段外语，AI 将为你归纳大意、提取生词、分析语法并提供文本细读。")
@@ -117,45 +98,82 @@ col1, col2 = st.columns([1, 1])
 
 with col1:
     user_input = st.text_area("粘贴你想学习的文本:", height=300)
+    # 分析深度：只需要生词或大意时跳过其余节点，更快也更省 token
+    depth = st.radio(
+        "分析深度",
+        list(ANALYSIS_DEPTHS),
+        index=list(ANALYSIS_DEPTHS).index(DEFAULT_DEPTH),
+        format_func=ANALYSIS_DEPTHS.get,
+        horizontal=True,
+    )
+    # 目标等级：只有不低于该等级的词才作为候选生词
+    level = st.selectbox(
+        "目标等级",
+        CEFR_LEVELS,
+        index=CEFR_LEVELS.index(DEFAULT_TARGET_LEVEL),
+        help="只把不低于该 CEFR 等级的词（以及词表中没有的较长单词）列为生词",
+    )
     if st.button("开始分析", type="primary"):
         if user_input:
             with st.spinner("Agent 正在深度思考中..."):
                 # 运行 LangGraph
                 # 加载已掌握单词
-                known_words = get_known_words_from_csv()
-                initial_state = {"input_text": user_input, "known_words": known_words} 
-                result = app.invoke(initial_state)
-                st.session_state['result'] = result
-                st.session_state['current_input'] = user_input
-                # 保存到历史记录
-                                # 保存到历史记录
-                save_analysis_history(user_input, result)
+                known_words = get_known_words_from_csv(user_id)
+                initial_state = {"user_id": user_id, "input_text": user_input, "known_words": known_words, "depth": depth,
+                                 "target_level": level}
+                # 阅读清单中已预取完成的文章直接打开（打开时已更新词库并保存历史记录）
+                result = ready_result(user_input, user_id, depth, level)
+                prefetched = result is not None
+                # 同一用户对同一文本的上一次分析中途失败时，从失败的节点继续
+                try:
+                    if not prefetched:
+                        result = run_analysis(initial_state)
+                except NodeFailedError as e:
+                    st.error(f"❌ {e}")
+                    run_status = get_run_status(make_run_id(user_id, user_input, depth, level))
+                    if run_status["pending"]:
+                        st.info(f"已完成的步骤已保存，再次点击「开始分析」将从 {'、'.join(run_status['pending'])} 继续。")
+                    else:
+                        st.info("再次点击「开始分析」重试。")
+                else:
+                    show_result(result)
+                    st.session_state['current_input'] = user_input
+                    # 保存到历史记录
+                                    # 保存到历史记录
+                    if not prefetched:
+                        save_analysis_history(user_input, result, user_id)
                 
-                # 同时保存到 Session State（当前会话）
-                import datetime
-                session_record = {
-                    "id": len(st.session_state.session_history) + 1,
-                    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "input_text": user_input,
-                    "result": result
-                }
-                st.session_state.session_history.append(session_record)
+                    # 同时保存到 Session State（当前会话）
+                    import datetime
+                    session_record = {
+                        "id": len(st.session_state.session_history) + 1,
+                        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "title": user_input[:50],
+                        "result_key": st.session_state['result_key']
+                    }
+                    st.session_state.session_history.append(session_record)
+                    del st.session_state.session_history[:-SESSION_HISTORY_LIMIT]
                 
-                st.success("分析完成！已保存到历史记录。")
-                st.success("分析完成！已保存到历史记录。")
+                    st.success("分析完成！已保存到历史记录。")
+                    st.success("分析完成！已保存到历史记录。")
         else:
             st.warning("请输入内容")
 
+# 从共享存储中取出当前结果（已被淘汰且磁盘中也没有时清除引用）
+res = result_store.get(st.session_state.get('result_key'))
+if res is None and 'result_key' in st.session_state:
+    st.session_state.pop('result_key', None)
+    st.warning("该分析结果已过期，请重新分析或从历史记录中打开")
+
 with col2:
-    if 'result' in st.session_state:
-        res = st.session_state['result']
+    if res is not None:
         
         # 显示当前查看的是历史记录还是新分析
         if st.session_state.get('viewing_history'):
             st.info("📜 正在查看历史记录")
             if st.button("返回新分析"):
                 st.session_state.pop('viewing_history', None)
-                st.session_state.pop('result', None)
+                st.session_state.pop('result_key', None)
                 st.session_state.pop('current_input', None)
                 st.rerun()
         
@@ -169,7 +187,7 @@ with col2:
         if res.get('summary_result'):
             st.info(res['summary_result'])
         else:
-            st.info("暂无摘要")
+            st.info("本次分析未包含大意" if res.get('depth') == 'vocab' else "暂无摘要")
         
         # 文本细读
         st.subheader("📖 文本细读")
@@ -177,24 +195,65 @@ with col2:
             with st.expander("点击展开详细分析", expanded=True):
                 st.markdown(res['detailed_reading'])
         else:
-            st.info("暂无细读内容")
+            st.info("本次分析未包含细读" if res.get('depth') in ('vocab', 'summary') else "暂无细读内容")
+
+        # Token 用量（含 Prompt 缓存命中）
+        usage = res.get('usage') or {}
+        if usage:
+            prompt_tokens = sum(u.get('prompt_tokens', 0) for u in usage.values())
+            cached_tokens = sum(u.get('cached_tokens', 0) for u in usage.values())
+            st.caption(f"本次输入 {prompt_tokens} tokens，其中缓存命中 {cached_tokens} tokens")
+            prefilter = usage.get('linguist_agent', {}).get('prefilter')
+            if prefilter:
+                st.caption(
+                    f"本地词表预筛选：{prefilter['unique_words']} 个词中保留 {prefilter['candidates']} 个候选，"
+                    f"{prefilter['filtered_out']} 个词未交给模型判断难度，"
+                    f"候选列表比完整词表少 {prefilter.get('prompt_tokens_saved', 0)} 个 prompt tokens"
+                )
+            summary_cache = usage.get('summarizer_agent', {}).get('summary_cache')
+            if summary_cache in ("reused", "revised"):
+                st.caption("文本大意：文本未变化，复用上次的结果" if summary_cache == "reused"
+                           else "文本大意：只把改动的句子发给模型，在上一版基础上更新")
+            reuse = usage.get('semantic_cache')
+            if reuse and reuse['mode'] != "miss":
+                st.caption(
+                    ("与之前分析过的文本相同，已直接复用结果" if reuse['mode'] == "exact" else
+                     f"与之前分析过的文本高度相似（相似度 {reuse['similarity']:.0%}），只分析改动过的句子，大意在原结果上更新")
+                    + f"（语义缓存命中率 {reuse['hit_rate']:.0%}）"
+                )
+            definitions = usage.get('linguist_agent', {}).get('definitions')
+            if definitions and definitions['vocabulary']:
+                st.caption(
+                    f"释义缓存：{definitions['vocabulary']} 个生词中 {definitions['filled']} 个由缓存补全"
+                    f"（命中率 {definitions['hit_rate']:.0%}），约节省 {definitions['output_tokens_saved']} 个输出 tokens"
+                )
 
 # 在主内容区域下方显示生词和语法
-if 'result' in st.session_state:
-    res = st.session_state['result']
-    
+if res is not None:
     st.divider()
     
     col3, col4 = st.columns([1, 1])
     
     with col3:
         st.subheader("📚 建议生词")
-        vocabulary = res['analysis_result'].get('vocabulary', [])
+        vocabulary = (res.get('analysis_result') or {}).get('vocabulary', [])
         
         # 获取已掌握的单词列表
-        known_words = get_known_words_from_csv()
+        known_words = get_known_words_from_csv(user_id)
         
         if vocabulary:
+            # 一键掌握本次所有生词（只写一次词库）
+            unmastered = [
+                w.get('word', '') if isinstance(w, dict) else str(w)
+                for w in vocabulary
+            ]
+            known_lower = {w.lower() for w in known_words}
+            unmastered = [w for w in unmastered if w and w.lower() not in known_lower]
+            if unmastered and st.button(f"✅ 全部标记为已掌握（{len(unmastered)}）", key="master_all"):
+                mark_words_as_mastered(unmastered, user_id=user_id)
+                st.success(f"已将 {len(unmastered)} 个单词标记为已掌握！")
+                st.rerun()
+            
             for idx, word_info in enumerate(vocabulary):
                 # 处理两种情况：字符串列表或字典列表
                 if isinstance(word_info, str):
@@ -274,18 +333,19 @@ if 'result' in st.session_state:
                     if not is_mastered:
                         # 标记为已掌握按钮
                         if st.button("✅ 已掌握", key=f"master_{word}_{idx}", use_container_width=True):
-                            mark_word_as_mastered(word)
+                            mark_word_as_mastered(word, user_id=user_id)
                             st.success(f"'{word}' 已标记为已掌握！")
                             st.rerun()
                     else:
                         st.success("✅ 已掌握")
         else:
-            st.info("未发现生词")
+            st.info("本次分析未包含生词" if res.get('depth') == 'summary' else "未发现生词")
     
     with col4:
         st.subheader("💡 语法难点")
         # 处理 grammar_points 或 grammar
-        grammar_data = res['analysis_result'].get('grammar_points') or res['analysis_result'].get('grammar')
+        analysis_result = res.get('analysis_result') or {}
+        grammar_data = analysis_result.get('grammar_points') or analysis_result.get('grammar')
         if grammar_data:
             if isinstance(grammar_data, list):
                 for idx, g in enumerate(grammar_data):
@@ -304,9 +364,108 @@ if 'result' in st.session_state:
 # 侧边栏：历史记录和统计
 st.sidebar.title("📚 学习记录")
 
+IMPORT_HELP = (
+    "选择之前导出的 NDJSON（或旧版 JSON）文件来恢复历史记录，按内容去重。"
+    "上传的文件会整个读入内存，大型归档请在命令行运行 python scripts/history_archive.py import"
+)
+
+def import_uploaded_history(uploaded_file):
+    """
+    导入上传的历史记录文件并显示结果
+    NDJSON 文件逐行解码、逐条导入，不再整体复制或解析；旧版导出的 JSON 文件（{"history": [...]}) 只能整体解析。
+    注意浏览器上传的文件本身已整个存放在 Streamlit 的内存中（上限见 server.maxUploadSize），
+    整个班级的大归档请用 scripts/history_archive.py 在命令行导入
+    """
+    try:
+        if uploaded_file.name.lower().endswith('.json'):
+            import json
+            import_data = json.load(uploaded_file)
+            if not (isinstance(import_data, dict) and isinstance(import_data.get('history'), list)):
+                st.sidebar.error("❌ 文件格式不正确，请确保是导出的历史记录文件")
+                return
+            stats = import_history_stream(import_data['history'], user_id)
+        else:
+            import io
+            lines = io.TextIOWrapper(uploaded_file, encoding='utf-8', errors='replace')
+            try:
+                stats = import_history_stream(lines, user_id)
+            finally:
+                lines.detach()  # 不随包装对象关闭 Streamlit 的上传文件
+        
+        if stats['imported']:
+            st.sidebar.success(
+                f"✅ 成功导入 {stats['imported']} 条记录！"
+                f"（重复 {stats['duplicates']} 条，无效 {stats['invalid']} 条）"
+            )
+            st.rerun()
+        else:
+            st.sidebar.info(f"ℹ️ 没有新记录需要导入（重复 {stats['duplicates']} 条，无效 {stats['invalid']} 条）")
+    except Exception as e:
+        st.sidebar.error(f"❌ 导入失败: {str(e)}")
+
+# 阅读清单：提前登记的文章由后台在空闲时预先分析，打开时无需等待
+st.sidebar.subheader("📚 阅读清单")
+with st.sidebar.expander("登记文章"):
+    reading_title = st.text_input("标题（可选）", key="reading_title")
+    reading_text = st.text_area("文章内容", key="reading_text", height=120)
+    reading_depth = st.selectbox(
+        "分析深度", list(ANALYSIS_DEPTHS), index=list(ANALYSIS_DEPTHS).index(DEFAULT_DEPTH),
+        format_func=ANALYSIS_DEPTHS.get, key="reading_depth"
+    )
+    if st.button("加入清单", key="reading_add"):
+        if reading_text.strip():
+            reading_list.add(reading_text, user_id, reading_title, reading_depth)
+            st.success("已加入清单，空闲时将自动预先分析")
+        else:
+            st.warning("请输入内容")
+# 清单中有待预取的文章时才启动后台预取线程（进程内只启动一次），不拖慢页面首次加载
+reading_counts = reading_list.counts()
+if any(reading_counts.get(status) for status in (QUEUED, RUNNING, FAILED)):
+    start_prefetcher()
+reading_icons = {QUEUED: "⏳", RUNNING: "⚙️", READY: "✅", OPENED: "📖", FAILED: "❌"}
+for item in reading_list.items(user_id):
+    label = f"{reading_icons.get(item['status'], '')} {item['title']}"
+    if item['status'] in (READY, OPENED):
+        if st.sidebar.button(label, key=f"reading_btn_{item['id']}", use_container_width=True):
+            result = open_item(item)
+            if result is None:
+                st.sidebar.warning("预取的结果已过期，已重新排队")
+            else:
+                show_result(result)
+                st.session_state['current_input'] = item['input_text']
+                st.session_state['viewing_history'] = True
+                st.rerun()
+    else:
+        st.sidebar.caption(label + (f"（{item['error']}）" if item['status'] == FAILED and item['error'] else ""))
+st.sidebar.divider()
+
 # 历史记录部分
 st.sidebar.subheader("分析历史")
-history = load_analysis_history()
+history = load_analysis_history(user_id)
+
+# 全文检索：原文、生词、语法点（包括已滚出列表的旧记录）
+search_scopes = {"全部": None, "原文": "input_text", "生词": "words", "语法": "grammar"}
+search_query = st.sidebar.text_input("🔍 搜索历史分析", placeholder="如 paradigm、虚拟语气")
+if search_query.strip():
+    search_scope = st.sidebar.radio("搜索范围", list(search_scopes), horizontal=True, label_visibility="collapsed")
+    import time
+    search_start = time.perf_counter()
+    search_results = search_analysis_history(search_query, user_id, field=search_scopes[search_scope])
+    search_ms = (time.perf_counter() - search_start) * 1000
+    st.sidebar.caption(f"找到 {len(search_results)} 条结果（{search_ms:.1f} ms）")
+    for hit in search_results:
+        record = hit['record']
+        if st.sidebar.button(
+            f"🔎 {record['timestamp']}\n{hit['snippet']}",
+            key=f"search_btn_{record['id']}",
+            use_container_width=True
+        ):
+            show_result(record['result'])
+            st.session_state['current_input'] = record['input_text']
+            st.session_state['viewing_history'] = True
+            st.session_state['selected_history_id'] = record['id']
+            st.rerun()
+    st.sidebar.divider()
 
 if history:
     # 显示历史记录列表（倒序，最新的在前）
@@ -343,7 +502,7 @@ if history:
         return title
     
     # 显示当前分析（如果有）
-    if 'result' in st.session_state:
+    if 'result_key' in st.session_state:
         st.sidebar.markdown("**📌 当前分析**")
         if st.sidebar.button("查看当前分析", key="view_current", use_container_width=True):
             st.session_state.pop('viewing_history', None)
@@ -364,7 +523,7 @@ if history:
             key=f"history_btn_{record['id']}",
             use_container_width=True
         ):
-            st.session_state['result'] = record['result']
+            show_result(record['result'])
             st.session_state['current_input'] = record['input_text']
             st.session_state['viewing_history'] = True
             st.session_state['selected_history_id'] = record['id']
@@ -381,25 +540,15 @@ if history:
     st.sidebar.divider()
     st.sidebar.subheader("📥 数据管理")
     
-    # 导出历史记录
+    # 导出历史记录（NDJSON：每行一条记录，可直接拼接多个文件）
     if st.sidebar.button("📥 导出历史记录", use_container_width=True):
         import datetime
-        import json
-        
-        # 准备导出的数据
-        export_data = {
-            "export_date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "total_records": len(history),
-            "history": history
-        }
         
-        # 创建下载按钮
-        json_str = json.dumps(export_data, ensure_ascii=False, indent=2)
         st.sidebar.download_button(
-            label="⬇️ 下载 JSON 文件",
-            data=json_str,
-            file_name=f"lingocontext_history_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-            mime="application/json",
+            label="⬇️ 下载 NDJSON 文件",
+            data="".join(iter_history_ndjson(user_id)),
+            file_name=f"lingocontext_history_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson",
+            mime="application/x-ndjson",
             use_container_width=True
         )
     
@@ -407,64 +556,19 @@ if history:
     st.sidebar.markdown("---")
     uploaded_file = st.sidebar.file_uploader(
         "📤 导入历史记录",
-        type=['json'],
-        help="选择之前导出的 JSON 文件来恢复历史记录"
+        type=['ndjson', 'jsonl', 'json'],
+        help=IMPORT_HELP
     )
     
     if uploaded_file is not None:
-        try:
-            import json
-            # 读取上传的文件
-            content = uploaded_file.read().decode('utf-8')
-            import_data = json.loads(content)
-            
-            # 检查数据格式
-            if 'history' in import_data and isinstance(import_data['history'], list):
-                # 合并历史记录
-                existing_history = load_analysis_history()
-                existing_ids = {r.get('id') for r in existing_history}
-                
-                # 添加新记录（避免重复）
-                new_records = []
-                for record in import_data['history']:
-                    # 如果 ID 不存在，添加记录
-                    if record.get('id') not in existing_ids:
-                        new_records.append(record)
-                
-                if new_records:
-                    # 合并并保存
-                    merged_history = existing_history + new_records
-                    # 按时间戳排序
-                    merged_history.sort(key=lambda x: x.get('timestamp', ''))
-                    # 只保留最近 100 条
-                    if len(merged_history) > 100:
-                        merged_history = merged_history[-100:]
-                    
-                    # 保存到文件
-                    import os
-                    os.makedirs("data", exist_ok=True)
-                    with open("data/analysis_history.json", 'w', encoding='utf-8') as f:
-                        json.dump(merged_history, f, ensure_ascii=False, indent=2)
-                    
-                    st.sidebar.success(f"✅ 成功导入 {len(new_records)} 条记录！")
-                    st.rerun()
-                else:
-                    st.sidebar.info("ℹ️ 没有新记录需要导入（可能已存在）")
-            else:
-                st.sidebar.error("❌ 文件格式不正确，请确保是导出的历史记录文件")
-        except Exception as e:
-            st.sidebar.error(f"❌ 导入失败: {str(e)}")
+        import_uploaded_history(uploaded_file)
     
     # 清空历史记录按钮
     st.sidebar.divider()
     if st.sidebar.button("🗑️ 清空历史记录", type="secondary"):
-        import os
-        import json
-        history_file = "data/analysis_history.json"
-        if os.path.exists(history_file):
-            os.remove(history_file)
-            st.sidebar.success("历史记录已清空")
-            st.rerun()
+        clear_analysis_history(user_id)
+        st.sidebar.success("历史记录已清空")
+        st.rerun()
 else:
     st.sidebar.info("暂无历史记录")
     
@@ -473,31 +577,12 @@ else:
     st.sidebar.subheader("📥 数据管理")
     uploaded_file = st.sidebar.file_uploader(
         "📤 导入历史记录",
-        type=['json'],
-        help="选择之前导出的 JSON 文件来恢复历史记录"
+        type=['ndjson', 'jsonl', 'json'],
+        help=IMPORT_HELP
     )
     
     if uploaded_file is not None:
-        try:
-            import json
-            import os
-            content = uploaded_file.read().decode('utf-8')
-            import_data = json.loads(content)
-            
-            if 'history' in import_data and isinstance(import_data['history'], list):
-                # 确保 data 目录存在
-                os.makedirs("data", exist_ok=True)
-                
-                # 保存导入的历史记录
-                with open("data/analysis_history.json", 'w', encoding='utf-8') as f:
-                    json.dump(import_data['history'], f, ensure_ascii=False, indent=2)
-                
-                st.sidebar.success(f"✅ 成功导入 {len(import_data['history'])} 条记录！")
-                st.rerun()
-            else:
-                st.sidebar.error("❌ 文件格式不正确")
-        except Exception as e:
-            st.sidebar.error(f"❌ 导入失败: {str(e)}")
+        import_uploaded_history(uploaded_file)
 st.sidebar.divider()
 
 # 生词管理
@@ -505,18 +590,31 @@ st.sidebar.subheader("📖 生词管理")
 if st.sidebar.button("查看所有生词", use_container_width=True):
     st.session_state['show_word_manager'] = True
 
-# 学习统计
+# 学习统计（词库写盘时增量维护，这里只读取统计文件，不扫描词库）
 st.sidebar.subheader("学习统计")
 try:
-    import pandas as pd
-    df = pd.read_csv("data/user_words.csv")
-    mastered_count = len(df[df['status'] == 'mastered'])
-    learning_count = len(df[df['status'] == 'learning'])
-    total_count = len(df)
-    st.sidebar.metric("已掌握单词量", mastered_count)
-    st.sidebar.metric("学习中单词", learning_count)
-    st.sidebar.metric("总单词数", total_count)
-except:
+    stats = learning_stats(user_id)
+    st.sidebar.metric("已掌握单词量", stats['by_status'].get('mastered', 0))
+    st.sidebar.metric("学习中单词", stats['by_status'].get('learning', 0))
+    st.sidebar.metric("总单词数", stats['total'])
+    # 最近 30 天每天新增和掌握的单词数
+    import datetime
+    today = datetime.date.today()
+    days = [(today - datetime.timedelta(days=i)).isoformat() for i in range(29, -1, -1)]
+    if any(stats['added_per_day'].get(d) or stats['mastered_per_day'].get(d) for d in days):
+        st.sidebar.caption("最近 30 天")
+        st.sidebar.bar_chart(
+            {
+                "日期": [d[5:] for d in days],
+                "新增": [stats['added_per_day'].get(d, 0) for d in days],
+                "掌握": [stats['mastered_per_day'].get(d, 0) for d in days],
+            },
+            x="日期",
+            y=["新增", "掌握"],
+            height=160,
+        )
+except Exception as e:
+    print(f"读取学习统计失败: {e}")
     st.sidebar.metric("已掌握单词量", "0")
     st.sidebar.metric("学习中单词", "0")
     st.sidebar.metric("总单词数", "0")
@@ -531,7 +629,7 @@ if st.session_state.get('show_word_manager', False):
         st.rerun()
     
     try:
-        all_words = get_all_words_from_csv()
+        all_words = get_all_words_from_csv(user_id)
         
         if all_words:
             # 创建标签页：全部、已掌握、学习中
@@ -586,18 +684,14 @@ if st.session_state.get('show_word_manager', False):
                     with col3:
                         if status != 'mastered':
                             if st.button("✅ 已掌握", key=f"manage_master_{word}"):
-                                mark_word_as_mastered(word)
+                                mark_word_as_mastered(word, user_id=user_id)
                                 st.success(f"'{word}' 已标记为已掌握！")
                                 st.rerun()
                     with col4:
                         if status == 'mastered':
                             if st.button("📚 重新学习", key=f"manage_learn_{word}"):
                                 # 将状态改回 learning
-                                import pandas as pd
-                                df = pd.read_csv("data/user_words.csv")
-                                df.loc[df['word'] == word, 'status'] = 'learning'
-                                df.loc[df['word'] == word, 'score'] = 0
-                                df.to_csv("data/user_words.csv", index=False)
+                                mark_word_as_learning(word, user_id=user_id)
                                 st.success(f"'{word}' 已标记为重新学习")
                                 st.rerun()
             
@@ -693,7 +787,7 @@ if st.session_state.get('show_word_manager', False):
                             components.html(speak_script, height=0)
                     with col3:
                         if st.button("✅ 已掌握", key=f"tab3_master_{word}"):
-                            mark_word_as_mastered(word)
+                            mark_word_as_mastered(word, user_id=user_id)
                             st.success(f"'{word}' 已标记为已掌握！")
                             st.rerun()
         else:
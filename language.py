@@ -0,0 +1,89 @@
+# --- 语言检测 ---
+# 单词级检测（按字符特征，用于朗读时选择语音）和文本级检测（用于向量库按语言分片）。
+# 文本级检测先看文字系统，拉丁字母文本再按常见功能词打分，没有命中时退回字符特征。
+
+def detect_language(word):
+    """
+    检测单词的语言类型
+    返回语言代码：'en-US', 'zh-CN', 'fr-FR', 'de-DE', 'ja-JP', 'ru-RU', 'es-ES', 'it-IT'
+    """
+    if not word:
+        return 'en-US'
+    
+    word_lower = word.lower()
+    
+    # 检测日语字符（优先级最高，因为可能包含汉字）
+    # 平假名：\u3040-\u309F
+    # 片假名：\u30A0-\u30FF
+    # 日文汉字：\u4E00-\u9FAF（与中文重叠，但日语通常伴随假名）
+    has_hiragana = any('\u3040' <= char <= '\u309F' for char in word)
+    has_katakana = any('\u30A0' <= char <= '\u30FF' for char in word)
+    if has_hiragana or has_katakana:
+        return 'ja-JP'
+    
+    # 检测俄语字符（西里尔字母）
+    # 俄语字母范围：\u0400-\u04FF
+    if any('\u0400' <= char <= '\u04FF' for char in word):
+        return 'ru-RU'
+    
+    # 检测中文字符（在日语检测之后，避免误判）
+    if any('\u4e00' <= char <= '\u9fff' for char in word):
+        return 'zh-CN'
+    
+    # 检测法语特征字符：é, è, ê, à, ç, ù, û, ô, î, ï, ë, ü
+    french_chars = ['é', 'è', 'ê', 'à', 'ç', 'ù', 'û', 'ô', 'î', 'ï', 'ë', 'ü', 'œ', 'æ']
+    if any(char in word_lower for char in french_chars):
+        return 'fr-FR'
+    
+    # 检测德语特征字符：ä, ö, ü, ß
+    german_chars = ['ä', 'ö', 'ü', 'ß']
+    if any(char in word_lower for char in german_chars):
+        return 'de-DE'
+    
+    # 检测西班牙语特征字符：ñ, á, é, í, ó, ú, ü
+    spanish_chars = ['ñ', 'á', 'é', 'í', 'ó', 'ú', 'ü']
+    if any(char in word_lower for char in spanish_chars):
+        return 'es-ES'
+    
+    # 检测意大利语特征字符：à, è, é, ì, ò, ù
+    italian_chars = ['à', 'è', 'é', 'ì', 'ò', 'ù']
+    if any(char in word_lower for char in italian_chars):
+        return 'it-IT'
+    
+    # 默认返回英文
+    return 'en-US'
+
+# 各语言的高频功能词（只取在其他几种语言中很少出现的词）
+_STOPWORDS = {
+    "en": {"the", "and", "of", "to", "is", "that", "with", "for", "this", "are", "was", "have", "it", "not", "be"},
+    "fr": {"le", "les", "des", "est", "une", "et", "dans", "que", "pour", "pas", "sur", "qui", "avec", "au", "du"},
+    "de": {"der", "die", "und", "das", "ist", "nicht", "ein", "eine", "mit", "sich", "auf", "dem", "den", "zu", "ich"},
+    "es": {"el", "los", "las", "es", "y", "que", "en", "una", "por", "con", "para", "del", "se", "lo", "como"},
+    "it": {"il", "gli", "che", "di", "è", "una", "per", "con", "non", "sono", "della", "nel", "lo", "si", "anche"},
+}
+
+def detect_text_language(text: str) -> str:
+    """
+    检测一段文本的语言，返回两字母代码：'en'、'zh'、'fr'、'de'、'ja'、'ru'、'es'、'it'
+    文字系统能直接判断的（日文假名、西里尔字母、汉字）优先；拉丁字母文本按功能词打分
+    """
+    if not text or not text.strip():
+        return "en"
+    letters = [c for c in text if c.isalpha()]
+    kana = sum('\u3040' <= c <= '\u30ff' for c in letters)
+    cyrillic = sum('\u0400' <= c <= '\u04ff' for c in letters)
+    han = sum('\u4e00' <= c <= '\u9fff' for c in letters)
+    latin = sum(c.isascii() or '\u00c0' <= c <= '\u024f' for c in letters)
+    if kana and kana + han >= latin:
+        return "ja"
+    if cyrillic > latin:
+        return "ru"
+    if han > latin:
+        return "zh"
+
+    words = [w.strip(".,;:!?\"'«»()").lower() for w in text.split()]
+    scores = {lang: sum(w in stopwords for w in words) for lang, stopwords in _STOPWORDS.items()}
+    best = max(scores, key=scores.get)
+    if scores[best] > 0:
+        return best
+    return detect_language(text).split("-")[0]
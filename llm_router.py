@@ -0,0 +1,349 @@
+import os
+import re
+import json
+import time
+import functools
+from dataclasses import dataclass, field
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from failover import CircuitOpenError, count, get_breaker, latency_tracker
+from rate_limiter import get_limiter
+
+# --- 模型分级路由 ---
+# 短文本交给便宜、快速的模型；长文本或输出校验失败时自动升级到更强的模型。
+# 默认分级根据已配置的 API Key 自动生成，也可以通过 LLM_TIERS 环境变量
+# （JSON 列表）自定义，例如指向本地桩服务器 scripts/stub_llm_server.py：
+#   LLM_TIERS='[{"name": "fast", "model": "stub-fast", "base_url": "http://127.0.0.1:8001/v1",
+#                "api_key": "stub", "max_input_tokens": 800, "timeout": 15}]'
+# 级别可以指定 hedge（另一个级别的名称）：调用慢于近期延迟的百分位时向该级别发出对冲请求，
+# 调用失败或服务商熔断时转移到该级别。standby 级别只作为对冲目标，不参与分级路由。
+
+@dataclass
+class ModelTier:
+    name: str
+    model: str
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    max_input_tokens: object = None  # int，或 {节点名: int}；None 表示不限
+    timeout: float = 60
+    max_retries: int = 2
+    nodes: List[str] = field(default_factory=list)  # 为空表示适用于所有节点
+    rpm: Optional[int] = None            # 每分钟请求数上限（同一服务商的各级别共享）
+    tpm: Optional[int] = None            # 每分钟 token 数上限
+    max_concurrency: int = 16            # 自适应并发窗口的上限
+    hedge: Optional[str] = None          # 对冲/故障转移目标级别的名称
+    hedge_percentile: float = 95         # 超过近期延迟的该百分位仍未返回时发出对冲请求
+    hedge_after: Optional[float] = None  # 延迟样本不足时的对冲等待秒数（默认 timeout / 4）
+    standby: bool = False                # 只作为对冲目标，不参与分级路由
+
+    @property
+    def provider(self) -> str:
+        """服务商标识（API 地址的主机名），用于共享限流器"""
+        return urlparse(self.base_url).netloc if self.base_url else "api.openai.com"
+
+    @property
+    def request_key(self) -> tuple:
+        """同一地址上的同一模型（temperature=0）对同一请求给出同样的输出，升级到这样的级别没有意义"""
+        return (self.provider, self.model)
+
+    def accepts(self, node: str, input_tokens: int) -> bool:
+        """判断该级别是否能处理此节点、此长度的输入"""
+        if self.nodes and node not in self.nodes:
+            return False
+        limit = self.max_input_tokens
+        if isinstance(limit, dict):
+            limit = limit.get(node, limit.get("default"))
+        return limit is None or input_tokens <= limit
+
+class OutputValidationError(ValueError):
+    """所有可用模型的输出都未通过校验"""
+
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+
+@functools.lru_cache(maxsize=None)
+def load_environment():
+    """加载 .env 中的环境变量（只执行一次）"""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+def get_secret(name: str) -> Optional[str]:
+    """优先从 Streamlit secrets 读取（用于 Cloud 部署），否则读取环境变量"""
+    load_environment()
+    value = None
+    try:
+        import streamlit as st
+        value = st.secrets.get(name, None)
+    except Exception:
+        pass
+    return value or os.getenv(name)
+
+def _valid_key(key):
+    return key and not key.startswith("your_")
+
+def load_tiers() -> List[ModelTier]:
+    """加载模型分级配置，按从快到强的顺序排列"""
+    custom = get_secret("LLM_TIERS")
+    if custom:
+        tiers = []
+        for item in json.loads(custom):
+            item = dict(item)
+            key_env = item.pop("api_key_env", None)
+            if key_env:
+                item["api_key"] = get_secret(key_env)
+            tiers.append(ModelTier(**item))
+        return tiers
+
+    deepseek_key = get_secret("DEEPSEEK_API_KEY")
+    openai_key = get_secret("OPENAI_API_KEY")
+    if _valid_key(deepseek_key):
+        # DeepSeek 只有一个对话模型，按输入长度区分超时时间（输出不合格时不会在同一模型上重试，
+        # 见 invoke_llm）；同时配置了 OpenAI 时用它对冲
+        hedge = "openai-standby" if _valid_key(openai_key) else None
+        tiers = [
+            ModelTier("deepseek-short", "deepseek-chat", "https://api.deepseek.com/v1",
+                      deepseek_key, max_input_tokens=1000, timeout=30, hedge=hedge),
+            ModelTier("deepseek", "deepseek-chat", "https://api.deepseek.com/v1",
+                      deepseek_key, timeout=60, hedge=hedge),
+        ]
+        if hedge:
+            tiers.append(ModelTier(hedge, "gpt-4o-mini", api_key=openai_key, timeout=60, standby=True))
+        return tiers
+    if _valid_key(openai_key):
+        # 细读（summarizer）对长文要求更高，较早升级到 gpt-4o
+        return [
+            ModelTier("openai-mini", "gpt-4o-mini", api_key=openai_key,
+                      max_input_tokens={"summarizer_agent": 1500, "default": 4000}, timeout=30),
+            ModelTier("openai", "gpt-4o", api_key=openai_key, timeout=60),
+        ]
+    return []
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：CJK 字符约 1 token/字，其余约 4 字符/token"""
+    if not text:
+        return 0
+    cjk = len(re.findall(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]", text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def select_tiers(node: str, text: str, tiers: List[ModelTier] = None) -> List[ModelTier]:
+    """
+    返回此次请求的候选模型列表：第一个能处理该输入的级别，以及其后所有用于升级的级别
+    如果没有级别满足长度限制，则只使用最强的级别
+    """
+    tiers = [t for t in (load_tiers() if tiers is None else tiers) if not t.standby]
+    input_tokens = estimate_tokens(text)
+    for i, tier in enumerate(tiers):
+        if tier.accepts(node, input_tokens):
+            return [t for t in tiers[i:] if not t.nodes or node in t.nodes]
+    return tiers[-1:]
+
+def create_llm_for_tier(tier: ModelTier, max_retries: int = None):
+    """根据级别配置创建 ChatOpenAI 实例（经限流器调用时由 call_llm 负责重试，传入 max_retries=0）"""
+    from langchain_openai import ChatOpenAI
+    kwargs = {}
+    if tier.base_url:
+        kwargs["base_url"] = tier.base_url
+    if tier.api_key:
+        kwargs["api_key"] = tier.api_key
+    return ChatOpenAI(
+        model=tier.model,
+        temperature=0,
+        timeout=tier.timeout,
+        max_retries=tier.max_retries if max_retries is None else max_retries,
+        **kwargs
+    )
+
+# --- 限流与重试 ---
+# 调用经过服务商共享的限流器（见 rate_limiter.py）。客户端自身不再重试：
+# 429 时按 Retry-After 暂停整个服务商并收缩并发窗口；连接错误、超时和 5xx 按 tier.max_retries 退避重试。
+# 设置 RATE_LIMIT=0 可关闭限流器，恢复客户端自带的重试行为。
+THROTTLE_RETRIES = 5
+OUTPUT_TOKENS_ESTIMATE = 800
+
+def _is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+def _is_transient(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 408 or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+def _retry_after(error: Exception, default: float) -> float:
+    """读取 429 响应中的 Retry-After（秒）或 retry-after-ms，没有时使用 default"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return default
+
+def _total_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("total_tokens"):
+        return usage["total_tokens"]
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    return token_usage.get("total_tokens")
+
+def call_llm(tier: ModelTier, messages: list):
+    """经服务商限流器调用一次模型，处理 429 和临时错误的重试"""
+    if os.getenv("RATE_LIMIT", "1") == "0":
+        return create_llm_for_tier(tier).invoke(messages)
+    limiter = get_limiter(tier.provider, tier.rpm, tier.tpm, tier.max_concurrency)
+    llm = create_llm_for_tier(tier, max_retries=0)
+    estimated = sum(estimate_tokens(str(getattr(m, "content", ""))) for m in messages) + OUTPUT_TOKENS_ESTIMATE
+    throttles = failures = 0
+    while True:
+        backoff = 0.0
+        with limiter.slot(estimated) as call:
+            try:
+                response = llm.invoke(messages)
+            except Exception as e:
+                if _is_rate_limited(e) and throttles < THROTTLE_RETRIES:
+                    throttles += 1
+                    wait = _retry_after(e, min(30.0, 2.0 ** throttles))
+                    print(f"--- [RateLimit] {tier.provider} 返回 429，暂停 {wait:.1f}s（第 {throttles} 次） ---")
+                    call.throttled(wait)
+                    continue
+                if _is_transient(e) and failures < tier.max_retries:
+                    failures += 1
+                    backoff = min(8.0, 0.5 * 2 ** failures)
+                    print(f"--- [RateLimit] {tier.provider} 调用失败（{type(e).__name__}），{backoff:.1f}s 后重试 ---")
+                else:
+                    raise
+            else:
+                call.done(_total_tokens(response))
+                return response
+        # 退避期间不占用并发名额
+        time.sleep(backoff)
+
+# --- 对冲请求、故障转移与熔断 ---
+# 级别配置了 hedge 时，调用在后台线程中发出；超过该级别（按节点区分）近期延迟的
+# hedge_percentile 百分位仍未返回，就向 hedge 级别发出相同请求，先成功的结果胜出
+# （落后的请求无法中途取消，结果被丢弃）。主调用失败或其服务商已熔断时直接转移到 hedge 级别。
+# 设置 HEDGE=0 可关闭对冲（熔断仍然生效）。
+HEDGE_MIN_SAMPLES = 20
+
+@functools.lru_cache(maxsize=None)
+def _hedge_executor():
+    """对冲调用使用的线程池（首次对冲时创建，不拖慢导入）"""
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-hedge")
+
+def _tracked_call(node: str, tier: ModelTier, messages: list):
+    """经熔断器调用一次模型，并记录成功调用的延迟"""
+    breaker = get_breaker(tier.provider)
+    if not breaker.allow():
+        raise CircuitOpenError(tier.provider, breaker.retry_in())
+    start = time.monotonic()
+    try:
+        response = call_llm(tier, messages)
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    latency_tracker.record((tier.name, node), time.monotonic() - start)
+    return response
+
+def hedge_delay(node: str, tier: ModelTier) -> float:
+    """发出对冲请求前等待的秒数"""
+    delay = latency_tracker.percentile((tier.name, node), tier.hedge_percentile, HEDGE_MIN_SAMPLES)
+    if delay is None:
+        delay = tier.hedge_after if tier.hedge_after is not None else tier.timeout / 4
+    return delay
+
+def call_with_hedge(node: str, tier: ModelTier, messages: list, backup: ModelTier = None):
+    """调用 tier，必要时对冲或转移到 backup；返回 (响应, 实际应答的级别)"""
+    if backup is None:
+        return _tracked_call(node, tier, messages), tier
+    if get_breaker(tier.provider).state == "open":
+        print(f"--- [Failover] {tier.provider} 已熔断，{node} 直接使用 {backup.name} ---")
+        count("failovers")
+        return _tracked_call(node, backup, messages), backup
+    if os.getenv("HEDGE", "1") == "0":
+        try:
+            return _tracked_call(node, tier, messages), tier
+        except Exception as e:
+            print(f"--- [Failover] {tier.name} 调用失败（{type(e).__name__}），转移到 {backup.name} ---")
+            count("failovers")
+            return _tracked_call(node, backup, messages), backup
+
+    from concurrent.futures import FIRST_COMPLETED, wait
+    executor = _hedge_executor()
+    primary = executor.submit(_tracked_call, node, tier, messages)
+    delay = hedge_delay(node, tier)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        try:
+            return primary.result(), tier
+        except Exception as e:
+            print(f"--- [Failover] {tier.name} 调用失败（{type(e).__name__}），转移到 {backup.name} ---")
+            count("failovers")
+            return _tracked_call(node, backup, messages), backup
+
+    print(f"--- [Hedge] {node} 在 {tier.name} 上超过 {delay:.2f}s 未返回，向 {backup.name} 发出对冲请求 ---")
+    count("hedged")
+    pending = {primary: tier, executor.submit(_tracked_call, node, backup, messages): backup}
+    errors = []
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            answered = pending.pop(future)
+            try:
+                response = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if answered is backup:
+                count("hedge_wins")
+            return response, answered
+    raise errors[0]
+
+def invoke_llm(node: str, messages: list, text: str, validate=None):
+    """
+    按分级路由调用模型
+    validate(response) 返回解析后的结果，输出不合格时抛出 ValueError，随后升级到下一级模型重试
+    （跳过与已被拒绝的输出同一服务商、同一模型的级别，同样的请求只会得到同样不合格的输出）
+    某个服务商调用失败时跳过同一服务商的其余级别，转移到下一个服务商
+    返回 (解析结果, 原始响应, 使用的级别)
+    """
+    tiers = load_tiers()
+    candidates = select_tiers(node, text, tiers)
+    if not candidates:
+        raise RuntimeError("未配置 DEEPSEEK_API_KEY 或 OPENAI_API_KEY")
+    by_name = {t.name: t for t in tiers}
+    last_error, last_response = None, None
+    failed_providers, rejected = set(), set()
+    for i, tier in enumerate(candidates):
+        if tier.provider in failed_providers:
+            continue
+        if tier.request_key in rejected:
+            print(f"--- [Router] 跳过 {tier.name}：与输出未通过校验的级别是同一模型 ---")
+            continue
+        print(f"--- [Router] {node} -> {tier.name} ({tier.model}) ---")
+        try:
+            response, tier = call_with_hedge(node, tier, messages, by_name.get(tier.hedge))
+        except Exception as e:
+            failed_providers.add(tier.provider)
+            if not any(t.provider not in failed_providers for t in candidates[i + 1:]):
+                raise
+            print(f"--- [Failover] {tier.provider} 调用失败（{type(e).__name__}），尝试下一个服务商 ---")
+            count("failovers")
+            continue
+        if validate is None:
+            return response.content, response, tier
+        try:
+            return validate(response), response, tier
+        except ValueError as e:
+            print(f"--- [Router] {tier.name} 输出未通过校验: {e} ---")
+            last_error, last_response = e, response
+            rejected.add(tier.request_key)
+    raise OutputValidationError(f"所有模型输出均未通过校验: {last_error}", last_response)
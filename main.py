@@ -1,177 +1,517 @@
 import os
 import json
-import pandas as pd
-from dotenv import load_dotenv
-from typing import TypedDict, List
-from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+import operator
+import time
+import functools
+import threading
+from typing import TypedDict, List, Annotated
+from storage import HISTORY_FILENAME, user_file, file_lock, atomic_writer, normalize_user_id
+from word_store import word_buffer, make_status_change, load_words_df
+from llm_router import (
+    load_environment,
+    select_tiers,
+    invoke_llm,
+    OutputValidationError,
+    estimate_tokens
+)
+from singleflight import llm_flight, make_key
+from search_index import get_search_index
+from cefr_lexicon import LEVELS as CEFR_LEVELS, get_lexicon, select_candidates, tokenize
+from language import detect_text_language
+from definition_cache import definition_cache, definition_of, normalize_word
+from segments import (
+    segment_cache,
+    segment_hash,
+    split_segments,
+    number_segments,
+    assign_to_segments,
+    merge_segment_results,
+    summary_cache
+)
+from semantic_cache import get_semantic_cache
 
-# 加载环境变量
-load_dotenv()
+# 重量级依赖（pandas、langgraph、langchain）都在首次使用时才导入，
+# .env 在首次创建 LLM 或编译图时加载，保证 import main 足够快（见 scripts/bench_import.py）
 
 # 禁用 LangSmith 追踪（如果未配置 API key）
 os.environ.setdefault("LANGCHAIN_TRACING_V2", "false")
 os.environ.setdefault("LANGCHAIN_ENDPOINT", "")
 
-# --- 辅助函数：创建 LLM 实例 ---
-def create_llm():
-    """
-    创建 LLM 实例，支持 DeepSeek 和 OpenAI
-    优先使用 DeepSeek，如果没有配置则使用 OpenAI
-    支持从 .env 文件或 Streamlit secrets 读取配置
-    """
-    # 尝试从 Streamlit secrets 读取（用于 Cloud 部署）
-    try:
-        import streamlit as st
-        deepseek_key = st.secrets.get("DEEPSEEK_API_KEY", None)
-        openai_key = st.secrets.get("OPENAI_API_KEY", None)
-    except:
-        # 如果不在 Streamlit 环境中，从环境变量读取
-        deepseek_key = os.getenv("DEEPSEEK_API_KEY")
-        openai_key = os.getenv("OPENAI_API_KEY")
-    
-    # 如果 secrets 中没有，尝试从环境变量读取（本地开发）
-    if not deepseek_key:
-        deepseek_key = os.getenv("DEEPSEEK_API_KEY")
-    if not openai_key:
-        openai_key = os.getenv("OPENAI_API_KEY")
-    
-    if deepseek_key and deepseek_key != "your_key_here":
-        # 使用 DeepSeek
-        return ChatOpenAI(
-            base_url="https://api.deepseek.com/v1",
-            api_key=deepseek_key,
-            model="deepseek-chat",
-            temperature=0,
-            timeout=60,
-            max_retries=2
-        )
-    elif openai_key and openai_key != "your_key_here":
-        # 使用 OpenAI
-        return ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0,
-            timeout=60,
-            max_retries=2
-        )
-    else:
-        return None
-
 # --- 1. 定义状态 ---
 class AgentState(TypedDict):
+    user_id: str           # 用户标识（决定读写哪个数据分片）
     input_text: str
     known_words: List[str]
+    target_level: str      # 生词的最低 CEFR 等级（默认 B2）
     analysis_result: dict  # 存储生词和语法
     summary_result: str    # 存储大意
     detailed_reading: str  # 存储文本细读
     mastered_new_words: List[str] # 本次学习后可能掌握的词
+    usage: Annotated[dict, operator.or_]  # 各节点的 token 用量（含缓存命中）
+    depth: str             # 分析深度（见 ANALYSIS_DEPTHS），默认 full
+    prefetch: bool         # 后台预取：不更新词库，等用户真正打开时再更新
+
+# 分析深度：由图中的条件边决定执行哪些节点，被跳过的节点不发起任何 LLM 调用
+#   vocab   - 只提取生词和语法（Linguist -> Memory）
+#   summary - 只生成文本大意（Summarizer，不写细读）
+#   full    - 完整分析（Linguist -> Summarizer -> Memory）
+ANALYSIS_DEPTHS = {
+    "vocab": "生词与语法",
+    "summary": "仅大意",
+    "full": "完整分析",
+}
+DEFAULT_DEPTH = "full"
+
+def analysis_depth(state: dict) -> str:
+    """读取状态中的分析深度，未指定或无效时为 full"""
+    depth = state.get('depth') or DEFAULT_DEPTH
+    return depth if depth in ANALYSIS_DEPTHS else DEFAULT_DEPTH
+
+# 学习者的目标等级：只有不低于该 CEFR 等级的词（以及词表中没有的较长单词）才作为候选生词
+DEFAULT_TARGET_LEVEL = "B2"
+
+def target_level(state: dict) -> str:
+    """读取状态中的目标等级，未指定或无效时为 B2"""
+    level = str(state.get('target_level') or DEFAULT_TARGET_LEVEL).upper()
+    return level if level in CEFR_LEVELS else DEFAULT_TARGET_LEVEL
 
 # --- 2. 工具函数：CSV 记忆管理 ---
-def get_known_words_from_csv():
-    try:
-        df = pd.read_csv("data/user_words.csv")
-        return df[df['status'] == 'mastered']['word'].tolist()
-    except FileNotFoundError:
-        return []
+# 词库与历史记录按用户分片存储（见 storage.py），
+# 所有 读取-修改-写回 操作都在分片的文件锁内完成，并以原子替换的方式写盘。
+# 单词状态变更先进入写后缓冲（见 word_store.py），批量写盘。
+def get_known_words_from_csv(user_id: str = None):
+    df = load_words_df(user_id)
+    return df[df['status'] == 'mastered']['word'].tolist()
 
-def mark_word_as_mastered(word: str, level: str = "N/A"):
-    """将单词标记为已掌握并保存到 CSV"""
-    import datetime
-    
-    # 确保 data 目录存在
-    os.makedirs("data", exist_ok=True)
-    
-    try:
-        # 尝试读取现有数据
-        df = pd.read_csv("data/user_words.csv")
-    except FileNotFoundError:
-        # 如果文件不存在，创建新的 DataFrame
-        df = pd.DataFrame(columns=['word', 'level', 'last_queried', 'score', 'status'])
-    
-    # 检查单词是否已存在
-    if word in df['word'].values:
-        # 更新已有单词状态
-        df.loc[df['word'] == word, 'status'] = 'mastered'
-        df.loc[df['word'] == word, 'score'] = 5
-        df.loc[df['word'] == word, 'last_queried'] = datetime.date.today().strftime('%Y-%m-%d')
-        if level != "N/A":
-            df.loc[df['word'] == word, 'level'] = level
-    else:
-        # 插入新单词
-        new_row = {
-            'word': word,
-            'level': level,
-            'last_queried': datetime.date.today().strftime('%Y-%m-%d'),
-            'score': 5,
-            'status': 'mastered'
-        }
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    
-    # 保存到 CSV
-    df.to_csv("data/user_words.csv", index=False)
+def mark_word_as_mastered(word: str, level: str = "N/A", user_id: str = None):
+    """将单词标记为已掌握（先写入缓冲，稍后批量保存到 CSV）"""
+    word_buffer.stage([make_status_change(word, 'mastered', level)], user_id)
+    return True
+
+def mark_words_as_mastered(words: List[str], level: str = "N/A", user_id: str = None):
+    """批量标记为已掌握：无论多少个单词，只重写一次 CSV"""
+    word_buffer.stage([make_status_change(w, 'mastered', level) for w in words], user_id)
+    word_buffer.flush(user_id)
     return True
 
-def get_all_words_from_csv():
+def mark_word_as_learning(word: str, user_id: str = None):
+    """将单词状态改回学习中（分数清零）"""
+    word_buffer.stage([make_status_change(word, 'learning')], user_id)
+    return True
+
+def get_all_words_from_csv(user_id: str = None):
     """获取所有单词（包括已掌握和未掌握的）"""
-    try:
-        df = pd.read_csv("data/user_words.csv")
-        return df.to_dict('records')
-    except FileNotFoundError:
-        return []
+    return load_words_df(user_id).to_dict('records')
 
 # --- 2.1 历史记录管理 ---
-HISTORY_FILE = "data/analysis_history.json"
+# 记录以内容哈希（输入文本 + 分析结果）为 ID，不同机器导出的记录合并时不会冲突。
+# 导入/导出使用 NDJSON（每行一条记录），逐行处理，内存占用与文件大小无关。
+MAX_HISTORY = 100
+HISTORY_CONTENT_KEYS = ('analysis_result', 'summary_result', 'detailed_reading')
+
+def _read_history(path: str) -> list:
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"加载历史记录失败: {e}")
+    return []
 
-def save_analysis_history(input_text: str, result: dict):
-    """保存分析结果到历史记录"""
+def _write_history(history: list, path: str):
+    with atomic_writer(path) as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+
+def record_content_hash(record: dict) -> str:
+    """记录的内容哈希：只取输入文本和分析内容，忽略 ID、时间戳、token 用量等元数据"""
+    result = record.get('result') or {}
+    content = {k: result.get(k) for k in HISTORY_CONTENT_KEYS}
+    return make_key(record.get('input_text', ''), json.dumps(content, ensure_ascii=False, sort_keys=True))
+
+def _stored_hash(record: dict) -> str:
+    return record.get('content_hash') or record_content_hash(record)
+
+def save_analysis_history(input_text: str, result: dict, user_id: str = None):
+    """保存分析结果到历史记录（内容相同的旧记录会被移到最新位置）"""
     import datetime
     
-    # 确保 data 目录存在
-    os.makedirs("data", exist_ok=True)
-    
-    # 读取现有历史记录
-    history = load_analysis_history()
-    
-    # 创建新记录
-    new_record = {
-        "id": len(history) + 1,
-        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "input_text": input_text,
-        "result": result
-    }
-    
-    # 添加到历史记录（最多保存 100 条）
-    history.append(new_record)
-    if len(history) > 100:
-        history = history[-100:]  # 只保留最近 100 条
-    
-    # 保存到文件
+    path = user_file(HISTORY_FILENAME, user_id)
     try:
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
+        with file_lock(path):
+            # 读取现有历史记录
+            history = _read_history(path)
+            
+            # 创建新记录
+            new_record = {
+                "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "input_text": input_text,
+                "result": result
+            }
+            content_hash = record_content_hash(new_record)
+            new_record["id"] = content_hash[:16]
+            new_record["content_hash"] = content_hash
+            
+            # 添加到历史记录（最多保存 100 条）
+            history = [r for r in history if _stored_hash(r) != content_hash]
+            history.append(new_record)
+            if len(history) > MAX_HISTORY:
+                history = history[-MAX_HISTORY:]  # 只保留最近 100 条
+            
+            # 保存到文件
+            _write_history(history, path)
     except Exception as e:
         print(f"保存历史记录失败: {e}")
-
-def load_analysis_history():
-    """加载分析历史记录"""
+        return
+    
+    # 增量更新全文检索索引（索引失败不影响历史记录本身）
     try:
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        _history_search_index(user_id).add_many([new_record])
     except Exception as e:
-        print(f"加载历史记录失败: {e}")
-    return []
+        print(f"更新检索索引失败: {e}")
 
-def get_analysis_by_id(history_id: int):
+def load_analysis_history(user_id: str = None):
+    """加载分析历史记录"""
+    return _read_history(user_file(HISTORY_FILENAME, user_id))
+
+def get_analysis_by_id(history_id, user_id: str = None):
     """根据 ID 获取历史记录"""
-    history = load_analysis_history()
+    history = load_analysis_history(user_id)
     for record in history:
-        if record.get('id') == history_id:
+        if str(record.get('id')) == str(history_id):
             return record
     return None
 
-# --- 3. 定义 Agent 节点 ---
+def iter_history_ndjson(user_id: str = None):
+    """逐行产出某个用户历史记录的 NDJSON 导出内容"""
+    for record in load_analysis_history(user_id):
+        record = dict(record, content_hash=_stored_hash(record))
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+def iter_history_records(source):
+    """
+    从 NDJSON 行（str/bytes）或记录字典组成的可迭代对象中逐条产出记录
+    无法解析或缺少 input_text 的行产出 None
+    """
+    for item in source:
+        if isinstance(item, bytes):
+            item = item.decode('utf-8', errors='replace')
+        if isinstance(item, str):
+            item = item.strip()
+            if not item:
+                continue
+            try:
+                item = json.loads(item)
+            except json.JSONDecodeError:
+                yield None
+                continue
+        yield item if isinstance(item, dict) and 'input_text' in item else None
+
+def import_history_stream(source, user_id: str = None) -> dict:
+    """
+    流式导入历史记录（NDJSON 文件对象、行迭代器或记录列表），按内容哈希去重
+    只在内存中保留每条记录 16 字节的哈希和最新的 100 条记录，可处理任意大小的归档
+    返回 {"imported": 新记录数, "duplicates": 重复数, "invalid": 无效行数, "kept": 实际保留数}
+    """
+    import heapq
+    
+    path = user_file(HISTORY_FILENAME, user_id)
+    seen = {bytes.fromhex(_stored_hash(r))[:16] for r in _read_history(path)}
+    newest = []  # 小顶堆：(timestamp, 序号, 记录)，只保留最新的 MAX_HISTORY 条
+    stats = {"imported": 0, "duplicates": 0, "invalid": 0, "kept": 0}
+    # 检索索引不受 100 条上限限制：所有新记录分批写入索引
+    index = _history_search_index(user_id)
+    to_index = []
+    
+    for seq, record in enumerate(iter_history_records(source)):
+        if record is None:
+            stats["invalid"] += 1
+            continue
+        content_hash = record_content_hash(record)
+        digest = bytes.fromhex(content_hash)[:16]
+        if digest in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(digest)
+        stats["imported"] += 1
+        record = dict(record, id=content_hash[:16], content_hash=content_hash)
+        item = (str(record.get('timestamp', '')), seq, record)
+        if len(newest) < MAX_HISTORY:
+            heapq.heappush(newest, item)
+        else:
+            heapq.heappushpop(newest, item)
+        to_index.append(record)
+        if len(to_index) >= 500:
+            index.add_many(to_index)
+            to_index = []
+    index.add_many(to_index)
+    
+    if newest:
+        with file_lock(path):
+            # 导入期间可能有新的分析写入，合并前重新读取并再次去重
+            existing_history = _read_history(path)
+            existing_hashes = {_stored_hash(r) for r in existing_history}
+            new_records = [r for _, _, r in newest if r['content_hash'] not in existing_hashes]
+            merged_history = existing_history + new_records
+            # 按时间戳排序，只保留最近 100 条
+            merged_history.sort(key=lambda x: str(x.get('timestamp', '')))
+            merged_history = merged_history[-MAX_HISTORY:]
+            _write_history(merged_history, path)
+            kept_hashes = {r.get('content_hash') for r in merged_history}
+            stats["kept"] = sum(1 for r in new_records if r['content_hash'] in kept_hashes)
+    return stats
+
+def clear_analysis_history(user_id: str = None):
+    """清空某个用户的历史记录（同时清空检索索引）"""
+    path = user_file(HISTORY_FILENAME, user_id)
+    with file_lock(path):
+        if os.path.exists(path):
+            os.remove(path)
+        get_search_index(user_id).clear()
+
+def _history_search_index(user_id: str = None):
+    """返回用户的检索索引；首次使用时用现有历史记录回填"""
+    index = get_search_index(user_id)
+    if not index.is_built():
+        index.rebuild(_read_history(user_file(HISTORY_FILENAME, user_id)))
+    return index
+
+def search_analysis_history(query: str, user_id: str = None, field: str = None, limit: int = 20) -> list:
+    """
+    全文检索历史分析（原文 / 生词 / 语法点），包括已滚出历史列表的旧记录
+    field 可为 "input_text"、"words"、"grammar"，为 None 时检索全部
+    返回 [{"record": 记录, "snippet": 命中片段}]，最新的在前
+    """
+    return _history_search_index(user_id).search(query, field=field, limit=limit)
+
+# --- 3. 提示词布局（前缀稳定，便于服务端 Prompt 缓存） ---
+# DeepSeek / OpenAI 会对重复的请求前缀做缓存：命中部分更便宜、更快。
+# 因此消息按「系统提示词 -> 已知词块 -> 待分析文本」排列，
+# 前两部分对同一用户逐字节不变，只有最后的文本是变量。
+# Linguist 节点的结果写入所有用户共享的片段缓存，发送时已知词块为空（对所有用户都相同），
+# 已知词在合并结果时剔除。
+# 修改已知词块的格式时请递增版本号，避免新旧格式混用同一缓存前缀。
+KNOWN_WORDS_BLOCK_VERSION = "kw-v1"
+
+@functools.lru_cache(maxsize=None)
+def load_prompt(name: str) -> str:
+    """读取 prompts/ 下的提示词模板（进程内只读一次）"""
+    with open(os.path.join("prompts", f"{name}.md"), "r", encoding="utf-8") as f:
+        return f.read()
+
+def prompt_version(name: str) -> str:
+    """提示词模板内容的短哈希，模板修改后相关缓存自动失效"""
+    return make_key(load_prompt(name))[:12]
+
+def build_known_words_block(known_words: List[str]) -> str:
+    """构建已知词块：去重、统一小写并排序，保证相同词库得到相同字节"""
+    words = sorted({str(w).strip().lower() for w in (known_words or []) if str(w).strip()})
+    words_str = ", ".join(words) if words else "无"
+    return (
+        f"[{KNOWN_WORDS_BLOCK_VERSION}] 以下 {len(words)} 个单词用户已掌握，请在词汇表中剔除：\n"
+        f"{words_str}"
+    )
+
+def build_candidates_line(candidates: List[str]) -> str:
+    """Linguist 请求中的候选生词列表"""
+    return f"候选生词（已由本地 CEFR 词表预筛选，生词只能从中选择）：{', '.join(candidates) if candidates else '无'}"
+
+def build_linguist_messages(known_words: List[str], input_text: str, candidates: List[str] = None,
+                            defined: List[str] = None) -> list:
+    """构建 Linguist 节点的消息：稳定前缀在前，待分析文本（及候选生词、已有释义的词）在最后"""
+    from langchain_core.messages import SystemMessage, HumanMessage
+    user_content = f"待分析文本：{input_text}"
+    if candidates is not None:
+        user_content += f"\n\n{build_candidates_line(candidates)}"
+    if defined:
+        user_content += f"\n\n已有释义的词（若判定为生词，只输出 word 和 segment）：{', '.join(defined)}"
+    return [
+        SystemMessage(content=load_prompt("linguist")),
+        HumanMessage(content=build_known_words_block(known_words)),
+        HumanMessage(content=user_content),
+    ]
+
+def prefilter_candidates(state: AgentState, text: str):
+    """
+    用本地 CEFR 词表预筛选 text 中的候选生词（不剔除已知词：结果写入所有用户共享的片段缓存）
+    全文不是英文、没有词表或设置 LEXICON_PREFILTER=0 时返回 (None, None)，由模型自行判断
+    （英文词表会把法语 chat、pain 等同形词当作简单词筛掉，而模型只能从候选中选择生词）
+    """
+    if os.getenv("LEXICON_PREFILTER", "1") == "0":
+        return None, None
+    # 按全文检测语言：text 可能只是改动过的一两句
+    if detect_text_language(state.get('input_text') or text) != "en":
+        return None, None
+    lexicon = get_lexicon("en")
+    if lexicon is None:
+        return None, None
+    candidates, stats = select_candidates(
+        text,
+        lexicon,
+        min_level=target_level(state)
+    )
+    # 按实际发送的候选列表计算：与把文本中全部单词列给模型相比少发送的 prompt tokens
+    all_words = list(dict.fromkeys(word.lower() for word in tokenize(text)))
+    stats["prompt_tokens_saved"] = (
+        estimate_tokens(build_candidates_line(all_words)) - estimate_tokens(build_candidates_line(candidates))
+    )
+    print(
+        f"--- [Lexicon] {stats['unique_words']} 个词中筛出 {stats['candidates']} 个候选，"
+        f"{stats['filtered_out']} 个词不再交给模型判断难度，候选列表少 {stats['prompt_tokens_saved']} 个 prompt tokens ---"
+    )
+    return candidates, stats
+
+def definition_version(language: str) -> str:
+    """释义缓存的版本键：提示词版本 + 文本语言（同形词在不同语言中释义不同，如法语的 pain、chat）"""
+    return f"{prompt_version('linguist')}-{language}"
+
+def lookup_definitions(candidates: List[str], text: str, language: str = "en") -> dict:
+    """
+    查询共享释义缓存（只取同一语言文本中生成的释义）：有候选生词时只查候选词，否则查文本中出现的全部单词
+    设置 DEFINITION_CACHE=0 时不使用缓存
+    """
+    if os.getenv("DEFINITION_CACHE", "1") == "0":
+        return {}
+    words = candidates if candidates is not None else tokenize(text)
+    return definition_cache.get_many(words, definition_version(language))
+
+def fill_definitions(analysis: dict, defined: dict, language: str = "en") -> dict:
+    """
+    用缓存补全模型只给出单词的条目，并把新生成的释义按文本语言写回缓存
+    返回统计：生词数、由缓存补全数、命中率、约节省的输出 token
+    """
+    version = definition_version(language)
+    vocabulary = [item for item in analysis.get("vocabulary") or [] if isinstance(item, dict)]
+    filled, fresh, saved = [], {}, 0
+    for item in vocabulary:
+        key = normalize_word(item.get("word", ""))
+        if not key:
+            continue
+        if key in defined and not definition_of(item):
+            item.update({k: v for k, v in defined[key].items() if not item.get(k)})
+            filled.append(key)
+            saved += estimate_tokens(json.dumps(defined[key], ensure_ascii=False))
+        elif key not in defined and definition_of(item):
+            fresh[key] = definition_of(item)
+    if os.getenv("DEFINITION_CACHE", "1") != "0":
+        definition_cache.put_many(fresh, version)
+        definition_cache.record_hits(filled, version)
+    stats = {
+        "vocabulary": len(vocabulary),
+        "offered": len(defined),
+        "filled": len(filled),
+        "hit_rate": round(len(filled) / len(vocabulary), 3) if vocabulary else 0.0,
+        "output_tokens_saved": saved,
+    }
+    print(
+        f"--- [Definitions] {stats['vocabulary']} 个生词中 {stats['filled']} 个由释义缓存补全，"
+        f"约节省 {saved} 个输出 tokens ---"
+    )
+    return stats
+
+def build_summarizer_messages(input_text: str, detailed: bool = True) -> list:
+    """
+    构建 Summarizer 节点的消息：系统提示词在前，待分析文本在最后
+    detailed=False 时要求只输出大意（系统提示词不变，与完整分析共享缓存前缀）
+    """
+    from langchain_core.messages import SystemMessage, HumanMessage
+    request = "请分析以下文本" if detailed else "请只概括以下文本的大意（detailed_reading 输出空字符串）"
+    return [
+        SystemMessage(content=load_prompt("summarizer")),
+        HumanMessage(content=f"{request}：\n\n{input_text}"),
+    ]
+
+# 改动的句子不超过全文的这个比例时，大意按上一版增量更新，否则重新概括整篇
+SUMMARY_REVISE_MAX_CHANGED = 0.5
+
+def build_summarizer_update_messages(previous: dict, added: List[tuple], removed: List[str],
+                                     detailed: bool = True) -> list:
+    """
+    构建增量更新大意的消息：系统提示词与完整分析相同（共享缓存前缀），
+    最后一条消息只包含上一版结果和增删的句子；added 为 [(句子序号, 句子)]
+    """
+    from langchain_core.messages import SystemMessage, HumanMessage
+    lines = [
+        "此前已分析过这篇文本的上一版，结果如下：",
+        json.dumps({k: previous.get(k, "") for k in ("summary", "detailed_reading")}, ensure_ascii=False),
+        "",
+        "文本随后有改动（按句子比较）。",
+        "新增或改写后的句子：",
+        *([f"- 第 {i + 1} 句：{sentence}" for i, sentence in added] or ["（无）"]),
+        "删除或被改写的原句：",
+        *([f"- {sentence}" for sentence in removed] or ["（无）"]),
+        "",
+        "请据此修改上一版结果，不受改动影响的内容保持原样，按相同的 JSON 格式输出完整结果"
+        + ("。" if detailed else "（只需大意，detailed_reading 输出空字符串）。"),
+    ]
+    return [
+        SystemMessage(content=load_prompt("summarizer")),
+        HumanMessage(content="\n".join(lines)),
+    ]
+
+def extract_token_usage(response) -> dict:
+    """
+    从 LLM 响应中提取 token 用量，包括命中 Prompt 缓存的 token 数
+    兼容 OpenAI (prompt_tokens_details.cached_tokens) 与
+    DeepSeek (prompt_cache_hit_tokens) 两种返回格式
+    """
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    details = token_usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens")
+    if cached is None:
+        cached = token_usage.get("prompt_cache_hit_tokens")
+    if cached is None:
+        # langchain 统一的 usage_metadata 格式
+        usage_metadata = getattr(response, "usage_metadata", None) or {}
+        cached = (usage_metadata.get("input_token_details") or {}).get("cache_read", 0)
+    return {
+        "prompt_tokens": token_usage.get("prompt_tokens", 0),
+        "completion_tokens": token_usage.get("completion_tokens", 0),
+        "cached_tokens": cached or 0,
+    }
+
+def report_token_usage(node_name: str, response, coalesced: bool = False) -> dict:
+    """打印并返回某个节点的 token 用量（合并的请求没有新的花费，记为 0）"""
+    if coalesced:
+        stats = llm_flight.stats()
+        print(f"--- [{node_name}] 已合并到进行中的相同请求（累计合并 {stats['coalesced']} 次） ---")
+        return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "coalesced": True}
+    usage = extract_token_usage(response)
+    print(
+        f"--- [{node_name}] prompt={usage['prompt_tokens']} "
+        f"(缓存命中 {usage['cached_tokens']}) completion={usage['completion_tokens']} ---"
+    )
+    return usage
+
+def parse_json_content(content: str) -> dict:
+    """解析 LLM 返回的 JSON（兼容 Markdown 代码块标签）"""
+    clean_content = content.replace("```json", "").replace("```", "").strip()
+    result = json.loads(clean_content)
+    if not isinstance(result, dict):
+        raise ValueError("返回内容不是 JSON 对象")
+    return result
+
+def validate_linguist_output(response) -> dict:
+    """校验 Linguist 输出：必须是包含 vocabulary 列表的 JSON"""
+    analysis = parse_json_content(response.content)
+    if not isinstance(analysis.get("vocabulary"), list):
+        raise ValueError("缺少 vocabulary 列表")
+    return analysis
+
+def validate_summarizer_output(response) -> dict:
+    """校验 Summarizer 输出：必须是包含非空 summary 的 JSON"""
+    result = parse_json_content(response.content)
+    if not result.get("summary"):
+        raise ValueError("缺少 summary")
+    return result
+
+# --- 4. 定义 Agent 节点 ---
+
+class NodeFailedError(RuntimeError):
+    """节点执行失败；同一 run_id 再次运行时从失败的节点继续"""
+
+    def __init__(self, node: str, message: str):
+        super().__init__(f"{node} 执行失败: {message}")
+        self.node = node
 
 def linguist_node(state: AgentState):
     """
@@ -181,41 +521,107 @@ def linguist_node(state: AgentState):
     print("--- [Linguist] 正在分析文本生词与语法... ---")
     
     try:
-        # 创建 LLM 实例
-        llm = create_llm()
-        if llm is None:
+        if not select_tiers("linguist_agent", state['input_text']):
             print("⚠️ 警告: 未配置 DEEPSEEK_API_KEY 或 OPENAI_API_KEY，请在 .env 文件中设置")
-            return {"analysis_result": {"vocabulary": [], "grammar_points": []}}
+            raise NodeFailedError("linguist_agent", "未配置 DEEPSEEK_API_KEY 或 OPENAI_API_KEY")
         
-        # 1. 加载提示词模板
-        with open("prompts/linguist.md", "r", encoding="utf-8") as f:
-            system_prompt = f.read()
+        # 1. 切分句子，已分析过的句子直接复用片段缓存
+        #    片段缓存由所有用户共享，缓存上下文只包含提示词版本和目标等级：
+        #    片段结果按不含已知词的请求生成（见第 2、4 步），已知词只在合并全文结果时剔除（见第 8 步），
+        #    因此结果与用户无关，标记一个单词为已掌握或改回学习中也不会让所有句子失效
+        known_words = state.get('known_words', [])
+        segments = split_segments(state['input_text'])
+        hashes = [segment_hash(seg) for seg in segments]
+        cache_context = make_key(prompt_version("linguist"), target_level(state))
+        use_cache = os.getenv("SEGMENT_CACHE", "1") != "0"
+        cached = segment_cache.get_many(hashes, cache_context) if use_cache else {}
+        todo, pending = [], set()
+        for i, h in enumerate(hashes):
+            if h not in cached and h not in pending:
+                pending.add(h)
+                todo.append(i)
+        segment_stats = {"total": len(segments), "reused": len(segments) - len(todo), "analyzed": len(todo)}
+        print(f"--- [Linguist] 共 {len(segments)} 句，复用 {segment_stats['reused']} 句，需分析 {len(todo)} 句 ---")
         
-        # 2. 注入动态上下文（已知单词）
-        known_words_str = ", ".join(state['known_words']) if state['known_words'] else "无"
-        user_content = f"待分析文本：{state['input_text']}\n\n注意：以下单词用户已掌握，请在词汇表中剔除：{known_words_str}"
+        usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        prefilter_stats = definition_stats = None
+        if todo:
+            analysis_text = number_segments(segments, todo)
+            
+            # 2. 本地词表预筛选候选生词，模型只需为候选词提供释义和音标
+            candidates, prefilter_stats = prefilter_candidates(state, analysis_text)
+            
+            # 3. 已解释过的词从释义缓存取（按全文语言区分），模型只需判断是否为生词
+            language = detect_text_language(state['input_text'])
+            defined = lookup_definitions(candidates, analysis_text, language)
+            
+            # 4. 构建消息（系统提示词 + 已知词块为稳定前缀，文本放在最后）
+            #    写入共享片段缓存的结果不能依赖某个用户的词库，已知词块留空
+            messages = build_linguist_messages([], analysis_text, candidates, sorted(defined))
+            
+            # 5. 发起请求（按输入长度路由，输出不合格时自动升级模型）
+            #    不同用户对相同句子的并发请求合并为一次调用
+            flight_key = make_key("linguist_agent", messages[1].content, messages[2].content)
+            try:
+                (analysis, response, tier), coalesced = llm_flight.do(
+                    flight_key,
+                    lambda: invoke_llm(
+                        "linguist_agent", messages, analysis_text, validate=validate_linguist_output
+                    )
+                )
+            except OutputValidationError as e:
+                # 解析失败 (所有模型都未返回合格的 JSON)
+                print(f"解析失败: {e}")
+                if e.response is not None:
+                    print(f"原始响应: {e.response.content}")
+                raise NodeFailedError("linguist_agent", "模型未返回合格的 JSON") from e
+            
+            usage = report_token_usage("Linguist", response, coalesced)
+            usage["model"] = tier.model
+            
+            # 6. 补全只给出单词的条目（合并的并发请求共享同一结果，补全前先复制）
+            analysis = json.loads(json.dumps(analysis))
+            definition_stats = fill_definitions(analysis, defined, language)
+            
+            # 7. 把结果拆回各个句子并写入片段缓存
+            per_segment = assign_to_segments(analysis, segments, todo)
+            fresh = {hashes[i]: result for i, result in per_segment.items()}
+            if use_cache:
+                segment_cache.put_many(fresh, cache_context)
+            cached.update(fresh)
         
-        # 3. 发起请求
-        response = llm.invoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_content)
-        ])
+        # 8. 按句子顺序合并全文结果
+        analysis = merge_segment_results([cached[h] for h in hashes], exclude=known_words)
         
-        # 4. 解析结果 (由于 Prompt 要求 JSON 格式)
-        try:
-            # 兼容处理 LLM 可能返回的 Markdown 标签
-            clean_content = response.content.replace("```json", "").replace("```", "").strip()
-            analysis = json.loads(clean_content)
-        except Exception as e:
-            print(f"解析失败: {e}")
-            print(f"原始响应: {response.content}")
-            analysis = {"vocabulary": [], "grammar_points": []}
-        
-        return {"analysis_result": analysis}
+        usage["segments"] = segment_stats
+        if prefilter_stats:
+            usage["prefilter"] = prefilter_stats
+        if definition_stats:
+            usage["definitions"] = definition_stats
+        return {"analysis_result": analysis, "usage": {"linguist_agent": usage}}
+    except NodeFailedError:
+        raise
     except Exception as e:
         print(f"LLM 调用失败: {e}")
-        # 返回空结果作为降级处理
-        return {"analysis_result": {"vocabulary": [], "grammar_points": []}}
+        # 标记为失败（不返回空结果），再次运行时从本节点继续
+        raise NodeFailedError("linguist_agent", str(e)) from e
+
+def summary_cache_key(text: str, depth: str) -> tuple:
+    """大意缓存的键：(句子列表, 句子哈希, 文档键, 缓存上下文)；summary 深度不生成细读，分开缓存"""
+    segments = split_segments(text)
+    hashes = [segment_hash(seg) for seg in segments]
+    return segments, hashes, make_key(*hashes), make_key(prompt_version("summarizer"), depth == "full")
+
+def seed_summary_cache(text: str, result: dict, depth: str):
+    """把已有结果登记为 text 的大意（已缓存时不覆盖），相似的新文本可在其基础上增量更新"""
+    if os.getenv("SEGMENT_CACHE", "1") == "0" or not result.get('summary_result'):
+        return
+    segments, _, doc, cache_context = summary_cache_key(text, depth)
+    if summary_cache.get(doc, cache_context) is None:
+        summary_cache.put(doc, cache_context, segments, {
+            "summary": result['summary_result'],
+            "detailed_reading": result.get('detailed_reading', "") if depth == "full" else "",
+        })
 
 def summarizer_node(state: AgentState):
     """
@@ -224,137 +630,356 @@ def summarizer_node(state: AgentState):
     print("--- [Summarizer] 正在生成文本大意和细读... ---")
     
     try:
-        # 创建 LLM 实例
-        llm = create_llm()
-        if llm is None:
+        if not select_tiers("summarizer_agent", state['input_text']):
             print("⚠️ 警告: 未配置 DEEPSEEK_API_KEY 或 OPENAI_API_KEY，请在 .env 文件中设置")
+            raise NodeFailedError("summarizer_agent", "未配置 DEEPSEEK_API_KEY 或 OPENAI_API_KEY")
+        
+        # 1. 按句子切分；句子序列与已缓存的文档相同时直接复用（summary 深度不生成细读，分开缓存）
+        #    与片段缓存一样，SEGMENT_CACHE=0 时关闭
+        detailed = analysis_depth(state) == "full"
+        segments, hashes, doc, cache_context = summary_cache_key(state['input_text'], analysis_depth(state))
+        use_cache = os.getenv("SEGMENT_CACHE", "1") != "0"
+        cached = summary_cache.get(doc, cache_context) if use_cache else None
+        if cached is not None:
+            print("--- [Summarizer] 文本未变化，复用上次的大意 ---")
             return {
-                "summary_result": "请配置 DEEPSEEK_API_KEY 或 OPENAI_API_KEY 后重试",
-                "detailed_reading": "请配置 DEEPSEEK_API_KEY 或 OPENAI_API_KEY 后重试"
+                "summary_result": cached['result'].get("summary", ""),
+                "detailed_reading": cached['result'].get("detailed_reading", ""),
+                "usage": {"summarizer_agent": {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+                                               "summary_cache": "reused"}}
             }
         
-        # 1. 加载提示词模板
-        with open("prompts/summarizer.md", "r", encoding="utf-8") as f:
-            system_prompt = f.read()
-        
-        # 2. 构建用户输入
-        user_content = f"请分析以下文本：\n\n{state['input_text']}"
+        # 2. 与已缓存的某个版本只差少数句子时，只把上一版结果和增删的句子发给模型；
+        #    否则构建完整消息（系统提示词在前，文本在最后）
+        base = summary_cache.find_base(hashes, cache_context) if use_cache else None
+        mode = "full"
+        if base is not None:
+            base_hashes, current = {segment_hash(seg) for seg in base['segments']}, set(hashes)
+            added = [(i, seg) for i, (seg, h) in enumerate(zip(segments, hashes)) if h not in base_hashes]
+            removed = [seg for seg in base['segments'] if segment_hash(seg) not in current]
+            changed = len(added) + len(removed)
+            if changed <= SUMMARY_REVISE_MAX_CHANGED * max(len(segments), len(base['segments'])):
+                mode = "revised"
+                print(f"--- [Summarizer] 与上一版相比改动 {changed} 句，增量更新大意 ---")
+                messages = build_summarizer_update_messages(base['result'], added, removed, detailed)
+        if mode == "full":
+            messages = build_summarizer_messages(state['input_text'], detailed)
         
-        # 3. 发起请求
-        response = llm.invoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_content)
-        ])
-        
-        # 4. 解析结果
+        # 3. 发起请求（按输入长度路由，输出不合格时自动升级模型）
+        #    内容相同的并发请求合并为一次调用
+        request_text = messages[-1].content
+        flight_key = make_key("summarizer_agent", request_text, detailed)
         try:
-            # 兼容处理 LLM 可能返回的 Markdown 标签
-            clean_content = response.content.replace("```json", "").replace("```", "").strip()
-            result = json.loads(clean_content)
-            summary = result.get("summary", "")
-            detailed_reading = result.get("detailed_reading", "")
-        except Exception as e:
+            (result, response, tier), coalesced = llm_flight.do(
+                flight_key,
+                lambda: invoke_llm(
+                    "summarizer_agent", messages, request_text, validate=validate_summarizer_output
+                )
+            )
+        except OutputValidationError as e:
+            # 4. 解析失败 (所有模型都未返回合格的 JSON)：标记为失败，不把原始响应当作大意
             print(f"解析失败: {e}")
-            print(f"原始响应: {response.content}")
-            # 如果解析失败，尝试直接使用响应内容
-            summary = response.content
-            detailed_reading = response.content
+            if e.response is not None:
+                print(f"原始响应: {e.response.content}")
+            raise NodeFailedError("summarizer_agent", "模型未返回合格的 JSON") from e
+        summary = result.get("summary", "")
+        detailed_reading = result.get("detailed_reading", "")
+        if use_cache:
+            summary_cache.put(doc, cache_context, segments,
+                              {"summary": summary, "detailed_reading": detailed_reading})
         
+        usage = report_token_usage("Summarizer", response, coalesced)
+        usage["model"] = tier.model
+        usage["summary_cache"] = mode
         return {
             "summary_result": summary,
-            "detailed_reading": detailed_reading
+            "detailed_reading": detailed_reading,
+            "usage": {"summarizer_agent": usage}
         }
+    except NodeFailedError:
+        raise
     except Exception as e:
         print(f"LLM 调用失败: {e}")
-        # 返回降级结果
-        return {
-            "summary_result": "无法生成摘要，请检查 API 配置。",
-            "detailed_reading": "无法生成细读，请检查 API 配置。"
-        }
+        # 标记为失败（不返回占位文字），Linguist 的结果已保存在检查点中，再次运行时只重跑本节点
+        raise NodeFailedError("summarizer_agent", str(e)) from e
+
+def update_word_memory(vocabulary: list, user_id: str = None) -> List[str]:
+    """
+    将生词写入或更新到用户分片的 user_words.csv（新词状态为 learning）
+    返回本次新加入词库的单词
+    """
+    import pandas as pd
+    new_words = []
+    
+    def update_words(df):
+        # 处理每个生词
+        for word_info in vocabulary:
+            if isinstance(word_info, dict):
+                word = word_info.get('word', '')
+                if word:
+                    # 检查单词是否已存在
+                    if word not in df['word'].values:
+                        # 新单词，添加到词库（状态为 learning）
+                        import datetime
+                        new_row = {
+                            'word': word,
+                            'level': 'N/A',
+                            'last_queried': datetime.date.today().strftime('%Y-%m-%d'),
+                            'score': 0,  # 初始分数为 0
+                            'status': 'learning'  # 初始状态为学习中
+                        }
+                        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+                        new_words.append(word)
+                    else:
+                        # 单词已存在，更新查询时间
+                        import datetime
+                        df.loc[df['word'] == word, 'last_queried'] = datetime.date.today().strftime('%Y-%m-%d')
+        return df
+    
+    # 与缓冲中待写入的状态变更合并为一次写盘
+    if vocabulary:
+        word_buffer.flush(user_id, transform=update_words)
+    return new_words
 
 def memory_updater_node(state: AgentState):
     """
     节点 3: 记忆更新（核心算法逻辑）
-    将本次提取的生词写入或更新到 user_words.csv（状态为 learning）
+    将本次提取的生词写入或更新到用户分片的 user_words.csv（状态为 learning）
+    后台预取的运行跳过此步，用户打开结果时再调用 update_word_memory
     """
+    if state.get('prefetch'):
+        print("--- [Memory] 后台预取，暂不更新词库 ---")
+        return {"mastered_new_words": []}
     print("--- [Memory] 正在更新用户词库频率... ---")
     
     # 获取本次分析的生词
     vocabulary = state.get('analysis_result', {}).get('vocabulary', [])
-    new_words = []
-    
-    # 确保 data 目录存在
-    os.makedirs("data", exist_ok=True)
-    
-    try:
-        # 尝试读取现有数据
-        df = pd.read_csv("data/user_words.csv")
-    except FileNotFoundError:
-        # 如果文件不存在，创建新的 DataFrame
-        df = pd.DataFrame(columns=['word', 'level', 'last_queried', 'score', 'status'])
+    return {"mastered_new_words": update_word_memory(vocabulary, state.get('user_id'))}
+
+# --- 5. 构建图逻辑 ---
+
+def build_workflow():
+    """构建 LangGraph 工作流（未编译）"""
+    from langgraph.graph import StateGraph, END
     
-    # 处理每个生词
-    for word_info in vocabulary:
-        if isinstance(word_info, dict):
-            word = word_info.get('word', '')
-            if word:
-                # 检查单词是否已存在
-                if word not in df['word'].values:
-                    # 新单词，添加到词库（状态为 learning）
-                    import datetime
-                    new_row = {
-                        'word': word,
-                        'level': 'N/A',
-                        'last_queried': datetime.date.today().strftime('%Y-%m-%d'),
-                        'score': 0,  # 初始分数为 0
-                        'status': 'learning'  # 初始状态为学习中
-                    }
-                    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                    new_words.append(word)
-                else:
-                    # 单词已存在，更新查询时间
-                    import datetime
-                    df.loc[df['word'] == word, 'last_queried'] = datetime.date.today().strftime('%Y-%m-%d')
+    workflow = StateGraph(AgentState)
     
-    # 保存到 CSV
-    if not df.empty:
-        df.to_csv("data/user_words.csv", index=False)
+    # 添加节点
+    workflow.add_node("linguist_agent", linguist_node)
+    workflow.add_node("summarizer_agent", summarizer_node)
+    workflow.add_node("memory_manager", memory_updater_node)
     
-    return {"mastered_new_words": new_words}
+    # 设置逻辑连线：按分析深度走条件边
+    #   vocab:   linguist -> memory
+    #   summary: summarizer -> END
+    #   full:    linguist -> summarizer -> memory
+    workflow.set_conditional_entry_point(
+        lambda state: "summarizer_agent" if analysis_depth(state) == "summary" else "linguist_agent",
+        ["linguist_agent", "summarizer_agent"]
+    )
+    workflow.add_conditional_edges(
+        "linguist_agent",
+        lambda state: "summarizer_agent" if analysis_depth(state) == "full" else "memory_manager",
+        ["summarizer_agent", "memory_manager"]
+    )
+    workflow.add_conditional_edges(
+        "summarizer_agent",
+        lambda state: "memory_manager" if analysis_depth(state) == "full" else END,
+        ["memory_manager", END]
+    )
+    workflow.add_edge("memory_manager", END)
+    return workflow
+
+# --- 5.1 检查点与断点续跑 ---
+# 每次运行以 run_id 作为 LangGraph 的 thread_id，每个节点完成后其输出写入本地 SQLite 检查点。
+# 某个节点失败时（例如 Summarizer 超时）直接抛出 NodeFailedError，检查点停在失败的节点之前；
+# 用户再次点击分析时，相同的 run_id 从失败的节点继续，已成功节点的 LLM 调用不会重复付费。
+# 运行完成后删除该 run 的检查点。没有安装 langgraph-checkpoint-sqlite 时退回内存检查点
+# （进程内仍可续跑），设置 CHECKPOINTS=0 可完全关闭。
+CHECKPOINT_FILE = "data/checkpoints.db"
+
+def create_checkpointer():
+    """创建检查点存储：优先 SQLite，未安装时使用内存"""
+    if os.getenv("CHECKPOINTS", "1") == "0":
+        return None
+    try:
+        import sqlite3
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        from langgraph.checkpoint.memory import InMemorySaver
+        print("--- [Checkpoint] 未安装 langgraph-checkpoint-sqlite，检查点只保存在内存中 ---")
+        return InMemorySaver()
+    os.makedirs(os.path.dirname(CHECKPOINT_FILE), exist_ok=True)
+    conn = sqlite3.connect(CHECKPOINT_FILE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return SqliteSaver(conn)
+
+@functools.lru_cache(maxsize=None)
+def get_app():
+    """首次调用时加载环境变量并编译图（带检查点），之后复用同一个已编译的 app"""
+    load_environment()
+    return build_workflow().compile(checkpointer=create_checkpointer())
 
-# --- 4. 构建图逻辑 ---
+def make_run_id(user_id: str, input_text: str, depth: str = DEFAULT_DEPTH,
+                level: str = DEFAULT_TARGET_LEVEL) -> str:
+    """同一用户以同一深度、同一目标等级分析同一文本时使用相同的 run_id，失败后重试即可续跑"""
+    return make_key("run", normalize_user_id(user_id), input_text, depth, level)[:24]
 
-workflow = StateGraph(AgentState)
+def get_run_status(run_id: str) -> dict:
+    """查询某次运行的检查点：待执行的节点，以及上次失败的节点和错误信息"""
+    app = get_app()
+    if app.checkpointer is None:
+        return {"pending": [], "failed": {}}
+    snapshot = app.get_state({"configurable": {"thread_id": run_id}})
+    return {
+        "pending": list(snapshot.next),
+        "failed": {task.name: str(task.error) for task in snapshot.tasks if task.error},
+    }
+
+class RunActivity:
+    """记录前台分析的进行情况，后台预取据此判断是否空闲（见 reading_list.py）"""
+
+    def __init__(self):
+        self.active = 0
+        self.last_finished = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.active += 1
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.active -= 1
+            self.last_finished = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        """距离最近一次前台分析结束的秒数；有分析正在进行时为 0"""
+        with self._lock:
+            return 0.0 if self.active else time.monotonic() - self.last_finished
+
+run_activity = RunActivity()
+
+def run_analysis(initial_state: dict, run_id: str = None) -> dict:
+    """
+    运行分析图并返回最终状态
+    相同 run_id 的上一次运行中途失败时，从失败的节点继续，已完成节点的输出直接复用
+    节点失败时抛出 NodeFailedError
+    """
+    if initial_state.get('prefetch'):
+        return _analyze(initial_state, run_id)
+    with run_activity:
+        return _analyze(initial_state, run_id)
+
+def _run_graph(initial_state: dict, run_id: str = None) -> dict:
+    app = get_app()
+    if app.checkpointer is None:
+        return app.invoke(initial_state)
+    run_id = run_id or make_run_id(
+        initial_state.get('user_id'), initial_state['input_text'], analysis_depth(initial_state),
+        target_level(initial_state)
+    )
+    config = {"configurable": {"thread_id": run_id}}
+    snapshot = app.get_state(config)
+    if snapshot.next:
+        print(f"--- [Checkpoint] 运行 {run_id} 从 {', '.join(snapshot.next)} 继续 ---")
+        result = app.invoke(None, config)
+    else:
+        result = app.invoke(initial_state, config)
+    # 成功完成后删除检查点，避免检查点库随分析次数增长
+    try:
+        app.checkpointer.delete_thread(run_id)
+    except Exception as e:
+        print(f"--- [Checkpoint] 删除检查点失败: {e} ---")
+    return result
+
+# --- 5.2 近似重复文本复用（见 semantic_cache.py） ---
+# 开启语义缓存后，运行图之前先查同一用户相似输入的已有结果：
+#   文本相同      整份复用（只补做词库更新）
+#   相似度达到阈值 正常运行图：生词与语法只分析改动过的句子（片段缓存），
+#                 大意和细读在相似文本的结果上增量更新（大意缓存，见 summarizer_node），
+#                 不直接照搬旧的大意——新增的段落也要体现在大意中
+def _analyze(initial_state: dict, run_id: str = None) -> dict:
+    cache = get_semantic_cache()
+    if cache is None:
+        return _run_graph(initial_state, run_id)
+    input_text, user_id = initial_state['input_text'], initial_state.get('user_id')
+    depth = analysis_depth(initial_state)
+    vector = cache.embed(input_text)
+    level = target_level(initial_state)
+    hit = cache.lookup(input_text, vector, user_id, depth, level)
+
+    if hit is None:
+        result = _run_graph(initial_state, run_id)
+    elif hit['mode'] == "exact":
+        print(f"--- [SemanticCache] 复用已有分析（相似度 {hit['similarity']:.3f}） ---")
+        result = _reuse_result(hit['result'], initial_state)
+    else:
+        print(f"--- [SemanticCache] 近似重复（相似度 {hit['similarity']:.3f}），只分析改动的部分 ---")
+        # 大意缓存中已没有相似文本的版本时（如曾关闭缓存），用命中的结果作为增量更新的基础
+        if depth != "vocab":
+            seed_summary_cache(hit['source_text'], hit['result'], depth)
+        result = _run_graph(initial_state, run_id)
 
-# 添加节点
-workflow.add_node("linguist_agent", linguist_node)
-workflow.add_node("summarizer_agent", summarizer_node)
-workflow.add_node("memory_manager", memory_updater_node)
+    if hit is None or hit['mode'] == "partial":
+        cache.add(input_text, vector, result, user_id, depth, level)
+    result["usage"] = {**(result.get("usage") or {}), "semantic_cache": {
+        "mode": hit['mode'] if hit else "miss",
+        "similarity": hit['similarity'] if hit else None,
+        "hit_rate": cache.stats()["hit_rate"],
+    }}
+    return result
 
-# 设置逻辑连线
-workflow.set_entry_point("linguist_agent")
-workflow.add_edge("linguist_agent", "summarizer_agent")
-workflow.add_edge("summarizer_agent", "memory_manager")
-workflow.add_edge("memory_manager", END)
+def _reuse_result(cached: dict, initial_state: dict) -> dict:
+    """把已有结果套用到本次请求：只取本次深度需要的部分，剔除此后已掌握的单词并更新词库"""
+    depth = analysis_depth(initial_state)
+    result = {**initial_state, "depth": depth, "usage": {}, "mastered_new_words": []}
+    if depth in ("vocab", "full"):
+        analysis = cached.get('analysis_result') or {}
+        analysis = {**analysis, **merge_segment_results([analysis], exclude=initial_state.get('known_words') or [])}
+        result["analysis_result"] = analysis
+        if not initial_state.get('prefetch'):
+            result["mastered_new_words"] = update_word_memory(analysis['vocabulary'], initial_state.get('user_id'))
+    if depth in ("summary", "full"):
+        result["summary_result"] = cached.get('summary_result', "")
+        if depth == "full":
+            result["detailed_reading"] = cached.get('detailed_reading', "")
+    return result
 
-# 编译
-app = workflow.compile()
+def __getattr__(name):
+    # 兼容旧用法 `from main import app`：访问时才编译
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# --- 5. 启动程序 ---
+# --- 6. 启动程序 ---
 if __name__ == "__main__":
-    test_text = "The cognitive paradigm shift in AI is inevitable."
+    import argparse
+    parser = argparse.ArgumentParser(description="分析一段文本（默认使用示例句子）")
+    parser.add_argument("text", nargs="?", default="The cognitive paradigm shift in AI is inevitable.")
+    parser.add_argument("--depth", choices=list(ANALYSIS_DEPTHS), default=DEFAULT_DEPTH,
+                        help="分析深度：vocab 只提取生词，summary 只生成大意，full 完整分析")
+    parser.add_argument("--level", choices=CEFR_LEVELS, default=DEFAULT_TARGET_LEVEL,
+                        help="目标等级：只把不低于该 CEFR 等级的词作为候选生词")
+    parser.add_argument("--user", default=None, help="用户名（决定读写哪个数据分片）")
+    args = parser.parse_args()
     
     # 初始状态加载记忆
     initial_input = {
-        "input_text": test_text,
-        "known_words": get_known_words_from_csv()
+        "user_id": args.user,
+        "input_text": args.text,
+        "known_words": get_known_words_from_csv(args.user),
+        "depth": args.depth,
+        "target_level": args.level,
     }
     
     # 执行
-    results = app.invoke(initial_input)
+    results = run_analysis(initial_input)
     
     print("\n" + "="*30)
     print("分析完成！")
-    print(f"大意: {results['summary_result']}")
-    print(f"建议学习生词: {results['analysis_result']['vocabulary']}")
-    print("="*30)
\ No newline at end of file
+    if results.get('summary_result'):
+        print(f"大意: {results['summary_result']}")
+    if results.get('analysis_result'):
+        print(f"建议学习生词: {results['analysis_result']['vocabulary']}")
+    print("="*30)
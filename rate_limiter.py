@@ -0,0 +1,192 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+# --- 按服务商限流与自适应并发 ---
+# 每个服务商（按 base_url 区分）共享一个限流器，所有节点、所有会话的调用都经过它：
+#   1. 令牌桶：每分钟请求数（RPM）和每分钟 token 数（TPM），请求前按估算 token 扣减，
+#      响应后按实际用量校正；
+#   2. AIMD 并发窗口：成功时缓慢加一，收到 429 时减半，延迟明显高于基线时小幅收缩；
+#   3. 收到 429 时按 Retry-After 暂停整个服务商，而不是每个调用者各自盲目重试。
+
+class TokenBucket:
+    """令牌桶：容量为每分钟配额，按秒匀速补充；rate_per_min 为 None 时不限流"""
+
+    def __init__(self, rate_per_min: Optional[float]):
+        self.rate_per_min = rate_per_min
+        self._tokens = float(rate_per_min or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        capacity = float(self.rate_per_min)
+        self._tokens = min(capacity, self._tokens + (now - self._updated) * capacity / 60)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """扣减 amount 个令牌（允许透支），返回需要等待的秒数"""
+        if not self.rate_per_min:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # 单次请求超过桶容量时按容量计，避免永远等不到
+            self._tokens -= min(amount, float(self.rate_per_min))
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * 60 / self.rate_per_min
+
+    def drain(self):
+        """服务商已判定配额用尽：清空令牌，之后按速率重新积累"""
+        if not self.rate_per_min:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+    def adjust(self, delta: float):
+        """按实际用量校正（delta > 0 表示多扣，< 0 表示退还）"""
+        if not self.rate_per_min or not delta:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(float(self.rate_per_min), self._tokens - delta)
+
+class AdaptiveConcurrency:
+    """AIMD 并发窗口：成功时每个窗口 +1，限流时减半，延迟升高时乘以 0.9"""
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 latency_factor: float = 2.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.baseline_latency = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False, latency: float = None):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                # 同一批并发请求几乎同时收到 429，一秒内只减半一次
+                if now - self._last_decrease > 1.0:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+            elif latency is not None:
+                if self.baseline_latency is None:
+                    self.baseline_latency = latency
+                if latency > self.baseline_latency * self.latency_factor and now - self._last_decrease > 1.0:
+                    self.limit = max(self.min_limit, self.limit * 0.9)
+                    self._last_decrease = now
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                # 基线跟随较慢的指数移动平均，长期变慢的服务商会逐步抬高基线
+                self.baseline_latency += 0.05 * (latency - self.baseline_latency)
+            self._cond.notify_all()
+
+class ProviderLimiter:
+    """单个服务商的限流器"""
+
+    def __init__(self, name: str, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 max_concurrency: int = 16):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AdaptiveConcurrency(initial=min(4, max_concurrency), max_limit=max_concurrency)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "throttled": 0, "waited_seconds": 0.0}
+
+    def _wait(self, seconds: float):
+        if seconds > 0:
+            with self._lock:
+                self._stats["waited_seconds"] += seconds
+            time.sleep(seconds)
+
+    @contextmanager
+    def slot(self, estimated_tokens: int):
+        """
+        占用一个调用名额：依次等待暂停结束、并发窗口、RPM 和 TPM 配额
+        用法：with limiter.slot(n) as call: ...; call.done(实际 token) 或 call.throttled(retry_after)
+        """
+        self.concurrency.acquire()
+        call = _Call(self, estimated_tokens)
+        try:
+            self._wait(self._paused_until - time.monotonic())
+            self._wait(max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens)))
+            with self._lock:
+                self._stats["calls"] += 1
+            call.started = time.monotonic()
+            yield call
+        finally:
+            self.concurrency.release(
+                throttled=call.was_throttled,
+                latency=call.latency if call.succeeded else None
+            )
+
+    def pause(self, seconds: float):
+        """服务商返回 429 后暂停该服务商的所有调用"""
+        with self._lock:
+            self._stats["throttled"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.requests.drain()
+        self.tokens.drain()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["waited_seconds"] = round(stats["waited_seconds"], 2)
+        stats.update(
+            concurrency_limit=round(self.concurrency.limit, 2),
+            in_flight=self.concurrency.in_flight,
+            baseline_latency=round(self.concurrency.baseline_latency or 0, 3),
+        )
+        return stats
+
+class _Call:
+    """一次受限调用的结果登记"""
+
+    def __init__(self, limiter: ProviderLimiter, estimated_tokens: int):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.started = None
+        self.latency = None
+        self.succeeded = False
+        self.was_throttled = False
+
+    def done(self, actual_tokens: int = None):
+        self.succeeded = True
+        self.latency = time.monotonic() - self.started
+        if actual_tokens:
+            self.limiter.tokens.adjust(actual_tokens - self.estimated_tokens)
+
+    def throttled(self, retry_after: float):
+        self.was_throttled = True
+        self.limiter.pause(retry_after)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider: str, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                max_concurrency: int = 16) -> ProviderLimiter:
+    """返回某个服务商的共享限流器（首次获取时的配置生效）"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = ProviderLimiter(provider, rpm, tpm, max_concurrency)
+        return _limiters[provider]
+
+def limiter_stats() -> dict:
+    """所有服务商限流器的统计"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
@@ -0,0 +1,260 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import List, Optional
+
+from rate_limiter import limiter_stats
+from result_store import result_store
+from segments import merge_segment_results
+from singleflight import make_key
+from storage import normalize_user_id
+
+# --- 阅读清单与后台预取 ---
+# 老师可以提前把要读的文章登记到某个用户的阅读清单中。后台的低优先级线程在空闲时
+# （没有前台分析在进行、且距上一次前台分析结束已有一段时间）逐篇预先分析，
+# 结果持久化到结果存储（result_store），学生打开这篇文章时直接读取，无需等待。
+#   - 一次只预取一篇，调用照常经过服务商限流器；服务商最近返回过 429 时暂停预取；
+#   - 预取的运行不更新词库，学生真正打开时才把生词写入词库、保存历史记录；
+#   - 失败的条目按退避时间重试，超过次数后保留为 failed。
+# 设置 PREFETCH=0 可关闭后台线程（清单仍可使用，打开时现场分析）。
+READING_LIST_FILE = "data/reading_list.db"
+PREFETCH_IDLE_SECONDS = float(os.getenv("PREFETCH_IDLE_SECONDS", "5"))
+PREFETCH_POLL_SECONDS = 2.0
+PREFETCH_THROTTLE_BACKOFF = 60.0  # 服务商返回 429 后暂停预取的秒数
+MAX_ATTEMPTS = 3
+
+# 条目状态
+QUEUED, RUNNING, READY, OPENED, FAILED = "queued", "running", "ready", "opened", "failed"
+
+def reading_item_id(user_id: str, input_text: str, depth: str) -> str:
+    """同一用户、同一文本、同一深度只登记一次"""
+    return make_key("reading", normalize_user_id(user_id), input_text.strip(), depth)[:16]
+
+class ReadingList:
+    """阅读清单（SQLite），所有用户共用一个库，按 user_id 区分"""
+
+    def __init__(self, path: str = READING_LIST_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reading_list ("
+                " id TEXT PRIMARY KEY, user_id TEXT NOT NULL, title TEXT NOT NULL,"
+                " input_text TEXT NOT NULL, depth TEXT NOT NULL, status TEXT NOT NULL,"
+                " result_key TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS reading_list_user ON reading_list (user_id, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS reading_list_status ON reading_list (status, created_at)")
+            # 上次进程退出时正在预取的条目重新排队
+            with conn:
+                conn.execute("UPDATE reading_list SET status = ? WHERE status = ?", (QUEUED, RUNNING))
+            self._initialized = True
+        return conn
+
+    def _execute(self, sql: str, args=(), fetch: str = None):
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    cursor = conn.execute(sql, args)
+                    if fetch == "one":
+                        row = cursor.fetchone()
+                        return dict(row) if row else None
+                    if fetch == "all":
+                        return [dict(row) for row in cursor.fetchall()]
+                    return cursor.rowcount
+            finally:
+                conn.close()
+
+    def add(self, input_text: str, user_id: str = None, title: str = None, depth: str = "full") -> str:
+        """登记一篇文章，返回条目 ID（已登记的文章不重复添加；失败的条目重新排队）"""
+        input_text = input_text.strip()
+        if not input_text:
+            raise ValueError("文章内容为空")
+        item_id = reading_item_id(user_id, input_text, depth)
+        now = time.time()
+        title = (title or "").strip() or input_text.splitlines()[0][:50]
+        self._execute(
+            "INSERT INTO reading_list (id, user_id, title, input_text, depth, status, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(id) DO UPDATE SET status = ?, attempts = 0, error = NULL, updated_at = ?"
+            " WHERE reading_list.status = ?",
+            (item_id, normalize_user_id(user_id), title, input_text, depth, QUEUED, now, now,
+             QUEUED, now, FAILED)
+        )
+        return item_id
+
+    def items(self, user_id: str = None) -> List[dict]:
+        """某个用户的清单，按登记顺序排列"""
+        return self._execute(
+            "SELECT * FROM reading_list WHERE user_id = ? ORDER BY created_at",
+            (normalize_user_id(user_id),), fetch="all"
+        )
+
+    def get(self, item_id: str) -> Optional[dict]:
+        return self._execute("SELECT * FROM reading_list WHERE id = ?", (item_id,), fetch="one")
+
+    def find(self, input_text: str, user_id: str = None, depth: str = "full") -> Optional[dict]:
+        """按文章内容查找清单中的条目"""
+        return self.get(reading_item_id(user_id, input_text, depth))
+
+    def remove(self, item_id: str) -> bool:
+        return self._execute("DELETE FROM reading_list WHERE id = ?", (item_id,)) > 0
+
+    def claim_next(self) -> Optional[dict]:
+        """取出下一篇待预取的文章并标记为 running（失败的条目按 attempts 指数退避后重试）"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute(
+                        "SELECT * FROM reading_list WHERE status = ?"
+                        " OR (status = ? AND attempts < ? AND updated_at + 60 * (1 << attempts) < ?)"
+                        " ORDER BY created_at LIMIT 1",
+                        (QUEUED, FAILED, MAX_ATTEMPTS, now)
+                    ).fetchone()
+                    if row is None:
+                        return None
+                    conn.execute(
+                        "UPDATE reading_list SET status = ?, updated_at = ? WHERE id = ?", (RUNNING, now, row["id"])
+                    )
+                    return dict(row)
+            finally:
+                conn.close()
+
+    def mark(self, item_id: str, status: str, result_key: str = None, error: str = None):
+        """更新条目状态；失败时累计尝试次数"""
+        self._execute(
+            "UPDATE reading_list SET status = ?, result_key = COALESCE(?, result_key), error = ?,"
+            " attempts = attempts + ?, updated_at = ? WHERE id = ?",
+            (status, result_key, error, 1 if status == FAILED else 0, time.time(), item_id)
+        )
+
+    def counts(self, user_id: str = None) -> dict:
+        """各状态的条目数"""
+        where, args = ("WHERE user_id = ?", (normalize_user_id(user_id),)) if user_id is not None else ("", ())
+        rows = self._execute(f"SELECT status, COUNT(*) AS n FROM reading_list {where} GROUP BY status", args,
+                             fetch="all")
+        return {row["status"]: row["n"] for row in rows}
+
+reading_list = ReadingList()
+
+def open_item(item: dict, save_history: bool = True) -> Optional[dict]:
+    """
+    读取预取好的结果；第一次打开时补做预取时跳过的步骤（更新词库、save_history 为真时保存历史记录）
+    生词按打开时的词库过滤：预取之后才掌握的单词不再出现
+    结果已不在结果存储中时重新排队，返回 None
+    """
+    import main
+    if item["status"] not in (READY, OPENED) or not item.get("result_key"):
+        return None
+    result = result_store.get(item["result_key"])
+    if result is None:
+        reading_list.mark(item["id"], QUEUED)
+        return None
+    analysis = result.get("analysis_result")
+    if analysis:
+        # 与复用已有结果（main._reuse_result）相同，剔除预取之后已掌握的单词
+        known = main.get_known_words_from_csv(item["user_id"])
+        result["known_words"] = known
+        result["analysis_result"] = {**analysis, **merge_segment_results([analysis], exclude=known)}
+    if item["status"] == READY:
+        vocabulary = (result.get("analysis_result") or {}).get("vocabulary", [])
+        result["mastered_new_words"] = main.update_word_memory(vocabulary, item["user_id"])
+        result["prefetch"] = False
+        if save_history:
+            main.save_analysis_history(item["input_text"], result, item["user_id"])
+        reading_list.mark(item["id"], OPENED)
+    return result
+
+def ready_result(input_text: str, user_id: str = None, depth: str = "full", level: str = None,
+                 save_history: bool = True) -> Optional[dict]:
+    """文章已在清单中预取完成时返回结果（并补做打开时的步骤），否则返回 None"""
+    import main
+    if level not in (None, main.DEFAULT_TARGET_LEVEL):
+        return None  # 清单按默认目标等级预取，其他等级现场分析
+    item = reading_list.find(input_text, user_id, depth)
+    return open_item(item, save_history) if item else None
+
+class Prefetcher(threading.Thread):
+    """后台预取线程：空闲时逐篇分析清单中的文章"""
+
+    def __init__(self, idle_seconds: float = PREFETCH_IDLE_SECONDS):
+        super().__init__(name="reading-prefetch", daemon=True)
+        self.idle_seconds = idle_seconds
+        self._stop_event = threading.Event()
+        self._throttled = None
+        self.stats = {"prefetched": 0, "failed": 0, "deferred": 0}
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _providers_throttled(self) -> bool:
+        """服务商自上次检查以来返回过 429 时返回 True"""
+        throttled = sum(s["throttled"] for s in limiter_stats().values())
+        changed = self._throttled is not None and throttled > self._throttled
+        self._throttled = throttled
+        return changed
+
+    def _wait_for_idle(self) -> bool:
+        import main
+        while not self._stop_event.is_set():
+            if self._providers_throttled():
+                print(f"--- [Prefetch] 服务商正在限流，预取暂停 {PREFETCH_THROTTLE_BACKOFF:.0f}s ---")
+                self.stats["deferred"] += 1
+                self._stop_event.wait(PREFETCH_THROTTLE_BACKOFF)
+                continue
+            if main.run_activity.idle_seconds() >= self.idle_seconds:
+                return True
+            self._stop_event.wait(PREFETCH_POLL_SECONDS)
+        return False
+
+    def run(self):
+        import main
+        while self._wait_for_idle():
+            item = reading_list.claim_next()
+            if item is None:
+                self._stop_event.wait(PREFETCH_POLL_SECONDS)
+                continue
+            print(f"--- [Prefetch] 预取「{item['title']}」（{item['depth']}） ---")
+            state = {
+                "user_id": item["user_id"],
+                "input_text": item["input_text"],
+                "known_words": main.get_known_words_from_csv(item["user_id"]),
+                "depth": item["depth"],
+                "prefetch": True,
+            }
+            try:
+                # 预取使用独立的 run_id，不与学生同时发起的前台分析共用检查点
+                result = main.run_analysis(state, make_key("prefetch", item["id"])[:24])
+            except Exception as e:
+                print(f"--- [Prefetch] 「{item['title']}」预取失败: {e} ---")
+                reading_list.mark(item["id"], FAILED, error=str(e))
+                self.stats["failed"] += 1
+                continue
+            reading_list.mark(item["id"], READY, result_key=result_store.put(result, persist=True))
+            self.stats["prefetched"] += 1
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def start_prefetcher() -> Optional[Prefetcher]:
+    """启动进程内唯一的预取线程（重复调用无副作用）；PREFETCH=0 时不启动"""
+    global _prefetcher
+    if os.getenv("PREFETCH", "1") == "0":
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None or not _prefetcher.is_alive():
+            _prefetcher = Prefetcher()
+            _prefetcher.start()
+        return _prefetcher
@@ -0,0 +1,137 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+from singleflight import make_key
+from storage import atomic_writer
+
+# --- 共享分析结果存储 ---
+# Streamlit 的每个浏览器标签页都有自己的 session_state，直接在里面存放完整结果会让内存随
+# 会话数和分析次数无限增长。这里把结果按内容哈希存放在进程内共享的 LRU 中，
+# session_state 只保存键；相同的结果（多个会话分析同一篇文章）只存一份。
+# 内存中的总字节数有上限，被淘汰的结果写到磁盘（data/result_cache/），再次访问时读回。
+RESULT_CACHE_DIR = "data/result_cache"
+
+class ResultStore:
+    """按字节数限制大小的 LRU 结果存储，淘汰的条目溢出到磁盘"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, spill_dir: str = RESULT_CACHE_DIR,
+                 max_disk_bytes: int = 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._items = OrderedDict()  # 键 -> 序列化后的 JSON（bytes）
+        self._bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "spilled": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{key}.json")
+
+    def put(self, result: dict, persist: bool = False) -> str:
+        """
+        保存结果并返回其键（内容相同的结果得到相同的键）
+        persist=True 时同时写入磁盘，进程重启后仍可按键读取（如后台预取的结果）
+        """
+        payload = json.dumps(result, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+        key = make_key(payload.decode("utf-8"))[:32]
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                evicted = []
+            else:
+                self._items[key] = payload
+                self._bytes += len(payload)
+                evicted = self._evict()
+        if persist:
+            evicted.append((key, payload))
+        self._spill(evicted)
+        return key
+
+    def get(self, key: str):
+        """按键读取结果；内存和磁盘中都没有时返回 None"""
+        if not key:
+            return None
+        with self._lock:
+            payload = self._items.get(key)
+            if payload is not None:
+                self._items.move_to_end(key)
+                self._stats["hits"] += 1
+                return json.loads(payload)
+        try:
+            with open(self._path(key), "rb") as f:
+                payload = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        # 从磁盘读回的条目重新放入内存
+        with self._lock:
+            self._stats["disk_hits"] += 1
+            if key not in self._items:
+                self._items[key] = payload
+                self._bytes += len(payload)
+            evicted = self._evict()
+        self._spill(evicted)
+        return json.loads(payload)
+
+    def _evict(self) -> list:
+        """在锁内调用：淘汰最久未使用的条目，直到不超过内存上限（至少保留最新一条）"""
+        evicted = []
+        while self._bytes > self.max_bytes and len(self._items) > 1:
+            key, payload = self._items.popitem(last=False)
+            self._bytes -= len(payload)
+            evicted.append((key, payload))
+        return evicted
+
+    def _spill(self, evicted: list):
+        if not evicted:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for key, payload in evicted:
+            path = self._path(key)
+            if os.path.exists(path):
+                continue
+            try:
+                with atomic_writer(path, "wb") as f:
+                    f.write(payload)
+            except OSError as e:
+                print(f"--- [ResultStore] 溢出到磁盘失败: {e} ---")
+                continue
+            with self._lock:
+                self._stats["spilled"] += 1
+                if self._disk_bytes is not None:
+                    self._disk_bytes += len(payload)
+        self._prune_disk()
+
+    def _prune_disk(self):
+        """磁盘缓存超过上限时删除最旧的文件，直到降到上限的 80%"""
+        with self._lock:
+            if self._disk_bytes is not None and self._disk_bytes <= self.max_disk_bytes:
+                return
+        entries = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith(".json") and not entry.name.startswith(".tmp_"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_disk_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_disk_bytes * 0.8:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, items=len(self._items), memory_bytes=self._bytes)
+
+# 全局实例：Streamlit 的所有会话运行在同一进程内，共享此对象
+result_store = ResultStore(max_bytes=int(os.getenv("RESULT_STORE_MAX_MB", "64")) * 1024 * 1024)
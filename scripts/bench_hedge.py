@@ -0,0 +1,154 @@
+"""
+对冲请求与熔断基准：测量长尾延迟（p50 / p95 / p99）
+
+启动两个本地桩服务器：主服务商有一定比例的慢请求（模拟长尾），备用服务商延迟稳定。
+每个场景在独立子进程中运行（延迟统计和熔断器状态互不影响），依次比较：
+  no-hedge  HEDGE=0，只有失败时才转移
+  hedge     超过主级别近期延迟的 p95 仍未返回时向备用级别发出对冲请求
+  breaker   主服务商全部返回 500，验证熔断后不再向它发送请求
+
+用法:
+    python scripts/bench_hedge.py --calls 400 --threads 8 --slow-rate 0.02 --slow-ms 2000
+
+对冲阈值是主级别近期延迟的 p95（hedge_percentile），慢请求比例接近或超过 5% 时
+阈值本身会落在慢请求里，对冲失去作用；此时应调低 hedge_percentile。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import threading
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def stub_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+def start_stub(port, *args):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "scripts", "stub_llm_server.py"), "--port", str(port), *args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(50):
+        try:
+            stub_stats(port)
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit(f"桩服务器 {port} 启动失败")
+
+
+def tiers_config(primary_port, backup_port):
+    return json.dumps([
+        {"name": "primary", "model": "stub-primary", "base_url": f"http://127.0.0.1:{primary_port}/v1",
+         "api_key": "stub", "timeout": 30, "max_retries": 0, "hedge": "backup", "hedge_after": 0.5},
+        {"name": "backup", "model": "stub-backup", "base_url": f"http://127.0.0.1:{backup_port}/v1",
+         "api_key": "stub", "timeout": 30, "max_retries": 0, "standby": True},
+    ])
+
+
+def worker(args):
+    """子进程：并发调用 invoke_llm，输出延迟和对冲统计（JSON）"""
+    import main  # noqa: F401  加载 .env 等初始化
+    from failover import failover_stats
+    from llm_router import create_llm_for_tier, invoke_llm, load_tiers
+    from main import build_summarizer_messages
+
+    # 预热：首次导入 langchain_openai 和首次创建客户端（加载证书等）共约 2 s，不计入延迟
+    create_llm_for_tier(load_tiers()[0])
+
+    latencies, failures = [], 0
+    lock = threading.Lock()
+    counter = iter(range(args.calls))
+
+    def run():
+        nonlocal failures
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            text = f"Hedge benchmark article {i}. " + "The committee deliberated at length. " * 5
+            start = time.perf_counter()
+            try:
+                invoke_llm("summarizer_agent", build_summarizer_messages(text), text)
+            except Exception:
+                with lock:
+                    failures += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=run) for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(json.dumps({"latencies": latencies, "failures": failures, "stats": failover_stats()}))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))] if values else float("nan")
+
+
+def run_scenario(name, args, env_overrides, primary_port, backup_port):
+    before = {port: stub_stats(port)["requests"] for port in (primary_port, backup_port)}
+    env = dict(os.environ, LLM_TIERS=tiers_config(primary_port, backup_port), **env_overrides)
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", "--calls", str(args.calls),
+         "--threads", str(args.threads)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    sent = {port: stub_stats(port)["requests"] - before[port] for port in (primary_port, backup_port)}
+    lat = result["latencies"]
+    stats = result["stats"]
+    print(f"{name:10s} p50 {percentile(lat, 50) * 1000:7.0f} ms  p95 {percentile(lat, 95) * 1000:7.0f} ms  "
+          f"p99 {percentile(lat, 99) * 1000:7.0f} ms  max {max(lat or [0]) * 1000:7.0f} ms  "
+          f"失败 {result['failures']}  对冲 {stats['hedged']}（胜 {stats['hedge_wins']}）  "
+          f"转移 {stats['failovers']}  请求 主/备 {sent[primary_port]}/{sent[backup_port]}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--slow-rate", type=float, default=0.02)
+    parser.add_argument("--slow-ms", type=float, default=2000)
+    parser.add_argument("--primary-port", type=int, default=8021)
+    parser.add_argument("--backup-port", type=int, default=8022)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+        return
+
+    common = ["--latency-ms", str(args.latency_ms)]
+    backup = start_stub(args.backup_port, *common)
+    primary = start_stub(args.primary_port, *common, "--slow-rate", str(args.slow_rate),
+                         "--slow-ms", str(args.slow_ms))
+    try:
+        print(f"{args.calls} 次调用，{args.threads} 线程；主服务商 {args.slow_rate:.0%} 的请求延迟 {args.slow_ms:.0f} ms\n")
+        run_scenario("no-hedge", args, {"HEDGE": "0"}, args.primary_port, args.backup_port)
+        run_scenario("hedge", args, {"HEDGE": "1"}, args.primary_port, args.backup_port)
+        primary.terminate()
+        primary.wait()
+        primary = start_stub(args.primary_port, *common, "--error-rate", "1")
+        run_scenario("breaker", args, {"HEDGE": "1"}, args.primary_port, args.backup_port)
+    finally:
+        primary.terminate()
+        backup.terminate()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,82 @@
+"""
+导入耗时基准（基于 python -X importtime）
+
+在全新的子进程中多次执行 `import <模块>`，取累计耗时的中位数，
+列出最耗时的依赖，并与预算比较（超出预算时以退出码 1 结束，可用于 CI）。
+
+用法: python scripts/bench_import.py --module main --runs 5 --budget-ms 100
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module):
+    """执行一次 -X importtime，按输出顺序返回 [(模块名, 自身耗时us, 累计耗时us, 层级)]"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+    timings = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        self_us, cumulative_us, raw_name = int(parts[0]), int(parts[1]), parts[2]
+        depth = (len(raw_name) - len(raw_name.lstrip(" ")) - 1) // 2
+        timings.append((raw_name.strip(), self_us, cumulative_us, depth))
+    return timings
+
+
+def direct_dependencies(timings, module):
+    """importtime 先输出子模块再输出父模块：目标模块之前、上一个顶层模块之后的第 1 层即为直接依赖"""
+    index = max(i for i, t in enumerate(timings) if t[0] == module and t[3] == 0)
+    deps = []
+    for name, _, cumulative, depth in reversed(timings[:index]):
+        if depth == 0:
+            break
+        if depth == 1:
+            deps.append((name, cumulative))
+    return sorted(deps, key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    total_ms = statistics.median(
+        next(t[2] for t in r if t[0] == args.module and t[3] == 0) for r in runs
+    ) / 1000
+
+    # 直接由目标模块导入的依赖按累计耗时排序
+    last = runs[-1]
+    direct = direct_dependencies(last, args.module)
+    loaded = {t[0] for t in last}
+    print(f"import {args.module}: 中位数 {total_ms:.1f} ms（{args.runs} 次，预算 {args.budget_ms:.0f} ms）")
+    print("最耗时的直接依赖（最后一次运行）：")
+    for name, cumulative in direct[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    heavy = [name for name in ("pandas", "langgraph", "langchain_openai", "langchain_core") if name in loaded]
+    if heavy:
+        print(f"⚠️ 导入时加载了重量级依赖: {', '.join(heavy)}")
+
+    if total_ms > args.budget_ms:
+        print("❌ 超出预算")
+        sys.exit(1)
+    print("✅ 在预算之内")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+历史分析全文检索基准
+
+在临时目录中生成若干条合成的分析记录并写入检索索引，
+然后对单词、前缀、中文语法点和多词查询各计时多次，报告中位数和 p95 延迟。
+
+用法: python scripts/bench_search.py --records 20000 --queries 200 [--relevance]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex  # noqa: E402
+
+WORDS = ["paradigm", "ubiquitous", "ephemeral", "meticulous", "resilient", "ambiguous", "pragmatic",
+         "scrutiny", "inevitable", "coherent", "profound", "substantial", "notion", "ascertain"]
+FILLER = ["the", "policy", "economy", "people", "research", "city", "market", "change", "study", "water",
+          "future", "climate", "system", "school", "history", "language", "government", "report"]
+GRAMMAR = ["虚拟语气", "定语从句", "被动语态", "倒装句", "现在完成时", "非谓语动词", "强调句"]
+
+def make_record(i, rng):
+    words = rng.sample(WORDS, 3)
+    text = " ".join(rng.choice(FILLER) for _ in range(120)) + " " + " ".join(words)
+    return {
+        "id": f"{i:016x}",
+        "timestamp": f"2026-01-01 00:00:{i % 60:02d}",
+        "input_text": text,
+        "result": {
+            "analysis_result": {
+                "vocabulary": [{"word": w, "meaning": "…"} for w in words],
+                "grammar_points": [{"point": p, "explanation": f"{p}的用法说明"} for p in rng.sample(GRAMMAR, 2)],
+            },
+            "summary_result": "…",
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--relevance", action="store_true", help="按 bm25 相关度排序（默认最新的在前）")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(os.path.join(tmp, "bench_search.db"))
+        start = time.perf_counter()
+        batch = []
+        for i in range(args.records):
+            batch.append(make_record(i, rng))
+            if len(batch) >= 1000:
+                index.add_many(batch)
+                batch = []
+        index.add_many(batch)
+        print(f"写入 {args.records} 条记录: {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        index.add_many([make_record(args.records, rng)])
+        print(f"增量写入 1 条: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+        cases = {
+            "单词": ("paradigm", None),
+            "生词列": ("ephemeral", "words"),
+            "前缀": ("meticu", None),
+            "中文语法点": ("虚拟语气", "grammar"),
+            "多词": ("climate ubiquitous", None),
+        }
+        for name, (query, field) in cases.items():
+            timings, hits = [], 0
+            for _ in range(args.queries):
+                start = time.perf_counter()
+                hits = len(index.search(query, field=field, limit=args.limit, by_relevance=args.relevance))
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{name:<8} {query!r:<24} 中位数 {statistics.median(timings):6.2f} ms  p95 {p95:6.2f} ms  ({hits} 条)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+语义缓存基准：近似重复文本的识别率与复用效果
+
+1. 识别（不调用 LLM）：生成若干篇合成文章写入语义缓存索引，再用各种改动后的版本查询，
+   统计每种改动在不同阈值下被判为近似重复的比例。正例是真正的近似重复
+   （改标题、重新换行、改一个词、追加 / 删除一句），反例是另一篇文章，包括同一话题的文章。
+   每种索引精度（float16 / int8）分别统计，并给出查询延迟。
+2. 端到端（--e2e，需要本地桩服务器）：依次分析若干篇文章及其改动版本，比较开启与关闭语义缓存时
+   发往模型的请求数、总耗时和命中率。
+
+用法:
+    python scripts/bench_semantic_cache.py --articles 2000 --queries 200
+    python scripts/bench_semantic_cache.py --e2e --articles 10 --latency-ms 300
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FUNCTION_WORDS = ("the of and to a in that is was it for on with as by at from this be are have "
+                  "not but had his they which or we an were their been has more its will would").split()
+POSITIVE = ("whitespace", "headline", "one-word", "append", "drop")
+NEGATIVE = ("same-topic", "other")
+THRESHOLDS = (0.8, 0.85, 0.9, 0.95)
+
+
+def lexicon_words():
+    words = []
+    with open(os.path.join(ROOT, "lexicon", "cefr_en.tsv"), encoding="utf-8") as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                words.append(line.split("\t")[0])
+    return words
+
+
+class Corpus:
+    """合成文章：每篇属于一个话题，话题决定实词的取词范围，虚词按固定比例混入"""
+
+    def __init__(self, seed: int = 0, topics: int = 50):
+        self.rng = random.Random(seed)
+        vocab = lexicon_words()
+        self.topics = [self.rng.sample(vocab, 120) for _ in range(topics)]
+
+    def sentence(self, topic: int) -> str:
+        words = [self.rng.choice(FUNCTION_WORDS) if self.rng.random() < 0.4 else self.rng.choice(self.topics[topic])
+                 for _ in range(self.rng.randint(10, 20))]
+        return " ".join(words).capitalize() + "."
+
+    def article(self, topic: int) -> list:
+        """[标题, 句子...]"""
+        headline = " ".join(self.rng.choice(self.topics[topic]) for _ in range(5)).title()
+        return [headline] + [self.sentence(topic) for _ in range(self.rng.randint(8, 14))]
+
+    @staticmethod
+    def render(lines: list) -> str:
+        return lines[0] + "\n\n" + " ".join(lines[1:])
+
+    def variant(self, lines: list, topic: int, kind: str) -> str:
+        lines = list(lines)
+        if kind == "whitespace":
+            return "\n".join(lines)
+        if kind == "headline":
+            lines[0] = " ".join(self.rng.choice(self.topics[topic]) for _ in range(5)).title()
+        elif kind == "one-word":
+            i = self.rng.randrange(1, len(lines))
+            words = lines[i].split()
+            words[self.rng.randrange(len(words))] = self.rng.choice(self.topics[topic])
+            lines[i] = " ".join(words)
+        elif kind == "append":
+            lines.append(self.sentence(topic))
+        elif kind == "drop":
+            del lines[self.rng.randrange(1, len(lines))]
+        elif kind == "same-topic":
+            lines = self.article(topic)
+        elif kind == "other":
+            lines = self.article((topic + 1 + self.rng.randrange(len(self.topics) - 1)) % len(self.topics))
+        return self.render(lines)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))] if values else float("nan")
+
+
+def bench_detection(args):
+    from semantic_cache import HashingEmbeddings, normalize_text
+    from flat_index import FlatIndex
+
+    corpus = Corpus(args.seed)
+    articles = [(t, corpus.article(t)) for t in (corpus.rng.randrange(len(corpus.topics)) for _ in range(args.articles))]
+    embeddings = HashingEmbeddings()
+    start = time.perf_counter()
+    vectors = [embeddings.embed_query(normalize_text(corpus.render(lines))) for _, lines in articles]
+    embed_ms = (time.perf_counter() - start) / len(articles) * 1000
+    print(f"{args.articles} 篇文章，每种改动 {args.queries} 次查询；本地向量化 {embed_ms:.2f} ms/篇\n")
+
+    queries = []
+    for kind in POSITIVE + NEGATIVE:
+        for _ in range(args.queries):
+            i = corpus.rng.randrange(len(articles))
+            topic, lines = articles[i]
+            queries.append((kind, i, embeddings.embed_query(normalize_text(corpus.variant(lines, topic, kind)))))
+
+    for dtype in ("float16", "int8"):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = FlatIndex(tmp, dtype=dtype)
+            index.add([str(i) for i in range(len(articles))], [""] * len(articles), vectors,
+                      [{"user_id": "default"} for _ in articles])
+            scores, latencies = {kind: [] for kind in POSITIVE + NEGATIVE}, []
+            for kind, i, vector in queries:
+                t = time.perf_counter()
+                hits = index.search_vectors([vector], k=4, where={"user_id": "default"})[0]
+                latencies.append(time.perf_counter() - t)
+                if kind in POSITIVE:
+                    # 正例：应找回原文
+                    score = next((s for row, s in hits if row == i), 0.0)
+                else:
+                    # 反例：任何一篇都不应达到阈值（原文已不在集合中，看最相似的一篇）
+                    score = max((s for row, s in hits if row != i), default=0.0)
+                scores[kind].append(score)
+        print(f"[{dtype}] 查询延迟 p50 {percentile(latencies, 50) * 1000:.2f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:.2f} ms")
+        print(f"  {'改动':12s} {'相似度 p50':>10s} {'最低':>6s}   " +
+              "  ".join(f"≥{t:.2f}" for t in THRESHOLDS))
+        for kind in POSITIVE + NEGATIVE:
+            values = scores[kind]
+            rates = "  ".join(f"{sum(v >= t for v in values) / len(values):5.0%}" for t in THRESHOLDS)
+            print(f"  {kind:12s} {percentile(values, 50):10.3f} {min(values):6.3f}   {rates}")
+        print()
+    print("正例（前五行）的比例即召回率，反例（后两行）的比例即误判率")
+
+
+# --- 端到端 ---
+def stub_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+def e2e_worker(args):
+    """子进程（在临时目录中运行，数据互不影响）：依次分析原文和改动版本"""
+    import main
+    from semantic_cache import semantic_cache_stats
+
+    corpus = Corpus(args.seed)
+    texts = []
+    for _ in range(args.articles):
+        topic = corpus.rng.randrange(len(corpus.topics))
+        lines = corpus.article(topic)
+        texts.append(corpus.render(lines))
+        texts += [corpus.variant(lines, topic, kind) for kind in POSITIVE]
+    start = time.perf_counter()
+    for text in texts:
+        main.run_analysis({"user_id": "bench", "input_text": text, "known_words": [], "depth": "full"})
+    print(json.dumps({"analyses": len(texts), "seconds": time.perf_counter() - start,
+                      "stats": semantic_cache_stats()}))
+
+
+def bench_e2e(args):
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "scripts", "stub_llm_server.py"), "--port", str(args.port),
+         "--latency-ms", str(args.latency_ms)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        for _ in range(50):
+            try:
+                stub_stats(args.port)
+                break
+            except OSError:
+                time.sleep(0.1)
+        tiers = json.dumps([{"name": "stub", "model": "stub", "base_url": f"http://127.0.0.1:{args.port}/v1",
+                             "api_key": "stub", "timeout": 30}])
+        for enabled in ("0", "1"):
+            before = stub_stats(args.port)["requests"]
+            with tempfile.TemporaryDirectory() as tmp:
+                # 数据写到临时目录，提示词和词表仍从仓库读取（均为相对路径）
+                for name in ("prompts", "lexicon"):
+                    os.symlink(os.path.join(ROOT, name), os.path.join(tmp, name))
+                env = dict(os.environ, LLM_TIERS=tiers, SEMANTIC_CACHE=enabled, PREFETCH="0",
+                           PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+                out = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--e2e-worker", "--articles", str(args.articles),
+                     "--seed", str(args.seed)],
+                    cwd=tmp, env=env, capture_output=True, text=True, check=True
+                ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            requests = stub_stats(args.port)["requests"] - before
+            line = (f"语义缓存 {'开' if enabled == '1' else '关'}：{result['analyses']} 次分析，"
+                    f"耗时 {result['seconds']:.1f} s，模型请求 {requests} 次")
+            if result["stats"]:
+                s = result["stats"]
+                line += f"，命中率 {s['hit_rate']:.0%}（完全相同 {s['exact']}，近似 {s['partial']}，未命中 {s['misses']}）"
+            print(line)
+    finally:
+        stub.terminate()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200, help="每种改动的查询次数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--e2e", action="store_true", help="端到端测试（启动本地桩服务器）")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--port", type=int, default=8031)
+    parser.add_argument("--e2e-worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.e2e_worker:
+        e2e_worker(args)
+    elif args.e2e:
+        bench_e2e(args)
+    else:
+        bench_detection(args)
+
+
+if __name__ == "__main__":
+    main_cli()
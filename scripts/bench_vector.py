@@ -0,0 +1,179 @@
+"""
+向量库后端基准：扁平 memmap 索引（float16 / int8） vs Chroma
+
+生成带簇结构的合成向量（不调用嵌入 API），以 float32 精确暴力搜索的结果为基准，
+比较各后端的 recall@k、打开耗时、单条与批量查询延迟以及查询进程的常驻内存（RSS）。
+每个后端的建库和查询分别在独立子进程中进行，RSS 不受建库过程影响。
+
+用法: python scripts/bench_vector.py --rows 50000 --dim 384 --queries 200 --k 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+BACKENDS = ("flat-float16", "flat-int8", "chroma")
+
+
+def rss_mb():
+    """当前进程的常驻内存（MB）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def make_data(rows, dim, queries, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(rows // 200, 1), dim)).astype(np.float32)
+    data = centers[rng.integers(len(centers), size=rows)] + 0.5 * rng.standard_normal((rows, dim)).astype(np.float32)
+    picks = rng.integers(rows, size=queries)
+    query = data[picks] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32)
+    return data, query
+
+
+def exact_top_k(data, query, k):
+    data = data / np.linalg.norm(data, axis=1, keepdims=True)
+    query = query / np.linalg.norm(query, axis=1, keepdims=True)
+    top = []
+    for start in range(0, len(query), 64):
+        scores = query[start:start + 64] @ data.T
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top.append(part)
+    return np.concatenate(top)
+
+
+# --- 子进程：建库 ---
+def build(backend, workdir, data):
+    ids = [str(i) for i in range(len(data))]
+    texts = [f"chunk {i}" for i in range(len(data))]
+    start = time.perf_counter()
+    if backend.startswith("flat"):
+        from flat_index import FlatIndex
+        index = FlatIndex(os.path.join(workdir, backend), dtype=backend.split("-")[1])
+        for s in range(0, len(data), 10000):
+            index.add(ids[s:s + 10000], texts[s:s + 10000], data[s:s + 10000])
+    else:
+        import chromadb
+        client = chromadb.PersistentClient(path=os.path.join(workdir, backend))
+        collection = client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+        for s in range(0, len(data), 5000):
+            collection.add(ids=ids[s:s + 5000], documents=texts[s:s + 5000], embeddings=data[s:s + 5000])
+    return {"build_s": round(time.perf_counter() - start, 2)}
+
+
+# --- 子进程：查询 ---
+def query(backend, workdir, queries, truth, k):
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    if backend.startswith("flat"):
+        from flat_index import FlatIndex
+        index = FlatIndex(os.path.join(workdir, backend))
+
+        def search(q):
+            return [[int(h["id"]) for h in hits] for hits in index.search(q, k=k)]
+    else:
+        import chromadb
+        client = chromadb.PersistentClient(path=os.path.join(workdir, backend))
+        collection = client.get_collection("bench")
+
+        def search(q):
+            result = collection.query(query_embeddings=q, n_results=k)
+            return [[int(i) for i in ids] for ids in result["ids"]]
+    open_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    found = search(queries[:1])
+    first_ms = (time.perf_counter() - start) * 1000
+
+    single = []
+    found = []
+    for q in queries:
+        start = time.perf_counter()
+        found += search(q[None, :])
+        single.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    search(queries)
+    batch_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    recall = statistics.mean(len(set(f) & set(t.tolist())) / k for f, t in zip(found, truth))
+    single.sort()
+    return {
+        "open_ms": round(open_ms, 1),
+        "first_query_ms": round(first_ms, 1),
+        "p50_ms": round(statistics.median(single), 2),
+        "p95_ms": round(single[int(len(single) * 0.95) - 1], 2),
+        "batch_ms_per_query": round(batch_ms, 3),
+        f"recall@{k}": round(recall, 4),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_delta_mb": round(rss_mb() - base_rss, 1),
+    }
+
+
+def run_worker(args):
+    data = np.load(os.path.join(args.workdir, "data.npy"), mmap_mode="r")
+    if args.worker == "build":
+        result = build(args.backend, args.workdir, np.asarray(data))
+    else:
+        queries = np.load(os.path.join(args.workdir, "queries.npy"))
+        truth = np.load(os.path.join(args.workdir, "truth.npy"))
+        result = query(args.backend, args.workdir, queries, truth, args.k)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--worker", choices=("build", "query"), help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data, queries = make_data(args.rows, args.dim, args.queries)
+        np.save(os.path.join(workdir, "data.npy"), data)
+        np.save(os.path.join(workdir, "queries.npy"), queries)
+        np.save(os.path.join(workdir, "truth.npy"), exact_top_k(data, queries, args.k))
+        del data
+        print(f"{args.rows} 条 {args.dim} 维向量，{args.queries} 个查询，k={args.k}")
+
+        for backend in args.backends.split(","):
+            results = {}
+            try:
+                for stage in ("build", "query"):
+                    proc = subprocess.run(
+                        [sys.executable, __file__, "--worker", stage, "--backend", backend,
+                         "--workdir", workdir, "--k", str(args.k)],
+                        cwd=ROOT, capture_output=True, text=True, check=True
+                    )
+                    results.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+            except subprocess.CalledProcessError as e:
+                print(f"{backend:<14} 失败: {e.stderr.strip().splitlines()[-1] if e.stderr.strip() else e}")
+                continue
+            print(f"{backend:<14} " + "  ".join(f"{key}={value}" for key, value in results.items()))
+
+
+if __name__ == "__main__":
+    main()
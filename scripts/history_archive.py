@@ -0,0 +1,97 @@
+"""
+历史记录归档：NDJSON 流式导出 / 导入
+
+导出时逐个用户分片写出，每行一条记录（附带 user 字段）；
+导入时逐行读取并按内容哈希去重，内存占用与归档大小无关，适合整个班级的大归档。
+
+用法:
+    python scripts/history_archive.py export class.ndjson            # 导出所有用户
+    python scripts/history_archive.py export me.ndjson --user alice  # 只导出一个用户
+    python scripts/history_archive.py import class.ndjson --user teacher
+    python scripts/history_archive.py import class.ndjson --by-user  # 按记录中的 user 字段分别导入
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from storage import DATA_DIR, DEFAULT_USER  # noqa: E402
+
+
+def list_users():
+    users = [DEFAULT_USER]
+    users_dir = os.path.join(DATA_DIR, "users")
+    if os.path.isdir(users_dir):
+        users += sorted(d for d in os.listdir(users_dir) if os.path.isdir(os.path.join(users_dir, d)))
+    return users
+
+
+def export_archive(path, users):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for user in users:
+            for line in main.iter_history_ndjson(user):
+                record = json.loads(line)
+                record["user"] = user
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+    print(f"已导出 {count} 条记录到 {path}")
+
+
+def import_archive(path, user):
+    with open(path, "rb") as f:
+        stats = main.import_history_stream(f, user)
+    print(f"[{user}] 新记录 {stats['imported']}，保留 {stats['kept']}，重复 {stats['duplicates']}，无效 {stats['invalid']}")
+
+
+def import_by_user(path):
+    """先按 user 字段把归档拆成若干临时文件（逐行），再分别流式导入"""
+    import tempfile
+    tmp_dir = tempfile.mkdtemp(prefix="history_archive_")
+    handles = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    user = json.loads(line).get("user") or DEFAULT_USER
+                except (json.JSONDecodeError, AttributeError):
+                    user = DEFAULT_USER
+                if user not in handles:
+                    handles[user] = open(os.path.join(tmp_dir, f"{len(handles)}.ndjson"), "w", encoding="utf-8")
+                handles[user].write(line)
+        for handle in handles.values():
+            handle.close()
+        for user, handle in handles.items():
+            import_archive(handle.name, user)
+    finally:
+        for handle in handles.values():
+            handle.close()
+            os.remove(handle.name)
+        os.rmdir(tmp_dir)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--user", action="append", help="要导出的用户（可重复，默认全部）")
+    import_parser = sub.add_parser("import")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--user", default=DEFAULT_USER)
+    import_parser.add_argument("--by-user", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_archive(args.path, args.user or list_users())
+    elif args.by_user:
+        import_by_user(args.path)
+    else:
+        import_archive(args.path, args.user)
+
+
+if __name__ == "__main__":
+    main_cli()
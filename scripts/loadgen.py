@@ -0,0 +1,116 @@
+"""
+分析服务压测（配合 server.py）
+
+多个线程各自保持一个持久连接（HTTP/1.1 keep-alive），在指定时长内持续发送请求，
+统计吞吐量、延迟百分位和各状态码数量（503 表示被队列背压拒绝）。
+
+用法:
+    python scripts/stub_llm_server.py --port 8001 --latency-ms 300 &
+    LLM_TIERS='[{"name": "stub", "model": "stub", "base_url": "http://127.0.0.1:8001/v1", "api_key": "stub"}]' \\
+        python server.py --port 8080 --workers 4 --queue-size 16 &
+    python scripts/loadgen.py --url http://127.0.0.1:8080 --concurrency 16 --duration 30
+
+--endpoint analyze 发送分析请求（每个请求文本不同；--repeat 为重复已发送文本的比例，
+用于观察相同请求合并），--endpoint history / words / healthz 压测只读接口。
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse
+
+WORDS = ("committee deliberated unprecedented bureaucracy researchers frustrated ambiguous "
+         "regulation consequence infrastructure negotiation perspective sustainable").split()
+
+
+def make_text(n: int) -> str:
+    rng = random.Random(n)
+    sentences = [" ".join(rng.choice(WORDS) for _ in range(8)).capitalize() + "." for _ in range(4)]
+    return f"Load test article {n}. " + " ".join(sentences)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))] if values else float("nan")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发连接数")
+    parser.add_argument("--duration", type=float, default=30, help="压测时长（秒）")
+    parser.add_argument("--endpoint", choices=("analyze", "history", "words", "healthz"), default="analyze")
+    parser.add_argument("--users", type=int, default=4, help="请求分布到的用户数")
+    parser.add_argument("--repeat", type=float, default=0.0, help="重复发送已有文本的比例（0-1）")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    target = urlparse(args.url)
+    deadline = time.monotonic() + args.duration
+    lock = threading.Lock()
+    latencies, statuses, errors = [], {}, []
+    counter = [0]
+
+    def request(conn, n):
+        user = f"load{n % args.users}"
+        if args.endpoint == "analyze":
+            if counter[0] and random.random() < args.repeat:
+                n = random.randrange(counter[0])
+            body = json.dumps({"user_id": user, "text": make_text(n)})
+            conn.request("POST", "/v1/analyze", body, {"Content-Type": "application/json"})
+        elif args.endpoint == "healthz":
+            conn.request("GET", "/healthz")
+        else:
+            conn.request("GET", f"/v1/{args.endpoint}?user_id={user}")
+        response = conn.getresponse()
+        response.read()
+        return response.status
+
+    def worker():
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=args.timeout)
+        while time.monotonic() < deadline:
+            with lock:
+                n = counter[0]
+                counter[0] += 1
+            start = time.perf_counter()
+            try:
+                status = request(conn, n)
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=args.timeout)
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+            if status == 503:
+                time.sleep(0.1)  # 被背压拒绝后稍作等待，模拟遵守 Retry-After 的客户端
+        conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(statuses.values())
+    print(f"{args.endpoint}: {args.concurrency} 个连接，{elapsed:.1f} s，共 {total} 个响应，连接错误 {len(errors)}")
+    print(f"状态码: {dict(sorted(statuses.items()))}")
+    print(f"吞吐（200）: {len(latencies) / elapsed:.2f} 次/s")
+    if latencies:
+        print(f"延迟（200）: p50 {percentile(latencies, 50) * 1000:.0f} ms  p90 {percentile(latencies, 90) * 1000:.0f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:.0f} ms  max {max(latencies) * 1000:.0f} ms")
+    for error in errors[:5]:
+        print(f"  {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main_cli()
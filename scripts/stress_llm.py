@@ -0,0 +1,88 @@
+"""
+模型调用限流压测
+
+多个线程同时经 invoke_llm 调用模型，统计完成数、失败数、吞吐量，
+以及桩服务器返回的 429 次数和限流器最终的并发窗口。
+设置 RATE_LIMIT=0 可对比关闭限流器（客户端盲目重试）时的表现。
+
+用法:
+    python scripts/stub_llm_server.py --port 8001 --rpm 120 --max-concurrency 4 --latency-ms 200 &
+    LLM_TIERS='[{"name": "stub", "model": "stub", "base_url": "http://127.0.0.1:8001/v1", "api_key": "stub", "rpm": 120}]' \\
+        python scripts/stress_llm.py --threads 16 --calls 8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from llm_router import invoke_llm, load_tiers  # noqa: E402
+from rate_limiter import limiter_stats  # noqa: E402
+
+
+def stub_stats(base_url):
+    """读取桩服务器的 /stats（非桩服务器时返回空字典）"""
+    try:
+        root = base_url.rstrip("/").rsplit("/v1", 1)[0]
+        with urllib.request.urlopen(f"{root}/stats", timeout=5) as resp:
+            return json.loads(resp.read())
+    except Exception:
+        return {}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=8, help="每个线程的调用次数")
+    args = parser.parse_args()
+
+    tiers = load_tiers()
+    if not tiers:
+        sys.exit("未配置模型，请设置 LLM_TIERS 指向桩服务器")
+    before = stub_stats(tiers[0].base_url or "")
+    results = {"ok": 0, "failed": 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        for i in range(args.calls):
+            text = f"Stress article {n}-{i}: " + "The committee deliberated at length. " * 20
+            start = time.perf_counter()
+            try:
+                invoke_llm("summarizer_agent", main.build_summarizer_messages(text), text)
+                ok = True
+            except Exception as e:
+                print(f"调用失败: {type(e).__name__}: {e}")
+                ok = False
+            with lock:
+                results["ok" if ok else "failed"] += 1
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    after = stub_stats(tiers[0].base_url or "")
+    latencies.sort()
+    print(f"\n完成 {results['ok']}，失败 {results['failed']}，耗时 {elapsed:.1f} s，"
+          f"吞吐 {results['ok'] / elapsed:.2f} 次/s")
+    if latencies:
+        print(f"延迟 p50 {latencies[len(latencies) // 2]:.2f} s，p95 {latencies[int(len(latencies) * 0.95) - 1]:.2f} s")
+    if after:
+        print(f"服务端收到 {after['requests'] - before.get('requests', 0)} 个请求，"
+              f"其中 429 {after['throttled'] - before.get('throttled', 0)} 个，最大并发 {after['max_in_flight']}")
+    for provider, stats in limiter_stats().items():
+        print(f"限流器 {provider}: {stats}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,81 @@
+"""
+词库/历史记录并发压力测试
+
+模拟多个 Streamlit 会话（多进程 × 多线程）同时写入若干用户分片，
+检查是否有更新丢失，并报告整体吞吐量。
+
+用法: python scripts/stress_store.py --users 4 --processes 4 --threads 4 --writes 25
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _session_worker(data_dir, user_id, worker_id, threads, writes):
+    """单个进程：多个线程各自标记 writes 个不同的单词并写入历史记录"""
+    import storage
+    storage.DATA_DIR = data_dir
+    import main
+
+    def run(thread_id):
+        for i in range(writes):
+            word = f"w{worker_id}_{thread_id}_{i}"
+            main.mark_word_as_mastered(word, user_id=user_id)
+            main.save_analysis_history(word, {"analysis_result": {}}, user_id)
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=4, help="每个用户的写入进程数")
+    parser.add_argument("--threads", type=int, default=4, help="每个进程的线程数")
+    parser.add_argument("--writes", type=int, default=25, help="每个线程的写入次数")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="stress_store_")
+    users = [f"user{u}" for u in range(args.users)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.users * args.processes) as executor:
+        futures = [
+            executor.submit(_session_worker, data_dir, user, p, args.threads, args.writes)
+            for user in users
+            for p in range(args.processes)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    import storage
+    storage.DATA_DIR = data_dir
+    import main
+
+    expected_words = args.processes * args.threads * args.writes
+    expected_history = min(expected_words, main.MAX_HISTORY)
+    lost = 0
+    for user in users:
+        words = main.get_all_words_from_csv(user)
+        history = main.load_analysis_history(user)
+        lost += expected_words - len(words)
+        status = "OK" if len(words) == expected_words and len(history) == expected_history else "LOST"
+        print(f"{user}: 单词 {len(words)}/{expected_words}, 历史 {len(history)}/{expected_history} [{status}]")
+
+    total_ops = 2 * expected_words * len(users)
+    print(f"总写入 {total_ops} 次, 用时 {elapsed:.2f}s, 吞吐 {total_ops / elapsed:.1f} ops/s")
+    print(f"数据目录: {data_dir}")
+    sys.exit(1 if lost else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+本地 OpenAI 兼容桩服务器（不消耗真实 API 额度）
+
+实现 POST /v1/chat/completions，根据系统提示词判断是 Linguist 还是 Summarizer 请求，
+返回固定格式的 JSON，并附带 usage 字段。可用于验证模型分级路由、升级逻辑等。
+
+用法:
+    python scripts/stub_llm_server.py --port 8001 --invalid-models stub-fast
+
+模拟限流（返回 429 + Retry-After，用于验证 rate_limiter.py）：
+    python scripts/stub_llm_server.py --port 8001 --rpm 60 --max-concurrency 4 --latency-ms 200
+
+模拟长尾延迟与故障（用于验证对冲请求与熔断，见 scripts/bench_hedge.py）：
+    python scripts/stub_llm_server.py --port 8001 --latency-ms 100 --slow-rate 0.05 --slow-ms 3000 --error-rate 0.1
+
+然后配置 LLM_TIERS 指向该地址，例如：
+    LLM_TIERS='[{"name": "fast", "model": "stub-fast", "base_url": "http://127.0.0.1:8001/v1", "api_key": "stub", "max_input_tokens": 800},
+                {"name": "strong", "model": "stub-strong", "base_url": "http://127.0.0.1:8001/v1", "api_key": "stub"}]'
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATS = {"requests": 0, "invalid": 0, "throttled": 0, "max_in_flight": 0, "slow": 0, "errors": 0}
+STATS_LOCK = threading.Lock()
+BUCKET = {"tokens": None, "updated": 0.0}  # RPM 令牌桶（与 OpenAI 一样持续补充）
+IN_FLIGHT = [0]
+
+
+def _fake_linguist_output(text):
+    text, _, defined = text.partition("已有释义的词")
+    defined = set(re.findall(r"[A-Za-z']+", defined))
+    words = sorted({w.lower() for w in re.findall(r"[A-Za-z]{8,}", text)})[:10]
+    return {
+        "vocabulary": [
+            {"word": w} if w in defined else
+            {"word": w, "phonetic": f"/{w}/", "definition": f"{w} 的中文释义", "example": f"An example with {w}."}
+            for w in words
+        ],
+        "grammar_points": [{"point": "示例语法点", "explanation": "桩服务器返回的语法讲解"}],
+    }
+
+
+def _fake_summarizer_output(text):
+    return {"summary": f"桩摘要（{len(text)} 字符）", "detailed_reading": "桩细读内容"}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def log_message(self, format, *args):
+        if self.config.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with STATS_LOCK:
+                self._send_json(200, dict(STATS))
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        model = request.get("model", "stub")
+        messages = request.get("messages", [])
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        text = messages[-1].get("content", "") if messages else ""
+
+        with STATS_LOCK:
+            STATS["requests"] += 1
+            STATS[model] = STATS.get(model, 0) + 1
+            throttle_reason = self._throttle_reason()
+            if throttle_reason:
+                STATS["throttled"] += 1
+            else:
+                IN_FLIGHT[0] += 1
+                STATS["max_in_flight"] = max(STATS["max_in_flight"], IN_FLIGHT[0])
+        if throttle_reason:
+            self._send_json(
+                429,
+                {"error": {"message": f"Rate limit reached: {throttle_reason}", "type": "rate_limit_exceeded"}},
+                {"Retry-After": str(self.config.retry_after)}
+            )
+            return
+        try:
+            self._complete(model, messages, system, text)
+        finally:
+            with STATS_LOCK:
+                IN_FLIGHT[0] -= 1
+
+    def _throttle_reason(self):
+        """在 STATS_LOCK 内调用：判断是否应返回 429"""
+        if self.config.rpm:
+            now = time.monotonic()
+            if BUCKET["tokens"] is None:
+                BUCKET["tokens"] = float(self.config.rpm)
+            BUCKET["tokens"] = min(
+                float(self.config.rpm), BUCKET["tokens"] + (now - BUCKET["updated"]) * self.config.rpm / 60
+            )
+            BUCKET["updated"] = now
+            if BUCKET["tokens"] < 1:
+                return "requests per minute"
+        if self.config.max_concurrency and IN_FLIGHT[0] >= self.config.max_concurrency:
+            return "concurrent requests"
+        if random.random() < self.config.throttle_rate:
+            return "random throttle"
+        if self.config.rpm:
+            BUCKET["tokens"] -= 1
+        return None
+
+    def _complete(self, model, messages, system, text):
+        latency_ms = self.config.latency_ms
+        if random.random() < self.config.slow_rate:
+            latency_ms = self.config.slow_ms
+            with STATS_LOCK:
+                STATS["slow"] += 1
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        if random.random() < self.config.error_rate:
+            with STATS_LOCK:
+                STATS["errors"] += 1
+            self._send_json(500, {"error": {"message": "stub internal error", "type": "server_error"}})
+            return
+
+        invalid = model in self.config.invalid_models or random.random() < self.config.invalid_rate
+        if invalid:
+            with STATS_LOCK:
+                STATS["invalid"] += 1
+            content = "抱歉，这不是 JSON。"
+        elif "vocabulary" in system:
+            content = json.dumps(_fake_linguist_output(text), ensure_ascii=False)
+        else:
+            content = json.dumps(_fake_summarizer_output(text), ensure_ascii=False)
+
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        self._send_json(200, {
+            "id": f"stub-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_tokens + len(content) // 4,
+                "prompt_tokens_details": {"cached_tokens": len(system) // 4},
+            },
+        })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--invalid-models", default="", help="总是返回非 JSON 输出的模型名（逗号分隔）")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="随机返回非 JSON 输出的比例")
+    parser.add_argument("--rpm", type=int, default=0, help="每分钟接受的请求数，超出返回 429（0 表示不限）")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="同时处理的请求数上限，超出返回 429")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="随机返回 429 的比例")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应中的 Retry-After 秒数")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每个请求的固定处理延迟")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="按 --slow-ms 延迟响应的请求比例（模拟长尾）")
+    parser.add_argument("--slow-ms", type=float, default=5000.0, help="慢请求的处理延迟")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 500 的比例")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    args.invalid_models = {m for m in args.invalid_models.split(",") if m}
+
+    StubHandler.config = args
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"桩服务器已启动: http://{args.host}:{args.port}/v1", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
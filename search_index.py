@@ -0,0 +1,203 @@
+import re
+import json
+import functools
+import sqlite3
+import threading
+from typing import List, Optional
+
+from storage import user_file, normalize_user_id
+
+# --- 历史分析全文检索 ---
+# 每个用户一个 SQLite 库：analyses 表保存完整记录（不受历史列表 100 条上限影响），
+# FTS5 倒排索引覆盖原文、生词和语法点三列，保存分析时增量更新。
+# FTS5 的 unicode61 分词器不切分中文，因此建索引和查询时都在中日韩字符之间插入空格，
+# 按单字索引、按短语查询（「虚拟语气」即查询相邻的四个字）。
+SEARCH_INDEX_FILENAME = "analysis_search.db"
+SEARCH_FIELDS = ("input_text", "words", "grammar")
+INDEX_VERSION = 1
+
+_CJK_CHARS = r"\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af"
+
+@functools.lru_cache(maxsize=None)
+def _patterns():
+    """(单个 CJK 字符, CJK 字符间的空格, 查询词)；含 Unicode 区间的正则编译较慢，首次使用时才编译"""
+    return (
+        re.compile(f"([{_CJK_CHARS}])"),
+        re.compile(f"(?<=[{_CJK_CHARS}]) (?=[{_CJK_CHARS}])"),
+        re.compile(f"[{_CJK_CHARS}]+|" + r"\w+(?:['’]\w+)*"),
+    )
+
+def _spaced(text: str) -> str:
+    return _patterns()[0].sub(r" \1 ", text or "")
+
+def _unspaced(text: str) -> str:
+    return _patterns()[1].sub("", text)
+
+def build_match_query(query: str, field: str = None) -> Optional[str]:
+    """
+    把用户输入转换为 FTS5 查询：英文词按前缀匹配，中文连续字符按短语匹配，各词之间为 AND
+    field 为 SEARCH_FIELDS 之一时只在该列中查找；没有可查询的词时返回 None
+    """
+    terms = []
+    cjk_re, _, term_re = _patterns()
+    for term in term_re.findall(query or ""):
+        if cjk_re.match(term):
+            terms.append('"' + " ".join(term) + '"')
+        else:
+            terms.append('"' + term.replace('"', "") + '"*')
+    if not terms:
+        return None
+    expression = " ".join(terms)
+    if field in SEARCH_FIELDS:
+        expression = f"{field} : ({expression})"
+    return expression
+
+def record_document(record: dict) -> dict:
+    """从历史记录中抽取三列待索引的文本"""
+    analysis = (record.get('result') or {}).get('analysis_result') or {}
+    words, grammar = [], []
+    for item in analysis.get('vocabulary') or []:
+        words.append(item.get('word', '') if isinstance(item, dict) else str(item))
+    for item in analysis.get('grammar_points') or analysis.get('grammar') or []:
+        if isinstance(item, dict):
+            grammar.append(f"{item.get('point', '')} {item.get('explanation', '')}")
+        else:
+            grammar.append(str(item))
+    return {
+        "input_text": record.get('input_text', ''),
+        "words": "\n".join(words),
+        "grammar": "\n".join(grammar),
+    }
+
+class SearchIndex:
+    """某个用户的历史分析全文索引"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._built = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE,"
+                " timestamp TEXT NOT NULL, record TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS analysis_fts USING fts5("
+                " input_text, words, grammar, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            self._initialized = True
+        return conn
+
+    def _upsert(self, conn, record: dict):
+        row = conn.execute("SELECT rowid FROM analyses WHERE id = ?", (str(record['id']),)).fetchone()
+        payload = json.dumps(record, ensure_ascii=False)
+        timestamp = str(record.get('timestamp', ''))
+        if row:
+            rowid = row[0]
+            conn.execute("UPDATE analyses SET timestamp = ?, record = ? WHERE rowid = ?", (timestamp, payload, rowid))
+            conn.execute("DELETE FROM analysis_fts WHERE rowid = ?", (rowid,))
+        else:
+            rowid = conn.execute(
+                "INSERT INTO analyses (id, timestamp, record) VALUES (?, ?, ?)",
+                (str(record['id']), timestamp, payload)
+            ).lastrowid
+        doc = record_document(record)
+        conn.execute(
+            "INSERT INTO analysis_fts (rowid, input_text, words, grammar) VALUES (?, ?, ?, ?)",
+            (rowid, *(_spaced(doc[f]) for f in SEARCH_FIELDS))
+        )
+
+    def add_many(self, records: List[dict]):
+        """增量写入（同一 ID 的记录会被替换）"""
+        if not records:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    for record in records:
+                        self._upsert(conn, record)
+            finally:
+                conn.close()
+
+    def is_built(self) -> bool:
+        """索引是否已完成首次回填（记录在库的 user_version 中）"""
+        if self._built:
+            return True
+        with self._lock:
+            conn = self._connect()
+            try:
+                self._built = conn.execute("PRAGMA user_version").fetchone()[0] >= INDEX_VERSION
+                return self._built
+            finally:
+                conn.close()
+
+    def rebuild(self, records):
+        """清空后按给定记录重建索引（用于首次使用时回填已有历史）"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM analyses")
+                    conn.execute("DELETE FROM analysis_fts")
+                    for record in records:
+                        self._upsert(conn, record)
+                    conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+                self._built = True
+            finally:
+                conn.close()
+
+    def clear(self):
+        self.rebuild([])
+
+    def count(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            try:
+                return conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+            finally:
+                conn.close()
+
+    def search(self, query: str, field: str = None, limit: int = 20, by_relevance: bool = False) -> List[dict]:
+        """
+        返回匹配的记录，默认最新的在前（FTS5 可按 rowid 倒序直接截断，数万条记录下约 1 ms）；
+        by_relevance=True 时按 bm25 相关度排序，需要为全部命中记录打分，常见词会慢一个数量级
+        每项为 {"record": 完整记录, "snippet": 命中片段（**加粗**关键词）}
+        """
+        expression = build_match_query(query, field)
+        if expression is None:
+            return []
+        column = SEARCH_FIELDS.index(field) if field in SEARCH_FIELDS else -1
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT a.record, snippet(analysis_fts, ?, '**', '**', '…', 16)"
+                    " FROM analysis_fts JOIN analyses a ON a.rowid = analysis_fts.rowid"
+                    " WHERE analysis_fts MATCH ?"
+                    f" ORDER BY {'rank' if by_relevance else 'analysis_fts.rowid DESC'} LIMIT ?",
+                    (column, expression, limit)
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                print(f"--- [Search] 查询失败: {e} ---")
+                return []
+            finally:
+                conn.close()
+        return [{"record": json.loads(r), "snippet": _unspaced(" ".join(s.split()))} for r, s in rows]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_search_index(user_id: str = None) -> SearchIndex:
+    """返回某个用户的检索索引（进程内复用同一对象）"""
+    user_id = normalize_user_id(user_id)
+    with _indexes_lock:
+        if user_id not in _indexes:
+            _indexes[user_id] = SearchIndex(user_file(SEARCH_INDEX_FILENAME, user_id))
+        return _indexes[user_id]
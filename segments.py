@@ -0,0 +1,234 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from typing import List
+
+# --- 按句子增量分析 ---
+# 文本先按段落、再按句子切分，每个片段以内容哈希为键缓存其生词和语法分析结果。
+# 用户改了一个错字再次分析时，只有改动的句子需要重新发送给模型。
+SEGMENT_CACHE_FILE = "data/segment_cache.db"
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n|\r\n\s*\r\n")
+_SENTENCE_RE = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"'”’)]))\s+|(?<=[。！？])")
+
+def normalize_segment(segment: str) -> str:
+    """合并空白字符，使仅空白不同的片段得到相同的哈希"""
+    return " ".join(segment.split())
+
+def segment_hash(segment: str) -> str:
+    return hashlib.sha1(normalize_segment(segment).encode("utf-8")).hexdigest()
+
+def split_segments(text: str) -> List[str]:
+    """把文本切分为句子级片段（先分段落，再分句子，丢弃空片段）"""
+    segments = []
+    for paragraph in _PARAGRAPH_RE.split(text or ""):
+        for sentence in _SENTENCE_RE.split(paragraph):
+            sentence = normalize_segment(sentence)
+            if sentence:
+                segments.append(sentence)
+    return segments
+
+def number_segments(segments: List[str], indices: List[int]) -> str:
+    """把需要分析的片段编号拼接：[S1] ... [S2] ...（编号为片段在全文中的序号）"""
+    return "\n".join(f"[S{i + 1}] {segments[i]}" for i in indices)
+
+def assign_to_segments(analysis: dict, segments: List[str], indices: List[int]) -> dict:
+    """
+    把模型对若干片段的合并分析结果拆回到各个片段
+    优先使用条目中的 segment 字段；没有时按单词出现的位置归属，仍无法确定则归到第一个片段
+    返回 {片段序号: {"vocabulary": [...], "grammar_points": [...]}}
+    """
+    results = {i: {"vocabulary": [], "grammar_points": []} for i in indices}
+
+    def locate(item, word=None):
+        seg = item.get("segment") if isinstance(item, dict) else None
+        try:
+            seg = int(str(seg).lstrip("Ss")) - 1
+        except (TypeError, ValueError):
+            seg = None
+        if seg in results:
+            return seg
+        if word:
+            pattern = re.compile(r"\b" + re.escape(word.lower()) + r"\b")
+            for i in indices:
+                if pattern.search(segments[i].lower()):
+                    return i
+        return indices[0]
+
+    for item in analysis.get("vocabulary") or []:
+        word = item.get("word", "") if isinstance(item, dict) else str(item)
+        results[locate(item, word)]["vocabulary"].append(item)
+    for item in analysis.get("grammar_points") or analysis.get("grammar") or []:
+        results[locate(item)]["grammar_points"].append(item)
+    return results
+
+def merge_segment_results(results: List[dict], exclude: List[str] = ()) -> dict:
+    """按片段顺序合并分析结果：生词按单词去重并剔除已掌握的词，语法点按名称去重"""
+    excluded = {w.lower() for w in exclude}
+    vocabulary, grammar_points = [], []
+    seen_words, seen_points = set(), set()
+    for result in results:
+        for item in result.get("vocabulary", []):
+            word = (item.get("word", "") if isinstance(item, dict) else str(item)).strip()
+            if word and word.lower() not in seen_words and word.lower() not in excluded:
+                seen_words.add(word.lower())
+                vocabulary.append({k: v for k, v in item.items() if k != "segment"} if isinstance(item, dict) else item)
+        for item in result.get("grammar_points", []):
+            point = item.get("point", "") if isinstance(item, dict) else str(item)
+            if point not in seen_points:
+                seen_points.add(point)
+                grammar_points.append({k: v for k, v in item.items() if k != "segment"} if isinstance(item, dict) else item)
+    return {"vocabulary": vocabulary, "grammar_points": grammar_points}
+
+class SegmentCache:
+    """片段分析结果缓存（SQLite），键为 (片段哈希, 上下文版本)"""
+
+    def __init__(self, path: str = SEGMENT_CACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                " hash TEXT NOT NULL, context TEXT NOT NULL, result TEXT NOT NULL,"
+                " PRIMARY KEY (hash, context))"
+            )
+            self._initialized = True
+        return conn
+
+    def get_many(self, hashes: List[str], context: str) -> dict:
+        """批量查询，返回 {哈希: 结果}"""
+        if not hashes:
+            return {}
+        with self._lock:
+            conn = self._connect()
+            try:
+                found = {}
+                unique = list(dict.fromkeys(hashes))
+                for start in range(0, len(unique), 500):
+                    chunk = unique[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT hash, result FROM segments WHERE context = ? AND hash IN ({','.join('?' * len(chunk))})",
+                        [context, *chunk]
+                    ).fetchall()
+                    found.update({h: json.loads(r) for h, r in rows})
+                return found
+            finally:
+                conn.close()
+
+    def put_many(self, items: dict, context: str):
+        """批量写入 {哈希: 结果}"""
+        if not items:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO segments (hash, context, result) VALUES (?, ?, ?)",
+                        [(h, context, json.dumps(r, ensure_ascii=False)) for h, r in items.items()]
+                    )
+            finally:
+                conn.close()
+
+segment_cache = SegmentCache()
+
+# --- 整篇大意的增量更新 ---
+# 大意和细读针对整篇文本，无法按句子拆分缓存。这里按文档（句子哈希序列）保存最近的分析结果，
+# 并记录每个句子出现在哪些文档中。再次分析时：
+#   句子序列完全相同  直接复用
+#   与某个已有文档共享大部分句子  把上一版结果和增删的句子发给模型，请它在原结果上修改，
+#                              输入只包含改动的部分，而不是整篇文本
+SUMMARY_CACHE_FILE = "data/summary_cache.db"
+
+class SummaryCache:
+    """整篇大意缓存（SQLite），键为 (文档键, 上下文版本)，另有句子哈希到文档的倒排表"""
+
+    def __init__(self, path: str = SUMMARY_CACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                " doc TEXT NOT NULL, context TEXT NOT NULL, segments TEXT NOT NULL, result TEXT NOT NULL,"
+                " PRIMARY KEY (doc, context))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summary_segments ("
+                " hash TEXT NOT NULL, context TEXT NOT NULL, doc TEXT NOT NULL,"
+                " PRIMARY KEY (hash, context, doc))"
+            )
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def _row(row) -> dict:
+        return {"doc": row[0], "segments": json.loads(row[1]), "result": json.loads(row[2])}
+
+    def get(self, doc: str, context: str):
+        """按文档键查询，返回 {"doc", "segments", "result"} 或 None"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT doc, segments, result FROM summaries WHERE doc = ? AND context = ?", (doc, context)
+                ).fetchone()
+                return self._row(row) if row else None
+            finally:
+                conn.close()
+
+    def find_base(self, hashes: List[str], context: str):
+        """找出与这些句子共享句子最多的已有文档，返回 {"doc", "segments", "result", "shared"} 或 None"""
+        unique = list(dict.fromkeys(hashes))[:500]
+        if not unique:
+            return None
+        with self._lock:
+            conn = self._connect()
+            try:
+                best = conn.execute(
+                    f"SELECT doc, COUNT(*) AS shared FROM summary_segments"
+                    f" WHERE context = ? AND hash IN ({','.join('?' * len(unique))})"
+                    f" GROUP BY doc ORDER BY shared DESC LIMIT 1",
+                    [context, *unique]
+                ).fetchone()
+                if best is None:
+                    return None
+                row = conn.execute(
+                    "SELECT doc, segments, result FROM summaries WHERE doc = ? AND context = ?", (best[0], context)
+                ).fetchone()
+                return dict(self._row(row), shared=best[1]) if row else None
+            finally:
+                conn.close()
+
+    def put(self, doc: str, context: str, segments: List[str], result: dict):
+        """保存一篇文档的句子和分析结果"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO summaries (doc, context, segments, result) VALUES (?, ?, ?, ?)",
+                        (doc, context, json.dumps(segments, ensure_ascii=False), json.dumps(result, ensure_ascii=False))
+                    )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO summary_segments (hash, context, doc) VALUES (?, ?, ?)",
+                        [(h, context, doc) for h in dict.fromkeys(segment_hash(s) for s in segments)]
+                    )
+            finally:
+                conn.close()
+
+summary_cache = SummaryCache()
@@ -0,0 +1,182 @@
+import os
+import re
+import math
+import zlib
+import hashlib
+import functools
+import threading
+from collections import Counter
+from typing import Optional
+
+from result_store import result_store
+from storage import normalize_user_id
+
+# --- 近似重复文本的语义缓存 ---
+# 很多提交是之前文章的近似重复：换了标题、改了几个词、多贴了一段。每次分析完成后，
+# 把输入文本向量化写入本地扁平向量索引（flat_index.py），新请求先查同一用户最相似的结果：
+#   exact   合并空白后文本完全相同：直接复用整份结果，不调用 LLM
+#   partial 相似度不低于阈值：正常运行分析图，由片段缓存（segments.py）保证只有改动过的句子发给 Linguist，
+#           大意和细读以命中的结果为基础增量更新（大意缓存，同见 segments.py），新增的内容也会体现在大意中
+#   miss    正常分析，完成后写入索引
+# 只在同一用户、同一目标等级的结果之间复用（生词取决于两者），复用时去掉之后已掌握的单词。
+# 默认的向量是本地计算的哈希 n-gram 特征（无需网络，识别近似重复足够）；
+# SEMANTIC_CACHE_EMBEDDINGS=openai 时改用 OpenAI 向量（能识别改写，但每次查询多一次 API 调用）。
+# 设置 SEMANTIC_CACHE=1 开启（默认关闭），SEMANTIC_CACHE_THRESHOLD 调整相似度阈值，
+# SEMANTIC_CACHE_DTYPE 选择索引精度：默认 int8（相似度误差约 0.01，不影响判定，查询比 float16 快数倍），
+# 需要更精确的相似度时用 float16（见 scripts/bench_semantic_cache.py）。
+SEMANTIC_CACHE_DIR = "data/semantic_cache"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+HASH_DIM = 1024
+SEARCH_K = 4  # 取最相似的几条，跳过深度不匹配或结果已被淘汰的条目
+
+# 某个深度的请求可以复用哪些深度的结果（完整分析包含其余两种的全部内容）
+REUSABLE_DEPTHS = {
+    "full": ("full",),
+    "summary": ("summary", "full"),
+    "vocab": ("vocab", "full"),
+}
+
+@functools.lru_cache(maxsize=None)
+def _token_re():
+    """中日韩文字逐字切分，其他文字按单词切分（首次使用时编译）"""
+    return re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]|[^\W\d_\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+|\d+")
+
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").split())
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+class HashingEmbeddings:
+    """本地特征哈希向量：单词 1-gram 和 2-gram，权重 1 + log(tf)，哈希决定维度和符号"""
+
+    name = "hash"
+
+    def __init__(self, dim: int = HASH_DIM):
+        self.dim = dim
+
+    def embed_query(self, text: str):
+        import numpy as np
+        tokens = _token_re().findall(text.lower())
+        features = Counter(tokens)
+        features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in features.items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += (1.0 if h & 0x80000000 else -1.0) * (1.0 + math.log(count))
+        return vector
+
+def create_embeddings():
+    """按 SEMANTIC_CACHE_EMBEDDINGS 创建向量化器（hash / openai）"""
+    kind = os.getenv("SEMANTIC_CACHE_EMBEDDINGS", "hash")
+    if kind == "hash":
+        return HashingEmbeddings()
+    if kind == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        from llm_router import load_environment
+        load_environment()
+        embeddings = OpenAIEmbeddings()
+        embeddings.name = f"openai-{embeddings.model}"
+        return embeddings
+    raise ValueError(f"未知的语义缓存向量化方式: {kind}")
+
+class SemanticCache:
+    """按用户查找相似输入的已有分析结果（向量在 FlatIndex 中，结果在 result_store 中）"""
+
+    def __init__(self, path: str = SEMANTIC_CACHE_DIR, embeddings=None,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, dtype: str = None):
+        self.embeddings = embeddings or create_embeddings()
+        # 不同向量化方式的向量不可比较，各用一份索引
+        self.path = os.path.join(path, getattr(self.embeddings, "name", "custom"))
+        self.threshold = threshold
+        self.dtype = dtype or os.getenv("SEMANTIC_CACHE_DTYPE", "int8")
+        self._index = None
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "exact": 0, "partial": 0, "misses": 0, "errors": 0}
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                from flat_index import FlatIndex
+                self._index = FlatIndex(self.path, dtype=self.dtype)
+            return self._index
+
+    def _count(self, event: str):
+        with self._lock:
+            self._stats[event] += 1
+
+    def embed(self, text: str):
+        """向量化输入文本；失败（如 OpenAI 接口不可用）时返回 None，本次不使用缓存"""
+        try:
+            return self.embeddings.embed_query(normalize_text(text))
+        except Exception as e:
+            print(f"--- [SemanticCache] 向量化失败: {e} ---")
+            self._count("errors")
+            return None
+
+    def lookup(self, input_text: str, vector, user_id: str = None, depth: str = "full",
+               level: str = "B2") -> Optional[dict]:
+        """
+        查找可复用的结果：返回 {"mode": "exact" | "partial", "similarity", "result", "source_text"}
+        没有相似度达到阈值的结果时返回 None
+        """
+        self._count("lookups")
+        if vector is None:
+            self._count("misses")
+            return None
+        wanted = text_hash(input_text)
+        where = {"user_id": normalize_user_id(user_id), "target_level": level}
+        hits = self.index.search([vector], k=SEARCH_K, where=where)[0]
+        for hit in hits:
+            metadata = hit["metadata"]
+            exact = metadata.get("text_hash") == wanted
+            if not exact and hit["score"] < self.threshold:
+                break  # 按相似度降序，之后的都低于阈值
+            if metadata.get("depth") not in REUSABLE_DEPTHS.get(depth, (depth,)):
+                continue
+            result = result_store.get(metadata.get("result_key"))
+            if result is None:
+                continue
+            mode = "exact" if exact else "partial"
+            self._count(mode)
+            return {"mode": mode, "similarity": round(min(float(hit["score"]), 1.0), 4), "result": result,
+                    "source_text": hit["text"]}
+        self._count("misses")
+        return None
+
+    def add(self, input_text: str, vector, result: dict, user_id: str = None, depth: str = "full",
+            level: str = "B2"):
+        """登记一次完成的分析（结果持久化到 result_store，进程重启后仍可复用）"""
+        if vector is None:
+            return
+        key = result_store.put(result, persist=True)
+        metadata = {"user_id": normalize_user_id(user_id), "depth": depth, "target_level": level,
+                    "text_hash": text_hash(input_text), "result_key": key}
+        try:
+            self.index.add([key], [input_text], [vector], [metadata])
+        except (OSError, ValueError) as e:
+            print(f"--- [SemanticCache] 写入索引失败: {e} ---")
+            self._count("errors")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        hits = stats["exact"] + stats["partial"]
+        stats["hit_rate"] = hits / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+@functools.lru_cache(maxsize=None)
+def _shared_cache() -> SemanticCache:
+    return SemanticCache()
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """进程内共享的语义缓存；SEMANTIC_CACHE 不为 1 时返回 None（关闭）"""
+    if os.getenv("SEMANTIC_CACHE", "0") != "1":
+        return None
+    return _shared_cache()
+
+def semantic_cache_stats() -> Optional[dict]:
+    """命中统计（缓存未开启时为 None）"""
+    cache = get_semantic_cache()
+    return cache.stats() if cache is not None else None
@@ -0,0 +1,475 @@
+"""
+无界面 HTTP 分析服务
+
+把已编译的分析图（main.run_analysis）以及历史记录、词库操作暴露为 JSON 接口，
+便于放在网关后面或做压测（见 scripts/loadgen.py）。
+
+用法:
+    python server.py --port 8080 --workers 4 --queue-size 32
+
+接口:
+    POST /v1/analyze                 {"user_id", "text", "depth": "vocab|summary|full", "target_level": "B2",
+                                      "save_history": true}
+    GET  /v1/history?user_id=&limit=
+    GET  /v1/history/<id>?user_id=
+    GET  /v1/history/search?user_id=&q=&field=&limit=
+    GET  /v1/words?user_id=&status=
+    POST /v1/words/mastered          {"user_id", "words": [...], "level"}
+    POST /v1/words/learning          {"user_id", "words": [...]}
+    GET  /v1/reading-list?user_id=
+    POST /v1/reading-list            {"user_id", "text", "title", "depth"}（后台空闲时预先分析）
+    GET  /v1/runs/<run_id>           中途失败的分析：待执行的节点和失败原因（run_id 见 502 响应）
+    GET  /healthz
+    GET  /metrics                    Prometheus 文本格式
+"""
+import os
+import re
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import main
+from failover import failover_stats
+from rate_limiter import limiter_stats
+from reading_list import reading_list, ready_result, start_prefetcher
+from semantic_cache import semantic_cache_stats
+from singleflight import SingleFlight
+
+# --- 1. 分析工作池 ---
+# 分析请求进入有界队列，由固定数量的工作线程执行；队列已满时立即返回 503 和 Retry-After，
+# 而不是让连接无限堆积（背压）。等待超时的请求在出队时被丢弃，不再占用工作线程。
+# 同一用户对同一文本的并发请求合并为一次运行（与 LLM 调用的 single-flight 相同）。
+DEFAULT_WORKERS = int(os.getenv("SERVER_WORKERS", "4"))
+DEFAULT_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "32"))
+REQUEST_TIMEOUT = float(os.getenv("SERVER_REQUEST_TIMEOUT", "300"))
+KEEPALIVE_TIMEOUT = 30      # 空闲的持久连接保持的秒数
+MAX_BODY_BYTES = 1024 * 1024
+RESPONSE_STATE_KEYS = ('analysis_result', 'summary_result', 'detailed_reading', 'usage')
+
+class QueueFullError(RuntimeError):
+    """分析队列已满"""
+
+class _Job:
+    def __init__(self, fn):
+        self.fn = fn
+        self.done = threading.Event()
+        self.abandoned = False
+        self.result = None
+        self.error = None
+
+class AnalysisPool:
+    """固定大小的工作线程池 + 有界队列"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self.busy = 0
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"analysis-worker-{i}", daemon=True).start()
+
+    def run(self, fn, timeout: float = REQUEST_TIMEOUT):
+        """排队执行 fn 并等待结果；队列已满抛出 QueueFullError，超时抛出 TimeoutError"""
+        job = _Job(fn)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise QueueFullError("分析队列已满") from None
+        if not job.done.wait(timeout):
+            job.abandoned = True
+            raise TimeoutError(f"分析超过 {timeout:.0f}s 未完成")
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job.abandoned:
+                continue
+            with self._lock:
+                self.busy += 1
+            try:
+                job.result = job.fn()
+            except BaseException as e:
+                job.error = e
+            finally:
+                with self._lock:
+                    self.busy -= 1
+                job.done.set()
+
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.maxsize
+
+# --- 2. 指标 ---
+class Metrics:
+    """按接口统计请求数（按状态码）、累计延迟和最近的延迟分布"""
+
+    def __init__(self, window: int = 2000):
+        self.started = time.time()
+        self._requests = {}
+        self._latencies = {}
+        self._totals = {}  # 接口 -> [累计请求数, 累计耗时秒数]（summary 的 _count / _sum）
+        self._window = window
+        self._lock = threading.Lock()
+
+    def observe(self, route: str, status: int, seconds: float):
+        with self._lock:
+            self._requests[(route, status)] = self._requests.get((route, status), 0) + 1
+            self._latencies.setdefault(route, deque(maxlen=self._window)).append(seconds)
+            totals = self._totals.setdefault(route, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return (dict(self._requests), {route: sorted(v) for route, v in self._latencies.items()},
+                    {route: tuple(v) for route, v in self._totals.items()})
+
+def _quantile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+def render_metrics(pool: AnalysisPool, metrics: Metrics, flight: SingleFlight) -> str:
+    """Prometheus 文本格式的指标"""
+    requests, latencies, totals = metrics.snapshot()
+    lines = [
+        "# TYPE lang_agent_requests_total counter",
+        *(f'lang_agent_requests_total{{route="{route}",status="{status}"}} {count}'
+          for (route, status), count in sorted(requests.items())),
+        "# TYPE lang_agent_request_seconds summary",
+    ]
+    # 分位数取最近的请求，_count / _sum 为进程启动以来的累计值
+    for route, values in sorted(latencies.items()):
+        for q in (0.5, 0.9, 0.99):
+            lines.append(f'lang_agent_request_seconds{{route="{route}",quantile="{q}"}} {_quantile(values, q):.4f}')
+        count, total = totals[route]
+        lines.append(f'lang_agent_request_seconds_sum{{route="{route}"}} {total:.4f}')
+        lines.append(f'lang_agent_request_seconds_count{{route="{route}"}} {count}')
+    flights = flight.stats()
+    failover = failover_stats()
+    # 每个指标各有一行 # TYPE，否则 Prometheus 按 untyped 处理
+    for name, kind, value in (
+        ("lang_agent_workers", "gauge", pool.workers),
+        ("lang_agent_workers_busy", "gauge", pool.busy),
+        ("lang_agent_queue_depth", "gauge", pool.queued()),
+        ("lang_agent_queue_capacity", "gauge", pool.queue_size),
+        ("lang_agent_analyses_coalesced_total", "counter", flights['coalesced']),
+        ("lang_agent_llm_hedged_total", "counter", failover['hedged']),
+        ("lang_agent_llm_failovers_total", "counter", failover['failovers']),
+        ("lang_agent_uptime_seconds", "gauge", f"{time.time() - metrics.started:.0f}"),
+    ):
+        lines += [f"# TYPE {name} {kind}", f"{name} {value}"]
+    semantic = semantic_cache_stats()
+    if semantic is not None:
+        lines += [
+            "# TYPE lang_agent_semantic_cache_total counter",
+            *(f'lang_agent_semantic_cache_total{{result="{event}"}} {semantic[event]}'
+              for event in ("exact", "partial", "misses", "errors")),
+            "# TYPE lang_agent_semantic_cache_hit_ratio gauge",
+            f"lang_agent_semantic_cache_hit_ratio {semantic['hit_rate']:.4f}",
+        ]
+    providers = limiter_stats()
+    if providers:
+        lines.append("# TYPE lang_agent_llm_throttled_total counter")
+        lines += [f'lang_agent_llm_throttled_total{{provider="{provider}"}} {stats["throttled"]}'
+                  for provider, stats in providers.items()]
+        lines.append("# TYPE lang_agent_llm_concurrency_limit gauge")
+        lines += [f'lang_agent_llm_concurrency_limit{{provider="{provider}"}} {stats["concurrency_limit"]}'
+                  for provider, stats in providers.items()]
+    return "\n".join(lines) + "\n"
+
+# --- 3. 接口实现 ---
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: dict = None, **extra):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+        self.extra = extra
+
+def _user(params: dict) -> str:
+    return params.get("user_id") or None
+
+def _limit(params: dict, default: int) -> int:
+    try:
+        return max(1, min(int(params.get("limit", default)), 500))
+    except ValueError:
+        raise HTTPError(400, "limit 必须是整数")
+
+def _depth(body: dict) -> str:
+    depth = body.get("depth") or main.DEFAULT_DEPTH
+    if depth not in main.ANALYSIS_DEPTHS:
+        raise HTTPError(400, f"depth 必须是 {'、'.join(main.ANALYSIS_DEPTHS)} 之一")
+    return depth
+
+def _target_level(body: dict) -> str:
+    level = body.get("target_level") or main.DEFAULT_TARGET_LEVEL
+    if not isinstance(level, str) or level.upper() not in main.CEFR_LEVELS:
+        raise HTTPError(400, f"target_level 必须是 {'、'.join(main.CEFR_LEVELS)} 之一")
+    return level.upper()
+
+def _words(body: dict) -> list:
+    words = body.get("words")
+    if isinstance(words, str):
+        words = [words]
+    if not isinstance(words, list) or not all(isinstance(w, str) and w.strip() for w in words):
+        raise HTTPError(400, "words 必须是非空字符串列表")
+    return [w.strip() for w in words]
+
+class AnalysisService:
+    """请求处理逻辑（与 HTTP 解析分开，便于复用）"""
+
+    def __init__(self, pool: AnalysisPool):
+        self.pool = pool
+        self.flight = SingleFlight()
+        self.metrics = Metrics()
+
+    def analyze(self, params, body):
+        text = body.get("text") or body.get("input_text")
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(400, "缺少 text")
+        depth = _depth(body)
+        level = _target_level(body)
+        user_id = body.get("user_id")
+        run_id = main.make_run_id(user_id, text, depth, level)
+
+        # 阅读清单中已预取完成的文章直接返回，不进入分析队列
+        result = ready_result(text, user_id, depth, level, save_history=body.get("save_history", True))
+        if result is not None:
+            response = {key: result.get(key) for key in RESPONSE_STATE_KEYS}
+            response.update(run_id=run_id, depth=depth, target_level=level, coalesced=False, prefetched=True)
+            return 200, response
+
+        def execute():
+            state = {"user_id": user_id, "input_text": text, "depth": depth, "target_level": level,
+                     "known_words": main.get_known_words_from_csv(user_id)}
+            result = main.run_analysis(state, run_id)
+            if body.get("save_history", True):
+                main.save_analysis_history(text, result, user_id)
+            return result
+
+        try:
+            result, coalesced = self.flight.do(run_id, lambda: self.pool.run(execute))
+        except QueueFullError:
+            raise HTTPError(503, "服务繁忙，请稍后重试", {"Retry-After": "1"})
+        except TimeoutError as e:
+            raise HTTPError(504, str(e))
+        except main.NodeFailedError as e:
+            # 已完成的节点保存在检查点中，用相同的 user_id 和 text 重试即可续跑
+            raise HTTPError(502, str(e), node=e.node, run_id=run_id, resumable=True)
+        response = {key: result.get(key) for key in RESPONSE_STATE_KEYS}
+        response.update(run_id=run_id, depth=depth, target_level=level, coalesced=coalesced, prefetched=False)
+        return 200, response
+
+    def run_status(self, params, body, run_id):
+        """中途失败的运行停在哪个节点；运行已完成或不存在时 pending 为空"""
+        status = main.get_run_status(run_id)
+        return 200, dict(status, run_id=run_id, resumable=bool(status["pending"]))
+
+    def reading_items(self, params, body):
+        fields = ("id", "title", "depth", "status", "error", "created_at", "updated_at")
+        items = [{k: item[k] for k in fields} for item in reading_list.items(_user(params))]
+        return 200, {"items": items}
+
+    def reading_add(self, params, body):
+        text = body.get("text") or body.get("input_text")
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(400, "缺少 text")
+        item_id = reading_list.add(text, body.get("user_id"), body.get("title"), _depth(body))
+        return 200, {"id": item_id, "status": reading_list.get(item_id)["status"]}
+
+    def history(self, params, body):
+        history = main.load_analysis_history(_user(params))
+        limit = _limit(params, 20)
+        records = [{"id": r.get("id"), "timestamp": r.get("timestamp"), "input_text": r.get("input_text", "")[:200]}
+                   for r in reversed(history[-limit:])]
+        return 200, {"records": records, "total": len(history)}
+
+    def history_record(self, params, body, history_id):
+        record = main.get_analysis_by_id(history_id, _user(params))
+        if record is None:
+            raise HTTPError(404, "历史记录不存在")
+        return 200, record
+
+    def history_search(self, params, body):
+        query = params.get("q", "").strip()
+        if not query:
+            raise HTTPError(400, "缺少 q")
+        field = params.get("field") or None
+        try:
+            records = main.search_analysis_history(query, _user(params), field=field, limit=_limit(params, 20))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return 200, {"records": records}
+
+    def words(self, params, body):
+        words = main.get_all_words_from_csv(_user(params))
+        status = params.get("status")
+        if status:
+            words = [w for w in words if w.get("status") == status]
+        # pandas 读出的空值是 NaN，JSON 中改为 null
+        words = [{k: (None if v != v else v) for k, v in w.items()} for w in words]
+        return 200, {"words": words}
+
+    def mark_mastered(self, params, body):
+        words = _words(body)
+        main.mark_words_as_mastered(words, body.get("level") or "N/A", body.get("user_id"))
+        return 200, {"updated": len(words)}
+
+    def mark_learning(self, params, body):
+        words = _words(body)
+        for word in words:
+            main.mark_word_as_learning(word, body.get("user_id"))
+        return 200, {"updated": len(words)}
+
+    def health(self, params, body):
+        queued = self.pool.queued()
+        return 200, {"status": "ok", "workers": self.pool.workers, "busy": self.pool.busy,
+                     "queued": queued, "queue_size": self.pool.queue_size,
+                     "accepting": queued < self.pool.queue_size}
+
+# (方法, 路径正则, 处理函数名, 指标中的路由名)
+ROUTES = [
+    ("POST", r"/v1/analyze", "analyze", "analyze"),
+    ("GET", r"/v1/history/search", "history_search", "history_search"),
+    ("GET", r"/v1/history/([0-9A-Za-z_\-]+)", "history_record", "history_record"),
+    ("GET", r"/v1/history", "history", "history"),
+    ("GET", r"/v1/words", "words", "words"),
+    ("POST", r"/v1/words/mastered", "mark_mastered", "words_mastered"),
+    ("POST", r"/v1/words/learning", "mark_learning", "words_learning"),
+    ("GET", r"/v1/reading-list", "reading_items", "reading_list"),
+    ("POST", r"/v1/reading-list", "reading_add", "reading_add"),
+    ("GET", r"/v1/runs/([0-9A-Za-z_\-]+)", "run_status", "run_status"),
+    ("GET", r"/healthz", "health", "healthz"),
+]
+
+# --- 4. HTTP 层 ---
+class ServiceHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 默认保持连接，客户端可以在同一连接上连续发送请求
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    # 响应头和响应体分两次写出，持久连接上 Nagle 算法与延迟 ACK 叠加会让每个响应多等约 40 ms
+    disable_nagle_algorithm = True
+    service = None
+    verbose = False
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8", headers)
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "请求体过大")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise HTTPError(400, "请求体不是合法的 JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "请求体必须是 JSON 对象")
+        return body
+
+    def _dispatch(self, method: str):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        path = url.path.rstrip("/") or "/"
+        route_name = "unknown"
+        try:
+            if method == "GET" and path == "/metrics":
+                route_name = "metrics"
+                svc = self.service
+                body = render_metrics(svc.pool, svc.metrics, svc.flight).encode("utf-8")
+                self._send(200, body, "text/plain; version=0.0.4; charset=utf-8")
+                status = 200
+            else:
+                for route_method, pattern, handler, name in ROUTES:
+                    match = re.fullmatch(pattern, path)
+                    if match and route_method == method:
+                        route_name = name
+                        break
+                else:
+                    # 请求体仍需读掉，否则会污染持久连接上的下一个请求
+                    self._read_body()
+                    raise HTTPError(404, f"未知接口: {method} {path}")
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                body = self._read_body() if method == "POST" else {}
+                if body.get("user_id") is not None and not isinstance(body["user_id"], str):
+                    raise HTTPError(400, "user_id 必须是字符串")
+                status, payload = getattr(self.service, handler)(params, body, *match.groups())
+                self._send_json(status, payload)
+        except HTTPError as e:
+            status = e.status
+            self._send_json(status, {"error": str(e), **e.extra}, e.headers)
+        except Exception as e:
+            status = 500
+            print(f"--- [Server] {method} {path} 处理失败: {type(e).__name__}: {e} ---")
+            self._send_json(status, {"error": f"{type(e).__name__}: {e}"})
+        self.service.metrics.observe(route_name, status, time.perf_counter() - start)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+class AnalysisServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # listen backlog
+
+def create_server(host: str = "127.0.0.1", port: int = 8080, workers: int = DEFAULT_WORKERS,
+                  queue_size: int = DEFAULT_QUEUE_SIZE, verbose: bool = False) -> AnalysisServer:
+    """创建服务（未启动）；分析图在此时编译，第一个请求不必等待；同时启动阅读清单的预取线程"""
+    main.get_app()
+    start_prefetcher()
+    handler = type("Handler", (ServiceHandler,), {
+        "service": AnalysisService(AnalysisPool(workers, queue_size)),
+        "verbose": verbose,
+    })
+    return AnalysisServer((host, port), handler)
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="同时执行的分析数")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="排队等待的分析数上限，超出返回 503")
+    parser.add_argument("--verbose", action="store_true", help="输出每个请求的访问日志")
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port, args.workers, args.queue_size, args.verbose)
+    print(f"--- [Server] 分析服务已启动: http://{args.host}:{args.port} "
+          f"（{args.workers} 个工作线程，队列 {args.queue_size}） ---", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        main.word_buffer.flush_all()
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,71 @@
+import hashlib
+import threading
+
+# --- 相同请求合并（single-flight） ---
+# 同一时刻多个会话提交相同文章时，只有第一个请求真正调用 LLM，
+# 其余请求挂到这次计算上等待并共享结果。计算结束后立即移除，不做长期缓存。
+
+def make_key(*parts) -> str:
+    """把若干字符串组合成定长的请求键"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """按键合并并发中的相同计算"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def do(self, key: str, fn):
+        """
+        执行 fn()；若相同 key 的计算正在进行，则等待其结果
+        返回 (结果, 是否为合并的请求)，fn 抛出的异常会传递给所有等待者
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        """返回计数：总调用数、实际执行数、被合并数、当前进行中的计算数"""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+# 全局实例：Streamlit 的所有会话运行在同一进程内，共享此对象
+llm_flight = SingleFlight()
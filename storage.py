@@ -0,0 +1,99 @@
+import os
+import re
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# --- 用户数据分片 ---
+# 每个用户拥有独立的数据目录（data/users/<user_id>/），
+# 不同用户的读写互不争用；默认用户沿用旧的 data/ 目录，兼容已有数据。
+DATA_DIR = "data"
+DEFAULT_USER = "default"
+
+WORDS_FILENAME = "user_words.csv"
+HISTORY_FILENAME = "analysis_history.json"
+
+def normalize_user_id(user_id: str = None) -> str:
+    """将用户名转换为安全的目录名（非法字符替换后追加短哈希，避免冲突）"""
+    user_id = (user_id or "").strip()
+    if not user_id or user_id == DEFAULT_USER:
+        return DEFAULT_USER
+    safe = re.sub(r"[^0-9A-Za-z_\-]", "_", user_id)[:48]
+    if safe != user_id:
+        safe = f"{safe}_{hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:8]}"
+    return safe
+
+def user_data_dir(user_id: str = None) -> str:
+    """返回用户数据目录（不存在时自动创建）"""
+    user_id = normalize_user_id(user_id)
+    if user_id == DEFAULT_USER:
+        path = DATA_DIR
+    else:
+        path = os.path.join(DATA_DIR, "users", user_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def user_file(filename: str, user_id: str = None) -> str:
+    """返回用户分片内某个数据文件的路径"""
+    return os.path.join(user_data_dir(user_id), filename)
+
+# --- 分片内的并发控制 ---
+# 进程内用 threading.Lock（Streamlit 的多个会话是同一进程内的多个线程），
+# 进程间用锁文件（POSIX 用 fcntl，Windows 用 msvcrt）。
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+def _get_thread_lock(path: str) -> threading.Lock:
+    key = os.path.abspath(path)
+    with _thread_locks_guard:
+        if key not in _thread_locks:
+            _thread_locks[key] = threading.Lock()
+        return _thread_locks[key]
+
+@contextmanager
+def file_lock(path: str):
+    """
+    对某个数据文件加排他锁，保证 读取-修改-写回 过程不会丢失其他会话的更新
+    用法: with file_lock(path): ...
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _get_thread_lock(path):
+        with open(path + ".lock", "a+b") as lock_fp:
+            if os.name == "nt":
+                import msvcrt
+                lock_fp.seek(0)
+                msvcrt.locking(lock_fp.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    lock_fp.seek(0)
+                    msvcrt.locking(lock_fp.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_fp.fileno(), fcntl.LOCK_UN)
+
+@contextmanager
+def atomic_writer(path: str, mode: str = "w", encoding: str = "utf-8"):
+    """
+    原子写入：先写同目录下的临时文件并 fsync，再用 os.replace 替换目标文件
+    写入过程中崩溃不会留下半个文件
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.basename(path))
+    try:
+        kwargs = {} if "b" in mode else {"encoding": encoding, "newline": ""}
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """在临时目录中运行（data/ 等相对路径写到这里），提示词和词表仍指向仓库"""
+    for name in ("prompts", "lexicon"):
+        os.symlink(os.path.join(ROOT, name), tmp_path / name)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def repo_root(monkeypatch):
+    """以仓库根目录为当前目录（提示词按相对路径读取）"""
+    monkeypatch.chdir(ROOT)
+    return ROOT
@@ -0,0 +1,29 @@
+"""共享释义缓存按文本语言区分：英文文章中 pain 的释义不能用在法语文章里"""
+import pytest
+
+import main
+from definition_cache import DefinitionCache
+
+PAIN_EN = {"word": "pain", "phonetic": "/peɪn/", "definition": "疼痛", "example": "No pain, no gain."}
+
+
+@pytest.fixture
+def cache(workdir, monkeypatch):
+    monkeypatch.setenv("DEFINITION_CACHE", "1")
+    cache = DefinitionCache(str(workdir / "definition_cache.db"))
+    monkeypatch.setattr(main, "definition_cache", cache)
+    return cache
+
+
+def test_definitions_are_keyed_by_language(cache):
+    main.fill_definitions({"vocabulary": [dict(PAIN_EN)]}, {}, "en")
+    assert main.lookup_definitions(["pain"], "", "en")["pain"]["definition"] == "疼痛"
+    assert main.lookup_definitions(["pain"], "", "fr") == {}
+    assert main.lookup_definitions(None, "Le chat mange du pain.", "fr") == {}
+
+
+def test_filled_entries_use_the_same_language(cache):
+    main.fill_definitions({"vocabulary": [dict(PAIN_EN)]}, {}, "en")
+    analysis = {"vocabulary": [{"word": "pain"}]}
+    stats = main.fill_definitions(analysis, main.lookup_definitions(["pain"], "", "fr"), "fr")
+    assert stats["filled"] == 0 and "definition" not in analysis["vocabulary"][0]
@@ -0,0 +1,44 @@
+"""扁平向量索引：追加写入中途崩溃后，缩放系数与向量仍按行一一对应"""
+import numpy as np
+import pytest
+
+from flat_index import FlatIndex
+
+
+def _vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    index = FlatIndex(str(tmp_path), dtype="int8")
+    index.add(["a", "b", "c"], ["", "", ""], _vectors(3))
+    return tmp_path, index
+
+
+def _check_after_crash(path):
+    index = FlatIndex(str(path))
+    assert len(index) == 3
+    fresh = _vectors(1, seed=1)
+    index.add(["d"], [""], fresh)
+    assert len(index) == 4
+    assert index.search(fresh, k=1)[0][0]["id"] == "d"
+    assert index.search(fresh, k=1)[0][0]["score"] == pytest.approx(1.0, abs=0.02)
+    # 之前的行不受影响
+    assert index.search(_vectors(3)[1:2], k=1)[0][0]["id"] == "b"
+
+
+def test_scale_written_without_vector(index_dir):
+    path, index = index_dir
+    with open(index._scales_path, "ab") as f:
+        f.write(np.float32(0.5).tobytes())
+    _check_after_crash(path)
+
+
+def test_torn_vector_row(index_dir):
+    path, index = index_dir
+    with open(index._scales_path, "ab") as f:
+        f.write(np.float32(0.5).tobytes())
+    with open(index._vectors_path, "ab") as f:
+        f.write(b"\x01" * 5)
+    _check_after_crash(path)
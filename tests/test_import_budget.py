@@ -0,0 +1,36 @@
+"""导入预算：启动时只加载轻量模块，LangChain / LangGraph 等重依赖推迟到第一次分析"""
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("langchain_openai", "langchain_core", "langgraph", "numpy", "pandas", "concurrent.futures")
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "100"))
+
+
+def run_import(module: str) -> dict:
+    """在全新的子进程中导入模块，返回耗时和已加载的重依赖"""
+    code = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "ms = (time.perf_counter() - start) * 1000\n"
+        f"print(json.dumps({{'ms': ms, 'heavy': [m for m in {HEAVY!r} if m in sys.modules]}}))\n"
+    )
+    env = dict(os.environ, PREFETCH="0")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["main", "server", "reading_list", "result_store"])
+def test_import_does_not_load_heavy_dependencies(module):
+    assert run_import(module)["heavy"] == []
+
+
+def test_main_import_within_budget():
+    # 取三次中最快的一次，排除首次读盘等偶然因素
+    best = min(run_import("main")["ms"] for _ in range(3))
+    assert best < IMPORT_BUDGET_MS, f"import main 耗时 {best:.0f} ms，超出预算 {IMPORT_BUDGET_MS:.0f} ms"
@@ -0,0 +1,51 @@
+"""分级路由：输出不合格时升级到更强的模型，但不把同样的请求再发给同一个模型"""
+from types import SimpleNamespace
+
+import pytest
+
+import llm_router
+from llm_router import ModelTier, OutputValidationError
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """替换实际调用：记录被调用的级别，返回模型名作为内容"""
+    called = []
+
+    def fake_call(node, tier, messages, backup=None):
+        called.append(tier.name)
+        return SimpleNamespace(content=tier.model), tier
+
+    monkeypatch.setattr(llm_router, "call_with_hedge", fake_call)
+    return called
+
+
+def _tiers(monkeypatch, *tiers):
+    monkeypatch.setattr(llm_router, "load_tiers", lambda: list(tiers))
+
+
+def _only(model):
+    def validate(response):
+        if response.content != model:
+            raise ValueError("格式不正确")
+        return response.content
+    return validate
+
+
+def test_same_model_is_not_retried(monkeypatch, calls):
+    _tiers(monkeypatch,
+           ModelTier("short", "deepseek-chat", "https://api.deepseek.com/v1", max_input_tokens=1000),
+           ModelTier("long", "deepseek-chat", "https://api.deepseek.com/v1"))
+    with pytest.raises(OutputValidationError):
+        llm_router.invoke_llm("linguist_agent", [], "short text", validate=_only("gpt-4o"))
+    assert calls == ["short"]
+
+
+def test_stronger_model_is_tried_after_validation_failure(monkeypatch, calls):
+    _tiers(monkeypatch,
+           ModelTier("mini", "gpt-4o-mini", max_input_tokens=4000),
+           ModelTier("mini-long", "gpt-4o-mini"),
+           ModelTier("strong", "gpt-4o"))
+    result, _, tier = llm_router.invoke_llm("linguist_agent", [], "short text", validate=_only("gpt-4o"))
+    assert calls == ["mini", "strong"]
+    assert result == "gpt-4o" and tier.name == "strong"
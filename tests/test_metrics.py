@@ -0,0 +1,25 @@
+"""/metrics 输出：每个指标都有 # TYPE 行，summary 同时给出 _sum 和 _count"""
+import re
+
+import server
+
+
+def _exposition():
+    metrics = server.Metrics()
+    for seconds in (0.1, 0.2, 0.3):
+        metrics.observe("analyze", 200, seconds)
+    pool = server.AnalysisPool(workers=1, queue_size=1)
+    return server.render_metrics(pool, metrics, server.SingleFlight())
+
+
+def test_every_sample_has_a_type_line():
+    text = _exposition()
+    typed = dict(re.findall(r"^# TYPE (\S+) (\S+)$", text, re.M))
+    for name in re.findall(r"^([a-z_]+)[{ ]", text, re.M):
+        assert name in typed or re.sub(r"_(sum|count)$", "", name) in typed, name
+
+
+def test_summary_has_sum_and_count():
+    text = _exposition()
+    assert 'lang_agent_request_seconds_sum{route="analyze"} 0.6000' in text
+    assert 'lang_agent_request_seconds_count{route="analyze"} 3' in text
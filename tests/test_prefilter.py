@@ -0,0 +1,32 @@
+"""本地词表预筛选只用于英文文本：其他语言的同形词（chat、pain）不能被英文词表筛掉"""
+import main
+
+FRENCH = "Le chat mange du pain sur la table. Il est très content et ne veut pas partir."
+GERMAN = "Der Hund läuft schnell über die Straße und das Kind ist nicht müde."
+ENGLISH = "The committee deliberated at length about the ambiguous regulation."
+
+
+def test_non_english_text_skips_prefilter(workdir):
+    for text in (FRENCH, GERMAN):
+        assert main.prefilter_candidates({"input_text": text}, text) == (None, None)
+
+
+def test_language_is_detected_on_the_whole_text(workdir):
+    # 只有一句改动过的英文外来语时仍按全文（法语）判断
+    assert main.prefilter_candidates({"input_text": FRENCH}, "[S1] The weekend.") == (None, None)
+
+
+def test_english_text_is_prefiltered(workdir):
+    candidates, stats = main.prefilter_candidates({"input_text": ENGLISH}, ENGLISH)
+    assert {"deliberated", "ambiguous"} <= set(candidates)
+    assert "the" not in candidates
+    assert stats["unique_words"] == stats["candidates"] + stats["filtered_out"]
+
+
+def test_prompt_tokens_saved_is_measured_on_the_candidate_line(workdir):
+    candidates, stats = main.prefilter_candidates({"input_text": ENGLISH}, ENGLISH)
+    words = list(dict.fromkeys(w.lower() for w in main.tokenize(ENGLISH)))
+    expected = (main.estimate_tokens(main.build_candidates_line(words))
+                - main.estimate_tokens(main.build_candidates_line(candidates)))
+    assert stats["prompt_tokens_saved"] == expected > 0
+    assert main.build_candidates_line(candidates) in main.build_linguist_messages([], ENGLISH, candidates)[-1].content
@@ -0,0 +1,62 @@
+"""提示词前缀稳定性：同一用户的系统提示词和已知词块逐字节不变，只有最后一条消息随文本变化"""
+import random
+
+import pytest
+
+import main
+
+KNOWN_WORDS = ["apple", "Committee", "deliberate", "bureaucracy", "  ambiguous ", "apple"]
+TEXTS = [
+    "The committee deliberated at length.",
+    "Researchers were frustrated by ambiguous regulation.",
+]
+
+
+def _prefix(messages):
+    return [(type(m).__name__, m.content.encode("utf-8")) for m in messages[:-1]]
+
+
+@pytest.fixture(autouse=True)
+def _cwd(repo_root):
+    pass
+
+
+def test_linguist_prefix_independent_of_text():
+    prefixes = {tuple(_prefix(main.build_linguist_messages(KNOWN_WORDS, text))) for text in TEXTS}
+    assert len(prefixes) == 1
+
+
+def test_linguist_prefix_independent_of_known_words_order():
+    shuffled = list(KNOWN_WORDS)
+    random.Random(0).shuffle(shuffled)
+    upper = [w.upper() for w in KNOWN_WORDS]
+    expected = _prefix(main.build_linguist_messages(KNOWN_WORDS, TEXTS[0]))
+    assert _prefix(main.build_linguist_messages(shuffled, TEXTS[1])) == expected
+    assert _prefix(main.build_linguist_messages(upper, TEXTS[1])) == expected
+
+
+def test_linguist_variable_parts_only_in_last_message():
+    messages = main.build_linguist_messages(KNOWN_WORDS, TEXTS[0], candidates=["deliberate"], defined=["apple"])
+    assert _prefix(messages) == _prefix(main.build_linguist_messages(KNOWN_WORDS, TEXTS[1]))
+    assert TEXTS[0] in messages[-1].content
+    assert "deliberate" in messages[-1].content
+
+
+def test_summarizer_prefix_independent_of_text_and_depth():
+    prefixes = {
+        tuple(_prefix(main.build_summarizer_messages(text, detailed)))
+        for text in TEXTS for detailed in (True, False)
+    }
+    assert len(prefixes) == 1
+
+
+def test_known_words_block_is_deduplicated_and_sorted():
+    block = main.build_known_words_block(KNOWN_WORDS)
+    assert block.startswith(f"[{main.KNOWN_WORDS_BLOCK_VERSION}] 以下 5 个单词")
+    assert block.endswith("ambiguous, apple, bureaucracy, committee, deliberate")
+
+
+def test_summarizer_update_shares_system_prefix():
+    update = main.build_summarizer_update_messages({"summary": "s", "detailed_reading": "d"},
+                                                   [(2, "A new sentence.")], ["An old sentence."])
+    assert _prefix(update) == _prefix(main.build_summarizer_messages(TEXTS[0]))
@@ -0,0 +1,54 @@
+"""阅读清单：打开预取好的结果时按当前词库过滤生词"""
+import pytest
+
+import main
+import reading_list
+from reading_list import READY, OPENED, ReadingList, open_item
+from result_store import result_store
+
+USER = "reader"
+TEXT = "The ubiquitous committee reached an unprecedented compromise."
+
+
+@pytest.fixture
+def prefetched(workdir, monkeypatch):
+    """登记一篇文章，并放入预取时（词库为空）得到的结果"""
+    monkeypatch.setattr(reading_list, "reading_list", ReadingList(str(workdir / "reading_list.db")))
+    item_id = reading_list.reading_list.add(TEXT, USER)
+    result = {
+        "user_id": USER, "input_text": TEXT, "depth": "full", "known_words": [], "prefetch": True,
+        "analysis_result": {
+            "vocabulary": [{"word": "ubiquitous", "meaning": "无处不在的"},
+                           {"word": "unprecedented", "meaning": "前所未有的"}],
+            "grammar_points": [],
+        },
+        "summary_result": "大意", "detailed_reading": "细读",
+    }
+    reading_list.reading_list.mark(item_id, READY, result_key=result_store.put(result))
+    return item_id
+
+
+def _words(result):
+    return [item["word"] for item in result["analysis_result"]["vocabulary"]]
+
+
+def test_words_mastered_after_prefetch_are_dropped(prefetched):
+    main.mark_words_as_mastered(["Ubiquitous"], user_id=USER)
+    result = open_item(reading_list.reading_list.get(prefetched))
+    assert _words(result) == ["unprecedented"]
+    assert "ubiquitous" not in [w.lower() for w in result["mastered_new_words"]]
+    assert reading_list.reading_list.get(prefetched)["status"] == OPENED
+
+
+def test_reopening_uses_the_current_known_words(prefetched):
+    assert _words(open_item(reading_list.reading_list.get(prefetched))) == ["ubiquitous", "unprecedented"]
+    main.mark_words_as_mastered(["unprecedented"], user_id=USER)
+    assert _words(open_item(reading_list.reading_list.get(prefetched))) == ["ubiquitous"]
+
+
+def test_server_honors_save_history_for_prefetched_results(prefetched):
+    import server
+    service = server.AnalysisService(server.AnalysisPool(workers=1, queue_size=1))
+    status, body = service.analyze({}, {"user_id": USER, "text": TEXT, "save_history": False})
+    assert status == 200 and body["prefetched"] is True
+    assert main.load_analysis_history(USER) == []
@@ -0,0 +1,63 @@
+"""运行状态：节点失败后检查点停在失败的节点，/v1/runs/<run_id> 报告待执行的节点，重试后续跑"""
+import re
+import functools
+
+import pytest
+
+import main
+import server
+
+STATE = {"user_id": "alice", "input_text": "A short text.", "known_words": [], "depth": "full"}
+
+
+@pytest.fixture
+def graph(workdir, monkeypatch):
+    """用内存检查点编译的图，节点替换为记录调用的假实现；summarizer 第一次失败"""
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    calls = []
+
+    def linguist(state):
+        calls.append("linguist_agent")
+        return {"analysis_result": {"vocabulary": [], "grammar": []}}
+
+    def summarizer(state):
+        calls.append("summarizer_agent")
+        if calls.count("summarizer_agent") == 1:
+            raise main.NodeFailedError("summarizer_agent", "超时")
+        return {"summary_result": "大意", "detailed_reading": "细读"}
+
+    monkeypatch.setattr(main, "linguist_node", linguist)
+    monkeypatch.setattr(main, "summarizer_node", summarizer)
+    monkeypatch.setattr(main, "memory_updater_node", lambda state: {})
+    monkeypatch.setattr(main, "get_app", functools.lru_cache(maxsize=None)(
+        lambda: main.build_workflow().compile(checkpointer=InMemorySaver())))
+    return calls
+
+
+def test_failed_run_reports_pending_node_and_resumes(graph):
+    run_id = main.make_run_id(STATE["user_id"], STATE["input_text"])
+    with pytest.raises(main.NodeFailedError):
+        main._run_graph(dict(STATE), run_id)
+
+    status, body = server.AnalysisService.run_status(None, {}, {}, run_id)
+    assert status == 200
+    assert body["run_id"] == run_id and body["resumable"] is True
+    assert body["pending"] == ["summarizer_agent"]
+    assert "超时" in body["failed"]["summarizer_agent"]
+
+    result = main._run_graph(dict(STATE), run_id)
+    assert result["summary_result"] == "大意"
+    assert graph == ["linguist_agent", "summarizer_agent", "summarizer_agent"]  # linguist 没有重复运行
+    # 完成后检查点已删除
+    assert main.get_run_status(run_id) == {"pending": [], "failed": {}}
+
+
+def test_unknown_run_is_not_resumable(graph):
+    status, body = server.AnalysisService.run_status(None, {}, {}, "no-such-run")
+    assert status == 200 and body["resumable"] is False and body["pending"] == []
+
+
+def test_run_status_route():
+    matches = [r for r in server.ROUTES if r[0] == "GET" and re.fullmatch(r[1], "/v1/runs/abc123")]
+    assert [r[2] for r in matches] == ["run_status"]
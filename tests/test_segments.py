@@ -0,0 +1,76 @@
+"""按句子增量分析：未改动的句子复用片段缓存，只有新句子发给模型"""
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from segments import SegmentCache, split_segments
+
+TEXT = ("The committee deliberated at length. Researchers were frustrated by ambiguous regulation. "
+        "The negotiation ended in compromise. Observers called it unprecedented.")
+
+
+@pytest.fixture
+def llm(workdir, monkeypatch):
+    """替换模型调用：记录每次发送的句子，按句子返回一个生词（已知词块以外句中最长的单词）"""
+    sent = []
+
+    def fake_invoke(node, messages, text, validate=None):
+        lines = re.findall(r"\[S(\d+)\] (.+)", text)
+        sent.append([sentence for _, sentence in lines])
+        known = set(re.findall(r"[a-z]+", messages[1].content.split("\n", 1)[1]))
+        vocabulary = [{"word": max(set(re.findall(r"[a-z]+", sentence.lower())) - known, key=len),
+                       "segment": f"S{n}", "meaning": "释义"} for n, sentence in lines]
+        analysis = {"vocabulary": vocabulary, "grammar_points": []}
+        return analysis, SimpleNamespace(response_metadata={}, content=""), SimpleNamespace(model="fake")
+
+    monkeypatch.setenv("DEFINITION_CACHE", "0")
+    monkeypatch.setenv("LEXICON_PREFILTER", "0")
+    monkeypatch.setattr(main, "segment_cache", SegmentCache(str(workdir / "segment_cache.db")))
+    monkeypatch.setattr(main, "select_tiers", lambda *args, **kwargs: [SimpleNamespace(model="fake")])
+    monkeypatch.setattr(main, "invoke_llm", fake_invoke)
+    return sent
+
+
+def _analyze(text, known_words=()):
+    state = {"input_text": text, "known_words": list(known_words)}
+    return main.linguist_node(state)
+
+
+def test_appended_sentence_is_the_only_one_sent(llm):
+    _analyze(TEXT)
+    result = _analyze(TEXT + " Everyone went home exhausted.")
+    assert llm[-1] == ["Everyone went home exhausted."]
+    stats = result["usage"]["linguist_agent"]["segments"]
+    assert stats == {"total": 5, "reused": 4, "analyzed": 1}
+
+
+def test_unchanged_text_makes_no_call(llm):
+    _analyze(TEXT)
+    result = _analyze(" ".join(TEXT.split()))
+    assert len(llm) == 1
+    assert result["usage"]["linguist_agent"]["segments"]["reused"] == len(split_segments(TEXT))
+
+
+def test_marking_a_word_mastered_keeps_segments_cached(llm):
+    first = _analyze(TEXT)
+    words = [item["word"] for item in first["analysis_result"]["vocabulary"]]
+    result = _analyze(TEXT, known_words=[words[0].upper()])
+    assert len(llm) == 1
+    assert [item["word"] for item in result["analysis_result"]["vocabulary"]] == words[1:]
+
+
+def test_target_level_invalidates_segments(llm):
+    _analyze(TEXT)
+    main.linguist_node({"input_text": TEXT, "known_words": [], "target_level": "C1"})
+    assert len(llm) == 2
+
+
+def test_cached_segments_do_not_depend_on_known_words(llm):
+    # alice 已掌握 researchers，先分析；bob 随后分析同一文本，复用的句子仍应包含该词
+    alice = _analyze(TEXT, known_words=["researchers"])
+    bob = _analyze(TEXT)
+    assert len(llm) == 1
+    assert "researchers" not in [item["word"] for item in alice["analysis_result"]["vocabulary"]]
+    assert "researchers" in [item["word"] for item in bob["analysis_result"]["vocabulary"]]
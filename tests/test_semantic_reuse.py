@@ -0,0 +1,81 @@
+"""近似重复文本：生词只分析改动的句子，大意在相似文本的结果上增量更新，而不是照搬旧的大意"""
+import re
+import json
+import functools
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from segments import SegmentCache, SummaryCache
+from semantic_cache import SemanticCache
+
+SENTENCES = [
+    "The committee deliberated at length about the new budget.",
+    "Researchers were frustrated by ambiguous regulation.",
+    "The negotiation ended in a fragile compromise.",
+    "Observers called the outcome unprecedented.",
+    "Funding will be reviewed again next spring.",
+]
+TEXT = " ".join(SENTENCES)
+ADDED = "A separate panel will examine renewable energy subsidies."
+
+
+@pytest.fixture
+def analyze(workdir, monkeypatch):
+    """真实的节点和语义缓存，模型调用替换为记录请求的假实现"""
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    sent = {"linguist_agent": [], "summarizer_agent": []}
+
+    def fake_invoke(node, messages, text, validate=None):
+        sent[node].append(messages[-1].content)
+        if node == "linguist_agent":
+            lines = re.findall(r"\[S(\d+)\] (.+)", text)
+            result = {"vocabulary": [{"word": max(re.findall(r"[a-z]+", s.lower()), key=len), "segment": f"S{n}",
+                                      "meaning": "释义"} for n, s in lines], "grammar_points": []}
+        else:
+            n = len(sent[node])
+            result = {"summary": f"大意 {n}", "detailed_reading": f"细读 {n}"}
+        response = SimpleNamespace(response_metadata={}, content=json.dumps(result, ensure_ascii=False))
+        return result, response, SimpleNamespace(model="fake")
+
+    monkeypatch.setenv("DEFINITION_CACHE", "0")
+    monkeypatch.setenv("LEXICON_PREFILTER", "0")
+    monkeypatch.setattr(main, "segment_cache", SegmentCache(str(workdir / "segment_cache.db")))
+    monkeypatch.setattr(main, "summary_cache", SummaryCache(str(workdir / "summary_cache.db")))
+    monkeypatch.setattr(main, "select_tiers", lambda *args, **kwargs: [SimpleNamespace(model="fake")])
+    monkeypatch.setattr(main, "invoke_llm", fake_invoke)
+    monkeypatch.setattr(main, "memory_updater_node", lambda state: {})
+    monkeypatch.setattr(main, "get_app", functools.lru_cache(maxsize=None)(
+        lambda: main.build_workflow().compile(checkpointer=InMemorySaver())))
+    cache = SemanticCache(str(workdir / "semantic_cache"), threshold=0.5)
+    monkeypatch.setattr(main, "get_semantic_cache", lambda: cache)
+
+    def run(text, depth="full"):
+        return main._analyze({"user_id": "u", "input_text": text, "known_words": [], "depth": depth})
+
+    return run, sent
+
+
+def test_near_duplicate_revises_the_summary(analyze):
+    run, sent = analyze
+    run(TEXT)
+    result = run(TEXT + " " + ADDED)
+    assert result["usage"]["semantic_cache"]["mode"] == "partial"
+    assert result["usage"]["linguist_agent"]["segments"]["analyzed"] == 1
+    # 新增的句子和上一版结果发给模型，返回的是更新后的大意
+    assert ADDED in sent["summarizer_agent"][-1] and "大意 1" in sent["summarizer_agent"][-1]
+    assert result["summary_result"] == "大意 2"
+    assert result["usage"]["summarizer_agent"]["summary_cache"] == "revised"
+
+
+def test_hit_result_seeds_the_summary_cache(analyze, workdir, monkeypatch):
+    run, sent = analyze
+    run(TEXT)
+    # 大意缓存中已没有原文的版本：以命中的结果为基础更新
+    monkeypatch.setattr(main, "summary_cache", SummaryCache(str(workdir / "fresh_summary_cache.db")))
+    result = run(TEXT + " " + ADDED, depth="summary")
+    assert result["usage"]["semantic_cache"]["mode"] == "partial"
+    assert "大意 1" in sent["summarizer_agent"][-1] and ADDED in sent["summarizer_agent"][-1]
+    assert result["summary_result"] == "大意 2"
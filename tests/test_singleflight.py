@@ -0,0 +1,76 @@
+"""相同请求合并：同一键的并发调用只执行一次，结果和异常传给所有等待者"""
+import threading
+
+from singleflight import SingleFlight, make_key
+
+
+def _run_concurrently(flight, key, fn, n):
+    """n 个线程同时调用 flight.do(key, fn)，返回各自的 (结果, 是否合并) 或异常"""
+    outcomes = [None] * n
+    start = threading.Barrier(n)
+
+    def worker(i):
+        start.wait()
+        try:
+            outcomes[i] = flight.do(key, fn)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    return outcomes
+
+
+def _gated(result=None, error=None):
+    """第一次调用后阻塞，直到所有线程都已挂到这次计算上"""
+    calls = []
+    release = threading.Event()
+
+    def fn():
+        calls.append(1)
+        release.wait(timeout=10)
+        if error is not None:
+            raise error
+        return result
+    return fn, calls, release
+
+
+def test_concurrent_calls_execute_once():
+    flight = SingleFlight()
+    fn, calls, release = _gated(result={"summary": "ok"})
+    threading.Timer(0.2, release.set).start()
+    outcomes = _run_concurrently(flight, "k", fn, 8)
+    assert len(calls) == 1
+    assert all(result == {"summary": "ok"} for result, _ in outcomes)
+    assert sorted(coalesced for _, coalesced in outcomes) == [False] + [True] * 7
+    assert flight.stats() == {"calls": 8, "executions": 1, "coalesced": 7, "in_flight": 0}
+
+
+def test_error_propagates_to_all_waiters():
+    flight = SingleFlight()
+    fn, calls, release = _gated(error=ValueError("boom"))
+    threading.Timer(0.2, release.set).start()
+    outcomes = _run_concurrently(flight, "k", fn, 4)
+    assert len(calls) == 1
+    assert all(isinstance(o, ValueError) for o in outcomes)
+
+
+def test_finished_calls_are_not_cached():
+    flight = SingleFlight()
+    counter = iter(range(10))
+    assert flight.do("k", lambda: next(counter)) == (0, False)
+    assert flight.do("k", lambda: next(counter)) == (1, False)
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: "a") == ("a", False)
+    assert flight.do("b", lambda: "b") == ("b", False)
+
+
+def test_make_key_separates_parts():
+    assert make_key("ab", "c") != make_key("a", "bc")
+    assert make_key("ab", "c") != make_key("abc")
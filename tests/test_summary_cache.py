@@ -0,0 +1,89 @@
+"""大意增量更新：文本不变时不调用模型，改动一句时只发送上一版结果和改动的句子"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from segments import SummaryCache
+
+SENTENCES = [
+    "The committee deliberated at length about the new budget.",
+    "Researchers were frustrated by ambiguous regulation.",
+    "The negotiation ended in a fragile compromise.",
+    "Observers called the outcome unprecedented.",
+    "Funding will be reviewed again next spring.",
+]
+TEXT = " ".join(SENTENCES)
+
+
+@pytest.fixture
+def llm(workdir, monkeypatch):
+    """替换模型调用：记录最后一条消息，返回固定格式的大意"""
+    sent = []
+
+    def fake_invoke(node, messages, text, validate=None):
+        sent.append(messages[-1].content)
+        result = {"summary": f"大意 {len(sent)}", "detailed_reading": f"细读 {len(sent)}"}
+        response = SimpleNamespace(response_metadata={}, content=json.dumps(result, ensure_ascii=False))
+        return result, response, SimpleNamespace(model="fake")
+
+    monkeypatch.setattr(main, "summary_cache", SummaryCache(str(workdir / "summary_cache.db")))
+    monkeypatch.setattr(main, "select_tiers", lambda *args, **kwargs: [SimpleNamespace(model="fake")])
+    monkeypatch.setattr(main, "invoke_llm", fake_invoke)
+    return sent
+
+
+def _summarize(text, depth="full"):
+    return main.summarizer_node({"input_text": text, "depth": depth})
+
+
+def test_unchanged_text_is_not_resummarized(llm):
+    first = _summarize(TEXT)
+    again = _summarize("  " + TEXT.replace(". ", ".\n"))
+    assert len(llm) == 1
+    assert again["summary_result"] == first["summary_result"]
+    assert again["usage"]["summarizer_agent"]["summary_cache"] == "reused"
+
+
+def test_one_sentence_edit_sends_only_the_change(llm):
+    _summarize(TEXT)
+    edited = TEXT.replace("fragile compromise", "lasting agreement")
+    result = _summarize(edited)
+    request = llm[-1]
+    assert "lasting agreement" in request and "fragile compromise" in request
+    assert "大意 1" in request  # 上一版结果
+    assert all(s not in request for s in SENTENCES if "compromise" not in s)
+    assert result["summary_result"] == "大意 2"
+    assert result["usage"]["summarizer_agent"]["summary_cache"] == "revised"
+    # 修改后的版本也被缓存
+    _summarize(edited)
+    assert len(llm) == 2
+
+
+def test_mostly_new_text_is_summarized_in_full(llm):
+    _summarize(TEXT)
+    other = " ".join(SENTENCES[:1] + ["A completely different story begins here.", "Nothing else is the same.",
+                                      "The weather was cold.", "Everyone stayed home."])
+    result = _summarize(other)
+    assert llm[-1].endswith(other)
+    assert result["usage"]["summarizer_agent"]["summary_cache"] == "full"
+
+
+def test_summary_depth_cached_separately(llm):
+    _summarize(TEXT, "full")
+    _summarize(TEXT, "summary")
+    assert len(llm) == 2
+
+
+def test_invalid_output_fails_the_node(llm, monkeypatch):
+    def invalid(node, messages, text, validate=None):
+        raise main.OutputValidationError("所有模型输出均未通过校验", SimpleNamespace(content="not json"))
+
+    monkeypatch.setattr(main, "invoke_llm", invalid)
+    with pytest.raises(main.NodeFailedError) as e:
+        _summarize(TEXT)
+    assert e.value.node == "summarizer_agent"
+    # 失败的输出不写入缓存，重试时重新请求
+    _, _, doc, context = main.summary_cache_key(TEXT, "full")
+    assert main.summary_cache.get(doc, context) is None
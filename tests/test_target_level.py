@@ -0,0 +1,36 @@
+"""目标等级：决定哪些词作为候选生词，无效值回退到 B2"""
+import pytest
+
+import main
+import server
+
+TEXT = "Again the academic abandoned an adjacent aberration."
+
+
+def test_target_level_defaults_and_validation():
+    assert main.target_level({}) == "B2"
+    assert main.target_level({"target_level": "c1"}) == "C1"
+    assert main.target_level({"target_level": "Z9"}) == "B2"
+
+
+def test_level_controls_candidates(workdir):
+    def candidates(level):
+        found, _ = main.prefilter_candidates({"target_level": level, "known_words": []}, TEXT)
+        return set(found)
+
+    assert {"academic", "abandoned"} <= candidates("B1")
+    assert "academic" not in candidates("C1")
+    assert {"adjacent", "aberration"} <= candidates("C1")
+    assert candidates("C1") < candidates("B1")
+
+
+def test_level_is_part_of_run_id():
+    assert main.make_run_id("u", TEXT, "full", "B2") != main.make_run_id("u", TEXT, "full", "C1")
+
+
+def test_server_rejects_unknown_level():
+    assert server._target_level({"target_level": "c1"}) == "C1"
+    assert server._target_level({}) == main.DEFAULT_TARGET_LEVEL
+    with pytest.raises(server.HTTPError) as e:
+        server._target_level({"target_level": "Z9"})
+    assert e.value.status == 400
@@ -0,0 +1,87 @@
+"""增量学习统计：随机的加词、改回学习中、标记已掌握、写盘和外部修改之后，与全量重算一致"""
+import random
+import datetime
+
+import pytest
+
+import word_store
+from storage import WORDS_FILENAME, user_file
+from word_stats import compute_stats
+from word_store import WordWriteBuffer, make_status_change, read_words_df, write_words_df, learning_stats
+
+USER = "stats"
+WORDS = ["abate", "benign", "candid", "deft", "elicit", "fervent", "gauche", "hapless"]
+LEVELS = ["N/A", "B2", "C1"]
+
+
+@pytest.fixture
+def buffer(workdir, monkeypatch):
+    buf = WordWriteBuffer(flush_threshold=1000, flush_interval=3600)
+    monkeypatch.setattr(word_store, "word_buffer", buf)
+    yield buf
+    if buf._timer is not None:
+        buf._timer.cancel()
+
+
+def _add_learning(words):
+    """与记忆更新节点相同：在同一次写盘中把新词以 learning 状态加入词库"""
+    import pandas as pd
+    today = datetime.date.today().isoformat()
+
+    def transform(df):
+        rows = [{"word": w, "level": random.choice(LEVELS), "last_queried": today, "score": 0, "status": "learning"}
+                for w in words if w not in df["word"].values]
+        return pd.concat([df, pd.DataFrame(rows, columns=word_store.WORD_COLUMNS)], ignore_index=True) if rows else df
+    return transform
+
+
+def _external_edit():
+    """绕过缓冲直接改写 CSV（手工编辑 / 旧版本写入），统计文件随之失效"""
+    path = user_file(WORDS_FILENAME, USER)
+    df = read_words_df(path)
+    df.loc[len(df)] = [f"extra{len(df)}", "B1", datetime.date.today().isoformat(), 0, "learning"]
+    write_words_df(df, path)
+
+
+def _states(df):
+    return {w: (s, str(l)) for w, s, l in zip(df["word"], df["status"], df["level"].fillna("N/A"))}
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_incremental_stats_match_full_recompute(buffer, seed):
+    rng = random.Random(seed)
+    random.seed(seed)
+    today = datetime.date.today().isoformat()
+    mastered_events = 0  # mastered_per_day 统计的是标记事件（改回学习中不回退）
+    for step in range(80):
+        action = rng.choice(["add", "learn", "master", "master", "flush", "edit"])
+        word = rng.choice(WORDS)
+        if action == "add":
+            buffer.flush(USER, transform=_add_learning(rng.sample(WORDS, 3)))
+        elif action == "learn":
+            buffer.stage([make_status_change(word, "learning")], USER)
+        elif action == "master":
+            current = word_store.load_words_df(USER)
+            already = ((current["word"] == word) & (current["status"] == "mastered")).any()
+            buffer.stage([make_status_change(word, "mastered", rng.choice(LEVELS))], USER)
+            mastered_events += not already
+        elif action == "flush":
+            # 写盘前叠加了待写变更的词库与写盘后的 CSV 相同
+            before = word_store.load_words_df(USER)
+            buffer.flush(USER)
+            after = read_words_df(user_file(WORDS_FILENAME, USER))
+            assert _states(after) == _states(before), f"seed {seed} step {step}"
+        else:
+            buffer.flush(USER)
+            _external_edit()
+
+        df = word_store.load_words_df(USER)
+        expected = compute_stats(df)
+        if action == "edit":
+            # 全量重算时每日数据按 last_queried 近似
+            mastered_events = expected["mastered_per_day"].get(today, 0)
+        stats = learning_stats(USER)
+        context = f"seed {seed} step {step} ({action} {word})"
+        for key in ("total", "by_status", "by_level", "added_per_day"):
+            assert stats[key] == expected[key], f"{context}: {key}"
+        assert stats["mastered_per_day"].get(today, 0) == mastered_events, context
@@ -0,0 +1,65 @@
+"""生词库写后缓冲：变更先写日志，崩溃后由下一个进程回放"""
+import os
+
+import pytest
+
+from storage import WORDS_FILENAME, user_file
+from word_store import WordWriteBuffer, JOURNAL_FILENAME, make_status_change, read_words_df
+
+
+@pytest.fixture
+def buffer(workdir):
+    buffers = []
+
+    def make():
+        buf = WordWriteBuffer(flush_threshold=100, flush_interval=3600)
+        buffers.append(buf)
+        return buf
+
+    yield make
+    for buf in buffers:
+        if buf._timer is not None:
+            buf._timer.cancel()
+
+
+def _statuses(user_id):
+    df = read_words_df(user_file(WORDS_FILENAME, user_id))
+    return dict(zip(df['word'], df['status']))
+
+
+def test_staged_changes_are_visible_before_flush(buffer):
+    buf = buffer()
+    buf.stage([make_status_change("deliberate", "mastered")], "alice")
+    assert set(buf.pending("alice")) == {"deliberate"}
+    assert _statuses("alice") == {}
+
+
+def test_journal_replayed_after_crash(buffer):
+    crashed = buffer()
+    crashed.stage([make_status_change("deliberate", "mastered"),
+                   make_status_change("ambiguous", "mastered")], "alice")
+    crashed.stage([make_status_change("ambiguous", "learning")], "alice")
+    # 模拟崩溃：不调用 flush，新的缓冲实例（下一个进程）首次访问该用户时回放日志
+    restarted = buffer()
+    assert restarted.pending("alice") == {}
+    assert _statuses("alice") == {"deliberate": "mastered", "ambiguous": "learning"}
+    assert os.path.getsize(user_file(JOURNAL_FILENAME, "alice")) == 0
+
+
+def test_replay_skips_torn_last_line(buffer):
+    crashed = buffer()
+    crashed.stage([make_status_change("deliberate", "mastered")], "alice")
+    with open(user_file(JOURNAL_FILENAME, "alice"), "a", encoding="utf-8") as f:
+        f.write('{"word": "ambig')  # 崩溃时写了一半的行
+    buffer().pending("alice")
+    assert _statuses("alice") == {"deliberate": "mastered"}
+
+
+def test_journal_is_per_user(buffer):
+    buf = buffer()
+    buf.stage([make_status_change("deliberate", "mastered")], "alice")
+    buf.stage([make_status_change("ambiguous", "mastered")], "bob")
+    buf.flush("alice")
+    assert _statuses("alice") == {"deliberate": "mastered"}
+    assert _statuses("bob") == {}
+    assert set(buf.pending("bob")) == {"ambiguous"}
@@ -1,26 +1,124 @@
+import os
+import hashlib
+
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain_text_splitters import CharacterTextSplitter
 
+from language import detect_text_language
+from storage import normalize_user_id
+
+# --- 按语言分片的向量库 ---
+# 每种语言一个集合（<collection_name>_<语言代码>），查询法语单词只检索法语集合，
+# 新增语言不会让已有语言的检索变慢。每个文本块带有 language / source / user_id 元数据，
+# 查询时可再按来源或用户过滤。
+#
+# 两种后端（VECTOR_BACKEND 环境变量或 backend 参数）：
+#   chroma - Chroma 持久化集合（默认）
+#   flat   - 内存映射的 NumPy 扁平索引（flat_index.py），适合小规模部署，无需 Chroma
+PERSIST_DIRECTORY = "./chroma_db"
+FLAT_INDEX_DIRECTORY = "data/vector_index"
+
 class VectorEngine:
-    def __init__(self, collection_name="lang_learning_data"):
-        self.embeddings = OpenAIEmbeddings()
-        self.db = None
+    def __init__(self, collection_name="lang_learning_data", persist_directory=None,
+                 backend: str = None, embeddings=None):
+        self.embeddings = embeddings or OpenAIEmbeddings()
         self.collection_name = collection_name
+        self.backend = backend or os.getenv("VECTOR_BACKEND", "chroma")
+        if self.backend not in ("chroma", "flat"):
+            raise ValueError(f"未知的向量库后端: {self.backend}")
+        self.persist_directory = persist_directory or (
+            PERSIST_DIRECTORY if self.backend == "chroma" else FLAT_INDEX_DIRECTORY
+        )
+        self._collections = {}  # 语言代码 -> Chroma 或 FlatIndex
 
-    def add_texts(self, texts: list):
-        """将学习资料存入向量库"""
-        # 1. 切分长文本
+    def _collection(self, language: str):
+        """返回某种语言的集合（首次访问时打开或创建）"""
+        if language not in self._collections:
+            name = f"{self.collection_name}_{language}"
+            if self.backend == "flat":
+                from flat_index import FlatIndex
+                self._collections[language] = FlatIndex(
+                    os.path.join(self.persist_directory, name), dtype=os.getenv("VECTOR_DTYPE", "float16")
+                )
+            else:
+                from langchain_community.vectorstores import Chroma
+                self._collections[language] = Chroma(
+                    collection_name=name,
+                    embedding_function=self.embeddings,
+                    persist_directory=self.persist_directory,
+                )
+        return self._collections[language]
+
+    def add_texts(self, texts: list, source: str = "manual", user_id: str = None, language: str = None):
+        """
+        将学习资料存入向量库
+        每个文本块单独检测语言（也可通过 language 指定），按语言写入对应集合
+        返回 {语言代码: 文本块数}
+        """
+        # 1. 切分长文本，并为每个文本块打上元数据
         text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=50)
         docs = text_splitter.create_documents(texts)
-        # 2. 向量化并存储
-        self.db = Chroma.from_documents(
-            docs, self.embeddings, persist_directory="./chroma_db"
-        )
+        by_language = {}
+        for doc in docs:
+            lang = language or detect_text_language(doc.page_content)
+            doc.metadata.update({
+                "language": lang,
+                "source": source,
+                "user_id": normalize_user_id(user_id),
+            })
+            by_language.setdefault(lang, []).append(doc)
+        # 2. 向量化并写入各语言的集合
+        for lang, lang_docs in by_language.items():
+            collection = self._collection(lang)
+            if self.backend == "flat":
+                contents = [doc.page_content for doc in lang_docs]
+                collection.add(
+                    [hashlib.sha1(f"{doc.metadata['source']}\0{c}".encode("utf-8")).hexdigest()
+                     for doc, c in zip(lang_docs, contents)],
+                    contents,
+                    self.embeddings.embed_documents(contents),
+                    [doc.metadata for doc in lang_docs],
+                )
+            else:
+                collection.add_documents(lang_docs)
+        return {lang: len(lang_docs) for lang, lang_docs in by_language.items()}
+
+    def query_similar_contexts(self, words: list, k: int = 2, language: str = None,
+                               user_id: str = None, source: str = None):
+        """
+        批量检索多个生词的背景例句，返回与 words 对应的列表
+        只检索单词所属语言的集合；单个单词的语言难以判断（如不带重音的法语词），
+        已知文章语言时应通过 language 传入。user_id / source 用于进一步按元数据过滤
+        """
+        where = {}
+        if user_id is not None:
+            where["user_id"] = normalize_user_id(user_id)
+        if source is not None:
+            where["source"] = source
+
+        by_language = {}
+        for i, word in enumerate(words):
+            by_language.setdefault(language or detect_text_language(word), []).append(i)
+        results = [[] for _ in words]
+        for lang, indices in by_language.items():
+            collection = self._collection(lang)
+            if self.backend == "flat":
+                # 同一语言的查询一次向量化、一次矩阵乘法
+                vectors = self.embeddings.embed_documents([words[i] for i in indices])
+                for i, hits in zip(indices, collection.search(vectors, k=k, where=where or None)):
+                    results[i] = [hit["text"] for hit in hits]
+            else:
+                chroma_where = None
+                if len(where) == 1:
+                    chroma_where = where
+                elif where:
+                    chroma_where = {"$and": [{key: value} for key, value in where.items()]}
+                for i in indices:
+                    docs = collection.similarity_search(words[i], k=k, filter=chroma_where)
+                    results[i] = [doc.page_content for doc in docs]
+        return results
 
-    def query_similar_context(self, word: str):
+    def query_similar_context(self, word: str, k: int = 2, language: str = None,
+                              user_id: str = None, source: str = None):
         """检索与生词相关的背景例句"""
-        if not self.db:
-            self.db = Chroma(persist_directory="./chroma_db", embedding_function=self.embeddings)
-        results = self.db.similarity_search(word, k=2)
-        return [doc.page_content for doc in results]
\ No newline at end of file
+        return self.query_similar_contexts([word], k=k, language=language, user_id=user_id, source=source)[0]
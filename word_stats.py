@@ -0,0 +1,154 @@
+import os
+import json
+import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
+
+from storage import WORDS_FILENAME, user_file, atomic_writer
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# --- 学习统计（增量维护） ---
+# 侧边栏的统计不再每次读取整个词库 CSV：词库每次写盘时（word_store 的 flush），
+# 只根据本次改动的单词计算增量，更新计数后写入词库旁边的 user_words.stats.json：
+#   total / by_status / by_level  当前各状态、各等级的单词数
+#   added_per_day                 每天新加入词库的单词数
+#   mastered_per_day              每天标记为已掌握的次数（之后改回学习中不回退）
+# 统计文件记录写入时 CSV 的修改时间和大小；CSV 被外部修改（手工编辑、旧版本写入）时签名不符，
+# 下次读取时全量重算一次（此时按 last_queried 近似每日数据）。
+STATS_FILENAME = "user_words.stats.json"
+STATS_VERSION = 1
+
+def empty_stats() -> dict:
+    return {"version": STATS_VERSION, "total": 0, "by_status": {}, "by_level": {},
+            "added_per_day": {}, "mastered_per_day": {}, "signature": None}
+
+def _level(value) -> str:
+    # pandas 会把 "N/A" 读成 NaN
+    return "N/A" if value is None or value != value or value == "" else str(value)
+
+def word_states(df: "pd.DataFrame", words: Iterable[str] = None) -> Dict[str, Tuple[str, str]]:
+    """{单词: (状态, 等级)}；words 不为 None 时只取这些单词"""
+    if words is not None:
+        df = df[df['word'].isin(list(words))]
+    return {w: (str(s), _level(l)) for w, s, l in zip(df['word'], df['status'], df['level'])}
+
+def _bump(counter: dict, key: str, delta: int):
+    counter[key] = counter.get(key, 0) + delta
+    if not counter[key]:
+        del counter[key]
+
+def replay(states: Dict[str, Tuple[str, str]], changes: list) -> Tuple[Dict[str, Tuple[str, str]], int]:
+    """
+    按顺序把状态变更（word_store.make_status_change）应用到 {单词: (状态, 等级)} 上，规则与 apply_changes 相同
+    返回 (变更后的状态, 标记为已掌握的次数)：同一批中先标记已掌握、再改回学习中的词也计入
+    """
+    states, mastered = dict(states), 0
+    for change in changes:
+        word, before = change['word'], states.get(change['word'])
+        if before is None and not change.get('insert'):
+            continue  # 词库中不存在的词，apply_changes 也会忽略
+        status = str(change.get('status', before[0] if before else 'learning'))
+        level = _level(change['level']) if 'level' in change else (before[1] if before else 'N/A')
+        if status == "mastered" and (before is None or before[0] != "mastered"):
+            mastered += 1
+        states[word] = (status, level)
+    return states, mastered
+
+def apply_delta(stats: dict, old: Dict[str, Tuple[str, str]], new: Dict[str, Tuple[str, str]],
+                words: Iterable[str], day: str, mastered: int = None):
+    """
+    把若干单词从旧状态变为新状态的变化计入统计
+    mastered 为按变更顺序统计的已掌握次数（见 replay）；为 None 时按每个词的前后状态判断
+    """
+    if mastered:
+        _bump(stats["mastered_per_day"], day, mastered)
+    for word in words:
+        before, after = old.get(word), new.get(word)
+        if before == after:
+            continue
+        if before is not None:
+            stats["total"] -= 1
+            _bump(stats["by_status"], before[0], -1)
+            _bump(stats["by_level"], before[1], -1)
+        if after is not None:
+            stats["total"] += 1
+            _bump(stats["by_status"], after[0], 1)
+            _bump(stats["by_level"], after[1], 1)
+            if before is None:
+                _bump(stats["added_per_day"], day, 1)
+            if mastered is None and after[0] == "mastered" and (before is None or before[0] != "mastered"):
+                _bump(stats["mastered_per_day"], day, 1)
+
+def compute_stats(df: "pd.DataFrame") -> dict:
+    """全量计算（统计文件缺失或失效时使用），每日数据按 last_queried 近似"""
+    stats = empty_stats()
+    days = df['last_queried'].fillna("").astype(str)
+    for status, level, day in zip(df['status'].astype(str), df['level'], days):
+        stats["total"] += 1
+        _bump(stats["by_status"], status, 1)
+        _bump(stats["by_level"], _level(level), 1)
+        if day:
+            _bump(stats["added_per_day"], day, 1)
+            if status == "mastered":
+                _bump(stats["mastered_per_day"], day, 1)
+    return stats
+
+def csv_signature(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+def _stats_path(user_id: str = None) -> str:
+    return user_file(STATS_FILENAME, user_id)
+
+def _read_stats_file(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return stats if stats.get("version") == STATS_VERSION else None
+
+def _write_stats_file(stats: dict, path: str):
+    with atomic_writer(path) as f:
+        json.dump(stats, f, ensure_ascii=False)
+
+def is_current(user_id: str = None) -> bool:
+    """统计文件与当前 CSV 一致（写盘前调用，决定写盘后能否只计算增量）"""
+    stats = _read_stats_file(_stats_path(user_id))
+    return stats is not None and stats.get("signature") == csv_signature(user_file(WORDS_FILENAME, user_id))
+
+def record_write(user_id: str, old: Dict[str, Tuple[str, str]], new: Dict[str, Tuple[str, str]],
+                 words: Iterable[str], new_df: "pd.DataFrame", incremental: bool = True, mastered: int = None):
+    """
+    词库写盘后调用（调用方持有词库文件锁）：old / new 为本次改动的单词在写盘前后的状态，
+    mastered 为本次写入的变更中标记为已掌握的次数（见 replay）
+    incremental 为写盘前 is_current() 的结果；为 False 时用 new_df 全量重算
+    """
+    stats_path = _stats_path(user_id)
+    stats = _read_stats_file(stats_path) if incremental else None
+    if stats is None:
+        stats = compute_stats(new_df)
+    else:
+        apply_delta(stats, old, new, words, datetime.date.today().isoformat(), mastered)
+    stats["signature"] = csv_signature(user_file(WORDS_FILENAME, user_id))
+    _write_stats_file(stats, stats_path)
+
+def read_stats(user_id: str, read_words_df) -> dict:
+    """读取统计（O(1)）；统计文件缺失或与 CSV 不一致时用 read_words_df 全量重算一次并保存"""
+    path = user_file(WORDS_FILENAME, user_id)
+    stats_path = _stats_path(user_id)
+    stats = _read_stats_file(stats_path)
+    signature = csv_signature(path)
+    if stats is not None and stats.get("signature") == signature:
+        return stats
+    stats = compute_stats(read_words_df(path))
+    stats["signature"] = signature
+    try:
+        _write_stats_file(stats, stats_path)
+    except OSError as e:
+        print(f"--- [WordStats] 保存统计失败: {e} ---")
+    return stats
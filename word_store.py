@@ -0,0 +1,244 @@
+import os
+import json
+import atexit
+import datetime
+import threading
+from typing import TYPE_CHECKING
+
+import word_stats
+from storage import WORDS_FILENAME, user_file, file_lock, atomic_writer, normalize_user_id
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# --- 生词库 CSV 读写 ---
+# pandas 在首次读写词库时才导入
+WORD_COLUMNS = ['word', 'level', 'last_queried', 'score', 'status']
+JOURNAL_FILENAME = "user_words.journal.jsonl"
+
+def read_words_df(path: str) -> "pd.DataFrame":
+    import pandas as pd
+    try:
+        return pd.read_csv(path)
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        return pd.DataFrame(columns=WORD_COLUMNS)
+
+def write_words_df(df: "pd.DataFrame", path: str):
+    with atomic_writer(path) as f:
+        df.to_csv(f, index=False)
+
+def make_status_change(word: str, status: str, level: str = "N/A") -> dict:
+    """构造一条单词状态变更（mastered 会在词库中不存在时插入新行）"""
+    change = {
+        'word': word,
+        'status': status,
+        'score': 5 if status == 'mastered' else 0,
+        'last_queried': datetime.date.today().strftime('%Y-%m-%d'),
+        'insert': status == 'mastered',
+    }
+    if level != "N/A":
+        change['level'] = level
+    return change
+
+def apply_changes(df: "pd.DataFrame", changes: list) -> "pd.DataFrame":
+    """按顺序把状态变更应用到词库 DataFrame 上"""
+    import pandas as pd
+    new_rows = []
+    pending_new = {}
+    for change in changes:
+        word = change['word']
+        if word in pending_new:
+            row = pending_new[word]
+            row.update({k: v for k, v in change.items() if k in WORD_COLUMNS})
+        elif word in df['word'].values:
+            for key in ('status', 'score', 'last_queried', 'level'):
+                if key in change:
+                    df.loc[df['word'] == word, key] = change[key]
+        elif change.get('insert'):
+            row = {'word': word, 'level': 'N/A', 'last_queried': '', 'score': 0, 'status': 'learning'}
+            row.update({k: v for k, v in change.items() if k in WORD_COLUMNS})
+            pending_new[word] = row
+            new_rows.append(row)
+    if new_rows:
+        df = pd.concat([df, pd.DataFrame(new_rows, columns=WORD_COLUMNS)], ignore_index=True)
+    return df
+
+# --- 写后缓冲（write-behind） ---
+class WordWriteBuffer:
+    """
+    单词状态变更的写后缓冲
+
+    点击「已掌握」时只追加一行日志（journal）并更新内存视图，
+    累计达到阈值或定时器到期后再一次性重写 CSV。
+    日志先于内存视图落盘，进程崩溃后下次访问该用户时会自动回放。
+    flush 会回放日志中的全部变更（包括其他进程写入的），之后清空日志。
+    """
+
+    def __init__(self, flush_threshold: int = 20, flush_interval: float = 5.0):
+        self.flush_threshold = flush_threshold
+        self.flush_interval = flush_interval
+        self._pending = {}     # user_id -> [change]（按日志顺序，同一个词可能有多条）
+        self._recovered = set()
+        self._index = {}       # user_id -> (CSV 签名, {word: (status, level)})，用于在统计上叠加待写变更
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def _journal_path(self, user_id):
+        return user_file(JOURNAL_FILENAME, user_id)
+
+    def stage(self, changes: list, user_id: str = None):
+        """登记一批状态变更：写入日志并立即反映到内存视图"""
+        user_id = normalize_user_id(user_id)
+        if not changes:
+            return
+        # 先回放上次遗留的日志，否则之后首次 pending() 会把本次写入的日志当作遗留日志立即写盘
+        self._recover(user_id)
+        journal = self._journal_path(user_id)
+        with file_lock(journal):
+            with open(journal, 'a', encoding='utf-8') as f:
+                for change in changes:
+                    f.write(json.dumps(change, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        with self._lock:
+            pending = self._pending.setdefault(user_id, [])
+            pending.extend(changes)
+            should_flush = len({c['word'] for c in pending}) >= self.flush_threshold
+            if not should_flush:
+                self._schedule()
+        if should_flush:
+            self.flush(user_id)
+
+    def pending(self, user_id: str = None) -> dict:
+        """返回尚未写入 CSV 的变更（word -> 最后一条 change）"""
+        return {change['word']: change for change in self.pending_changes(user_id)}
+
+    def pending_changes(self, user_id: str = None) -> list:
+        """按日志顺序返回尚未写入 CSV 的全部变更（叠加到词库上时须按顺序逐条应用）"""
+        user_id = normalize_user_id(user_id)
+        self._recover(user_id)
+        with self._lock:
+            return list(self._pending.get(user_id, []))
+
+    def flush(self, user_id: str = None, transform=None):
+        """
+        将日志中的变更一次性写入 CSV
+        transform(df) -> df 可在同一次写入中附加其他修改（如记忆更新节点）
+        """
+        user_id = normalize_user_id(user_id)
+        path = user_file(WORDS_FILENAME, user_id)
+        journal = self._journal_path(user_id)
+        with file_lock(path):
+            with file_lock(journal):
+                changes = []
+                if os.path.exists(journal):
+                    with open(journal, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            line = line.strip()
+                            if line:
+                                try:
+                                    changes.append(json.loads(line))
+                                except json.JSONDecodeError:
+                                    # 崩溃时可能留下半行，跳过
+                                    continue
+                with self._lock:
+                    self._pending.pop(user_id, None)
+                    self._recovered.add(user_id)
+                if not changes and transform is None:
+                    return
+                incremental = word_stats.is_current(user_id)
+                signature_before = word_stats.csv_signature(path)
+                df = read_words_df(path)
+                old_rows = len(df)
+                changed = {c['word'] for c in changes}
+                old_states = word_stats.word_states(df, changed)
+                df = apply_changes(df, changes)
+                if transform is not None:
+                    df = transform(df)
+                write_words_df(df, path)
+                if changes:
+                    open(journal, 'w').close()
+                # 统计只计算本次改动的单词：变更涉及的词，加上追加在末尾的新词
+                touched = changed | set(df['word'].iloc[old_rows:])
+                new_states = word_stats.word_states(df, touched)
+                mastered = word_stats.replay(old_states, changes)[1]
+                try:
+                    word_stats.record_write(user_id, old_states, new_states, touched, df, incremental, mastered)
+                except OSError as e:
+                    print(f"更新学习统计失败 ({user_id}): {e}")
+                with self._lock:
+                    index = self._index.get(user_id)
+                    if index is not None and index[0] == signature_before:
+                        index[1].update(new_states)
+                        self._index[user_id] = (word_stats.csv_signature(path), index[1])
+                    else:
+                        self._index.pop(user_id, None)
+
+    def word_index(self, user_id: str = None) -> dict:
+        """已写盘词库的 {word: (status, level)}（缓存，按 CSV 签名失效；只在有待写变更时需要）"""
+        user_id = normalize_user_id(user_id)
+        path = user_file(WORDS_FILENAME, user_id)
+        signature = word_stats.csv_signature(path)
+        with self._lock:
+            index = self._index.get(user_id)
+            if index is not None and index[0] == signature:
+                return index[1]
+        states = word_stats.word_states(read_words_df(path))
+        with self._lock:
+            self._index[user_id] = (signature, states)
+        return states
+
+    def flush_all(self):
+        """写入所有用户的待处理变更"""
+        with self._lock:
+            self._timer = None
+            users = list(self._pending)
+        for user_id in users:
+            try:
+                self.flush(user_id)
+            except Exception as e:
+                print(f"写入生词库失败 ({user_id}): {e}")
+
+    def _recover(self, user_id):
+        """首次访问某个用户时回放遗留日志（上次进程崩溃前未写入的变更）"""
+        if user_id in self._recovered:
+            return
+        journal = self._journal_path(user_id)
+        if os.path.exists(journal) and os.path.getsize(journal) > 0:
+            self.flush(user_id)
+        with self._lock:
+            self._recovered.add(user_id)
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush_all)
+            self._timer.daemon = True
+            self._timer.start()
+
+word_buffer = WordWriteBuffer()
+atexit.register(word_buffer.flush_all)
+
+def learning_stats(user_id: str = None) -> dict:
+    """
+    学习统计（见 word_stats.py）：读取增量维护的统计文件，
+    再叠加写后缓冲中尚未写盘的变更（只涉及这几个单词，不扫描词库）
+    """
+    stats = word_stats.read_stats(normalize_user_id(user_id), read_words_df)
+    changes = word_buffer.pending_changes(user_id)
+    if not changes:
+        return stats
+    index = word_buffer.word_index(user_id)
+    words = {c['word'] for c in changes}
+    old_states = {w: index[w] for w in words if w in index}
+    new_states, mastered = word_stats.replay(old_states, changes)
+    stats = json.loads(json.dumps(stats))
+    word_stats.apply_delta(stats, old_states, new_states, words, datetime.date.today().isoformat(), mastered)
+    return stats
+
+def load_words_df(user_id: str = None) -> "pd.DataFrame":
+    """读取词库，并叠加内存中尚未写盘的变更"""
+    changes = word_buffer.pending_changes(user_id)
+    df = read_words_df(user_file(WORDS_FILENAME, user_id))
+    if changes:
+        df = apply_changes(df, changes)
+    return df